@@ -1,3 +1,111 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from planner.backends import EmailOrUsernameBackend
+from planner.benchmark import QueryBudgetTestCase, url_names
+
+
+class AccountsViewBudgetTests(QueryBudgetTestCase):
+    budgets = {
+        'register': 0,
+        'register_submit': 12,
+        'login': 0,
+        'login_submit': 9,
+        'login_failed': 1,
+        'logout': 4,
+        'profile': 3,
+    }
+
+    def test_all_urls_have_budgets(self):
+        missing = url_names('accounts.urls') - set(self.budgets)
+        self.assertFalse(missing, f'Нет бюджета для: {sorted(missing)}')
+
+    def test_register(self):
+        self.client.logout()
+        self.measure('register', reverse('register'))
+
+    def test_register_submit(self):
+        self.client.logout()
+        self.measure('register_submit', reverse('register'), method='post', data={
+            'username': 'newcomer',
+            'email': 'newcomer@example.com',
+            'password1': 'Sl0wly-but-surely',
+            'password2': 'Sl0wly-but-surely',
+        }, status=302)
+
+    def test_login(self):
+        self.client.logout()
+        self.measure('login', reverse('login'))
+
+    def test_login_submit(self):
+        self.client.logout()
+        self.measure('login_submit', reverse('login'), method='post', data={
+            'username': self.user.email,
+            'password': 'benchmark',
+        }, status=302)
+
+    def test_login_failed(self):
+        self.client.logout()
+        self.measure('login_failed', reverse('login'), method='post', data={
+            'username': 'nobody@example.com',
+            'password': 'benchmark',
+        })
+
+    def test_logout(self):
+        self.measure('logout', reverse('logout'), status=302)
+
+    def test_profile(self):
+        self.measure('profile', reverse('profile'))
+
+
+class EmailOrUsernameBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', 'Alice@Example.com', 'secret-pass')
+
+    def test_login_by_username_or_any_case_email_in_one_query(self):
+        for login in ('alice', 'alice@example.com', 'ALICE@EXAMPLE.COM'):
+            with self.assertNumQueries(1):
+                self.assertEqual(authenticate(username=login, password='secret-pass'), self.user)
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='alice', password='wrong'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='missing', password='secret-pass'))
+
+        # Имя пользователя важнее совпадения по email, общий email не дает входа
+        other = User.objects.create_user('alice@example.com', 'bob@example.com', 'other-pass')
+        self.assertEqual(authenticate(username='alice@example.com', password='other-pass'), other)
+        User.objects.create_user('carol', 'shared@example.com', 'secret-pass')
+        User.objects.create_user('dave', 'Shared@example.com', 'secret-pass')
+        self.assertIsNone(authenticate(username='shared@example.com', password='secret-pass'))
+
+    def test_session_user_is_cached_only_in_shared_cache(self):
+        backend = EmailOrUsernameBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.mkdtemp()}}
+        with override_settings(CACHES=shared):
+            self.addCleanup(shutil.rmtree, shared['default']['LOCATION'])
+            backend.get_user(self.user.pk)
+            with self.assertNumQueries(0):
+                user = backend.get_user(self.user.pk)
+                self.assertEqual((user, user.username), (self.user, 'alice'))
+                self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+            self.assertNotIn('password', user.__dict__)
+
+            # Сохранение отложенного объекта не трогает пароль
+            user.save()
+            self.assertTrue(User.objects.get(pk=self.user.pk).check_password('secret-pass'))
+
+            self.user.is_active = False
+            self.user.save()
+            self.assertIsNone(backend.get_user(self.user.pk))
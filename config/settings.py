@@ -35,9 +35,10 @@ ALLOWED_HOSTS = [
     '127.0.0.1'
 ]
 
+# Бэкенд наследует ModelBackend (права, is_active), второй бэкенд не нужен:
+# с ним неудачный вход повторял бы те же запросы
 AUTHENTICATION_BACKENDS = [
     'planner.backends.EmailOrUsernameBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 # Application definition
@@ -95,6 +96,29 @@ DATABASES = {
     )
 }
 
+# Cache
+# locmem - только для одного процесса. Сессии и пользователь сессии
+# кэшируются, только если кэш общий для всех воркеров (например,
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и
+# CACHE_LOCATION=redis://...): иначе выход или блокировка в одном процессе
+# не видны остальным
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='series-planner'),
+    }
+}
+
+# С общим кэшем сессии читаются из кэша, в БД - только при промахе и записи
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+if CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Static
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
@@ -149,3 +173,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'series_list'
 LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'planner': {
+            'handlers': ['console'],
+            'level': config('PLANNER_LOG_LEVEL', default='WARNING'),
+        },
+    },
+}
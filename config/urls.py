@@ -28,6 +28,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
+    path('api/v1/', include('planner.api_urls')),
     path('', include('planner.urls')),
 ]
 
@@ -1,13 +1,22 @@
 from django.contrib import admin
-from .models import Series, Episode, UserViewingPlan, WatchingHistory, UserSeriesRating
+from django.utils import timezone
+from .models import Genre, Series, Episode, UserViewingPlan, WatchingHistory, UserSeriesRating, UserStats, DailyWatchStats, ViewingSchedule, SyncState, Job
 
 
 @admin.register(Series)
 class SeriesAdmin(admin.ModelAdmin):
     list_display = ['title', 'total_seasons', 'total_episodes', 'rating', 'release_year', 'created_at']
-    list_filter = ['release_year', 'created_at']
+    list_filter = ['release_year', 'genre_tags', 'created_at']
     search_fields = ['title', 'description', 'genres']
-    readonly_fields = ['created_at', 'updated_at']
+    # Теги жанров выводятся из строки genres сигналом при сохранении
+    readonly_fields = ['created_at', 'updated_at', 'genre_tags']
+
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'tmdb_id']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ['name']}
 
 
 @admin.register(Episode)
@@ -20,10 +29,10 @@ class EpisodeAdmin(admin.ModelAdmin):
 
 @admin.register(UserViewingPlan)
 class UserViewingPlanAdmin(admin.ModelAdmin):
-    list_display = ['user', 'series', 'status', 'last_season_watched', 'last_episode_watched', 'episodes_per_day', 'started_at']
+    list_display = ['user', 'series', 'status', 'last_season_watched', 'last_episode_watched', 'episodes_per_day', 'forecast_date', 'started_at']
     list_filter = ['status', 'started_at']
     search_fields = ['user__username', 'series__title']
-    readonly_fields = ['started_at', 'updated_at']
+    readonly_fields = ['started_at', 'updated_at', 'forecast_pace', 'forecast_date', 'forecast_earliest', 'forecast_latest', 'forecast_updated_at']
 
 
 @admin.register(WatchingHistory)
@@ -40,3 +49,46 @@ class UserSeriesRatingAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'created_at']
     search_fields = ['user__username', 'series__title']
     readonly_fields = ['created_at']
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'total_series', 'watching', 'completed', 'total_episodes', 'total_minutes', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(DailyWatchStats)
+class DailyWatchStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'series', 'date', 'episodes', 'minutes']
+    list_filter = ['date']
+    search_fields = ['user__username', 'series__title']
+    raw_id_fields = ['user', 'series']
+
+
+@admin.register(ViewingSchedule)
+class ViewingScheduleAdmin(admin.ModelAdmin):
+    list_display = ['user', 'start_date', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['fingerprint', 'start_date', 'days', 'updated_at']
+
+
+@admin.register(SyncState)
+class SyncStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'watermark', 'run_started_at', 'updated_at']
+    readonly_fields = ['watermark', 'run_started_at', 'pending', 'metrics', 'updated_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'dedupe_key']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
+    actions = ['retry']
+
+    @admin.action(description='Поставить в очередь заново')
+    def retry(self, request, queryset):
+        queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), locked_by='', locked_at=None,
+        )
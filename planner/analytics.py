@@ -0,0 +1,98 @@
+"""Аналитика истории просмотра на pandas.
+
+Данные берутся из суточной сводки DailyWatchStats (строка на сериал за
+день) одним запросом values_list в DataFrame, дальше все считается
+векторно через groupby. PNG-график кэшируется с ключом по id последней
+записи истории: пока пользователь ничего не посмотрел, график не
+перерисовывается.
+"""
+import io
+from datetime import timedelta
+
+import pandas as pd
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import DailyWatchStats, WatchingHistory
+
+ROLLUP_COLUMNS = ['date', 'series_id', 'series', 'minutes', 'episodes']
+CHART_DAYS = 365
+CHART_TIMEOUT = 7 * 24 * 60 * 60
+TOP_SERIES = 3
+
+
+def rollup_frame(user, since=None):
+    rows = DailyWatchStats.objects.filter(user=user)
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+    rows = rows.order_by().values_list('date', 'series_id', 'series__title', 'minutes', 'episodes')
+    frame = pd.DataFrame.from_records(list(rows), columns=ROLLUP_COLUMNS)
+    if not frame.empty:
+        frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def daily_hours(frame, days=CHART_DAYS):
+    """Часы просмотра по дням (в часовом поясе сайта), без пропусков между днями."""
+    if frame.empty:
+        return pd.Series(dtype=float)
+    daily = frame.groupby('date')['minutes'].sum().div(60)
+    daily = daily.asfreq('D', fill_value=0)
+    return daily.iloc[-days:]
+
+
+def per_series_hours(frame, limit=TOP_SERIES):
+    if frame.empty:
+        return []
+    totals = frame.groupby(['series_id', 'series'], sort=False)['minutes'].sum().nlargest(limit).div(60)
+    return [
+        {'series_id': series_id, 'series': title, 'hours': float(hours)}
+        for (series_id, title), hours in totals.items()
+    ]
+
+
+def latest_history_id(user):
+    return WatchingHistory.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first()
+
+
+def history_summary(user):
+    frame = rollup_frame(user)
+    return {
+        'total_entries': int(frame['episodes'].sum()) if len(frame) else 0,
+        'total_hours': round(float(frame['minutes'].sum()) / 60, 1) if len(frame) else 0,
+        'per_series': per_series_hours(frame),
+        'latest_id': latest_history_id(user) if len(frame) else None,
+    }
+
+
+def render_chart(daily):
+    # Figure без pyplot: не трогает глобальное состояние и безопасна в потоках
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 3.5), dpi=100)
+    axes = figure.subplots()
+    axes.bar(daily.index, daily.values, width=1.0, color='#0d6efd')
+    axes.set_ylabel('Часы')
+    axes.grid(axis='y', alpha=0.3)
+    axes.margins(x=0.01)
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def chart_cache_key(user_id, latest_id):
+    return f'planner:analytics_chart:{user_id}:{latest_id}'
+
+
+def chart_png(user, latest_id):
+    """PNG графика часов по дням; перерисовывается только при новой истории."""
+    key = chart_cache_key(user.pk, latest_id)
+    png = cache.get(key)
+    if png is None:
+        since = timezone.localdate() - timedelta(days=CHART_DAYS - 1)
+        png = render_chart(daily_hours(rollup_frame(user, since)))
+        cache.set(key, png, CHART_TIMEOUT)
+    return png
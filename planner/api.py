@@ -0,0 +1,265 @@
+"""JSON API v1: сериалы, планы, оценки и история для клиентов синхронизации.
+
+Списки отдаются в порядке (updated_at, id) с keyset-пагинацией:
+?since=<ISO-время> возвращает только изменившееся после этого момента, а
+next - курсор следующей страницы. Дочитав до next = null, клиент берет
+updated_at последней записи как since для следующей синхронизации.
+
+Ответы - компактный JSON с ETag по содержимому: повторный запрос с
+If-None-Match получает 304 без тела. Пакетное обновление прогресса
+(POST plans/progress/) применяет все изменения в одной транзакции или не
+применяет ни одного.
+"""
+import datetime
+import decimal
+import hashlib
+import json
+from functools import wraps
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+
+from .models import Series, UserSeriesRating, UserViewingPlan, WatchingHistory
+from .pagination import keyset_paginate
+from .stats import rebuild_user_stats, split_genres
+
+PER_PAGE = 100
+MAX_PER_PAGE = 500
+MAX_BATCH = 500
+
+SYNC_ORDERING = ['updated_at', 'id']
+SERIES_FIELDS = [
+    'id', 'title', 'tmdb_id', 'release_year', 'rating', 'total_seasons', 'total_episodes',
+    'average_episode_duration', 'poster_url', 'updated_at',
+]
+PLAN_FIELDS = [
+    'id', 'series_id', 'status', 'last_season_watched', 'last_episode_watched',
+    'episodes_per_day', 'daily_hours_available', 'started_at', 'updated_at',
+]
+RATING_FIELDS = ['id', 'series_id', 'rating', 'review', 'updated_at']
+HISTORY_FIELDS = ['id', 'series_id', 'episode_id', 'watched_at', 'duration_watched']
+
+
+def _count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+# Поля плана, которые можно менять пакетным обновлением, и их проверка
+PROGRESS_FIELDS = {
+    'status': lambda value: isinstance(value, str) and value in dict(UserViewingPlan.STATUS_CHOICES),
+    'last_season_watched': _count,
+    'last_episode_watched': _count,
+    'episodes_per_day': _count,
+    'daily_hours_available': lambda value: _count(value) or isinstance(value, float) and 0 <= value < 1000,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, details=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dump(data):
+    return json.dumps(data, default=_encode, separators=(',', ':'), ensure_ascii=False)
+
+
+def json_response(request, data, status=200):
+    body = dump(data).encode()
+    response = None
+    if request.method in ('GET', 'HEAD') and status == 200:
+        etag = quote_etag(hashlib.sha1(body).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+    else:
+        response = HttpResponse(body, status=status, content_type='application/json')
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def api_view(*methods):
+    """Представление API: view возвращает данные, декоратор - ответ.
+
+    Анонимным отвечает 401 (а не редиректом на вход), ApiError
+    превращается в JSON с сообщением и кодом ошибки.
+    """
+    allowed = set(methods) | ({'HEAD'} if 'GET' in methods else set())
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return json_response(request, {'error': 'Требуется вход'}, status=401)
+            if request.method not in allowed:
+                response = json_response(request, {'error': 'Метод не поддерживается'}, status=405)
+                response['Allow'] = ', '.join(sorted(allowed))
+                return response
+            try:
+                data = view(request, *args, **kwargs)
+            except ApiError as e:
+                error = {'error': e.message}
+                if e.details:
+                    error['details'] = e.details
+                return json_response(request, error, status=e.status)
+            return json_response(request, data)
+        return wrapped
+    return decorator
+
+
+def row(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def sync_page(request, queryset, fields, ordering=SYNC_ORDERING, since_field='updated_at'):
+    """Страница списка для синхронизации с учетом ?since, ?cursor и ?limit."""
+    since = request.GET.get('since')
+    if since:
+        moment = parse_datetime(since)
+        if moment is None:
+            raise ApiError('Неверный параметр since, ожидается ISO 8601')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, datetime.timezone.utc)
+        queryset = queryset.filter(**{f'{since_field}__gt': moment})
+
+    try:
+        limit = min(max(int(request.GET.get('limit', PER_PAGE)), 1), MAX_PER_PAGE)
+    except ValueError:
+        raise ApiError('Неверный параметр limit')
+
+    page = keyset_paginate(queryset.only(*fields), ordering, request.GET.get('cursor'), per_page=limit)
+    return {'results': [row(obj, fields) for obj in page], 'next': page.next_cursor}
+
+
+@api_view('GET')
+def series_list(request):
+    return sync_page(request, Series.objects.all(), SERIES_FIELDS)
+
+
+@api_view('GET')
+def series_detail(request, series_id):
+    series = Series.objects.filter(pk=series_id).only(
+        *SERIES_FIELDS, 'description', 'genres', 'season_index',
+    ).first()
+    if series is None:
+        raise ApiError('Сериал не найден', status=404)
+
+    data = row(series, SERIES_FIELDS)
+    data['description'] = series.description
+    data['genres'] = split_genres(series.genres)
+    data['seasons'] = [[number, count] for number, count, *_ in series.season_index.get('seasons', [])]
+    return data
+
+
+@api_view('GET')
+def plan_list(request):
+    return sync_page(request, UserViewingPlan.objects.filter(user=request.user), PLAN_FIELDS)
+
+
+@api_view('GET')
+def rating_list(request):
+    return sync_page(request, UserSeriesRating.objects.filter(user=request.user), RATING_FIELDS)
+
+
+@api_view('GET')
+def history_list(request):
+    # История не меняется после записи, поэтому since относится к watched_at
+    return sync_page(
+        request, WatchingHistory.objects.filter(user=request.user), HISTORY_FIELDS,
+        ordering=['watched_at', 'id'], since_field='watched_at',
+    )
+
+
+def parse_progress(body):
+    """{series_id: изменения} из тела пакетного запроса с проверкой полей."""
+    try:
+        updates = json.loads(body)['updates']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError('Ожидается JSON вида {"updates": [{"series_id": ..., ...}]}')
+    if not isinstance(updates, list) or not updates:
+        raise ApiError('Список updates пуст')
+    if len(updates) > MAX_BATCH:
+        raise ApiError(f'Не больше {MAX_BATCH} изменений за запрос')
+
+    changes = {}
+    errors = {}
+    for position, update in enumerate(updates):
+        if not isinstance(update, dict) or not isinstance(update.get('series_id'), int):
+            errors[position] = 'Нужен целый series_id'
+            continue
+        fields = {key: value for key, value in update.items() if key != 'series_id'}
+        invalid = [key for key, value in fields.items() if key not in PROGRESS_FIELDS or not PROGRESS_FIELDS[key](value)]
+        if invalid:
+            errors[position] = f'Неверные поля: {", ".join(sorted(invalid))}'
+            continue
+        changes.setdefault(update['series_id'], {}).update(fields)
+
+    if errors:
+        raise ApiError('Изменения не применены', details=errors)
+    return changes
+
+
+@api_view('POST')
+def plan_progress(request):
+    """Пакетное обновление прогресса: все изменения в одной транзакции.
+
+    Планы обновляются одним bulk_update, недостающие создаются одним
+    bulk_create. Сигналы при этом не срабатывают, поэтому статистика
+    пользователя пересчитывается один раз в конце.
+    """
+    changes = parse_progress(request.body)
+    now = timezone.now()
+
+    with transaction.atomic():
+        series = Series.objects.only(
+            'season_index', 'total_episodes', 'total_seasons', 'average_episode_duration',
+        ).in_bulk(changes)
+        missing = sorted(set(changes) - set(series))
+        if missing:
+            raise ApiError('Сериалы не найдены', status=404, details={'series_id': missing})
+
+        plans = {
+            plan.series_id: plan
+            for plan in UserViewingPlan.objects.select_for_update().filter(user=request.user, series_id__in=changes)
+        }
+        created = []
+        for series_id, fields in changes.items():
+            plan = plans.get(series_id)
+            if plan is None:
+                plan = UserViewingPlan(user=request.user, series_id=series_id, started_at=now)
+                created.append(plan)
+            for field, value in fields.items():
+                setattr(plan, field, value)
+            # bulk_update и bulk_create обходят UserViewingPlan.save()
+            plan.episodes_watched = series[series_id].get_season_index().to_ordinal(
+                plan.last_season_watched, plan.last_episode_watched
+            )
+            plan.updated_at = now
+
+        updated = list(plans.values())
+        if updated:
+            UserViewingPlan.objects.bulk_update(
+                updated, [*PROGRESS_FIELDS, 'episodes_watched', 'updated_at'], batch_size=MAX_BATCH,
+            )
+        if created:
+            UserViewingPlan.objects.bulk_create(created)
+        rebuild_user_stats(request.user.pk)
+
+    results = sorted(updated + created, key=lambda plan: plan.series_id)
+    return {'results': [row(plan, PLAN_FIELDS) for plan in results]}
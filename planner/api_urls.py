@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path('series/', api.series_list, name='api_series_list'),
+    path('series/<int:series_id>/', api.series_detail, name='api_series_detail'),
+    path('plans/', api.plan_list, name='api_plan_list'),
+    path('plans/progress/', api.plan_progress, name='api_plan_progress'),
+    path('ratings/', api.rating_list, name='api_rating_list'),
+    path('history/', api.history_list, name='api_history_list'),
+]
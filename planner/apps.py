@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PlannerConfig(AppConfig):
     name = 'planner'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
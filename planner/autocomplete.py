@@ -0,0 +1,130 @@
+"""Автодополнение названий сериалов из индекса в памяти процесса.
+
+Индекс строится лениво при первом запросе в каждом воркере и
+перестраивается, когда меняется версия каталога (её повышает
+bump_catalog_version при сохранении/удалении сериалов). Версия хранится в
+БД (CatalogVersion), а кэш держит ее не дольше VERSION_CHECK_INTERVAL,
+поэтому другие процессы видят изменения каталога с этой задержкой даже с
+локальным кэшем. На горячем пути база данных не используется.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from heapq import nlargest
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import CatalogVersion, Series
+
+CATALOG_VERSION_KEY = 'planner:catalog_version'
+# Как часто воркер сверяет версию каталога (секунд)
+VERSION_CHECK_INTERVAL = 30
+# Для коротких префиксов топ считается заранее: их диапазоны слишком велики
+SHORT_PREFIX = 3
+MAX_LIMIT = 20
+
+WORD_START_RE = re.compile(r'(?<!\w)\w')
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def _increment_catalog_version():
+    if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        _, created = CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        if not created:
+            # Строку успел создать параллельный процесс
+            CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    cache.delete(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Повышает версию каталога после коммита текущей транзакции.
+
+    Строка CatalogVersion одна на всех: обновление внутри долгой транзакции
+    импорта держало бы ее блокировку и выстраивало параллельные импорты в
+    очередь. Вне транзакции версия повышается сразу.
+    """
+    transaction.on_commit(_increment_catalog_version)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+        cache.set(CATALOG_VERSION_KEY, version, VERSION_CHECK_INTERVAL)
+    return version
+
+
+class TitleIndex:
+    def __init__(self, rows):
+        """rows - кортежи (id, title, rating)."""
+        entries = []
+        for series_id, title, rating in rows:
+            key = normalize(title)
+            item = (rating if rating is not None else -1.0, series_id, title)
+            # Совпадение с начала названия или с начала любого слова в нем
+            for match in WORD_START_RE.finditer(key):
+                entries.append((key[match.start():], item))
+
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [key for key, _ in entries]
+        self.items = [item for _, item in entries]
+
+        self.top = {}
+        for key, item in sorted(entries, key=lambda entry: entry[1], reverse=True):
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                bucket = self.top.setdefault(key[:length], [])
+                if len(bucket) < MAX_LIMIT and item not in bucket:
+                    bucket.append(item)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        if len(prefix) <= SHORT_PREFIX:
+            return self.top.get(prefix, [])[:limit]
+
+        # Диапазон длинного префикса просматривается целиком, топ точный
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        return nlargest(limit, set(self.items[start:end]))
+
+
+_index = None
+_index_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _index_version, _checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _index
+
+    version = get_catalog_version()
+    if _index is None or version != _index_version:
+        with _lock:
+            if _index is None or version != _index_version:
+                _index = TitleIndex(Series.objects.values_list('id', 'title', 'rating').iterator())
+                _index_version = version
+    _checked_at = now
+    return _index
+
+
+def suggest(prefix, limit=10):
+    return [
+        {'id': series_id, 'title': title, 'rating': rating if rating >= 0 else None}
+        for rating, series_id, title in get_index().lookup(prefix, limit)
+    ]
@@ -1,18 +1,92 @@
-from django.contrib.auth.backends import ModelBackend
+"""Вход по email или имени пользователя.
+
+Пользователь ищется одним запросом: username (уникальный индекс) или
+LOWER(email) (функциональный индекс planner_user_email_lower_idx).
+Неудачный вход стоит ровно один запрос и один расчет хэша пароля: бэкенд
+наследует ModelBackend и единственный в AUTHENTICATION_BACKENDS, так что
+повторной проверки тем же логином нет.
+
+Если кэш общий для всех процессов (не locmem), пользователь сессии
+кэшируется на USER_CACHE_TIMEOUT: хранятся только поля, нужные страницам,
+флаг is_active и хэш для проверки сессии, но не хэш пароля. Сохранение
+пользователя сбрасывает запись сигналом; QuerySet.update() его обходит,
+поэтому срок жизни записи короткий.
+"""
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Lower
 
 User = get_user_model()
 
+USER_CACHE_TIMEOUT = 60
+# Остальные поля загрузятся отдельным запросом при первом обращении
+USER_CACHE_FIELDS = ['id', 'username', 'is_active', 'is_staff', 'is_superuser']
+
+
+def cache_is_shared():
+    return settings.CACHES['default']['BACKEND'] not in settings.LOCAL_CACHE_BACKENDS
+
+
+def user_cache_key(user_id):
+    return f'planner:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
 class EmailOrUsernameBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email=username)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(username=username)
-            except User.DoesNotExist:
-                return None
-        
-        if user.check_password(password):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        # Совпадение по username важнее: email в auth_user не уникален
+        candidates = list(
+            User._default_manager.alias(email_lower=Lower('email'))
+            .filter(Q(username=username) | Q(email_lower=Lower(Value(username))))
+            .order_by(Case(When(username=username, then=0), default=1), 'id')[:2]
+        )
+        if candidates and candidates[0].username != username and len(candidates) > 1:
+            # Один email у нескольких аккаунтов: войти можно только по имени
+            candidates = []
+
+        if not candidates:
+            # Хэшируем пароль и для несуществующего пользователя, чтобы время
+            # ответа не выдавало, есть ли такой логин
+            User().set_password(password)
+            return None
+
+        user = candidates[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+    def get_user(self, user_id):
+        if not cache_is_shared():
+            return super().get_user(user_id)
+
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            entry = {
+                'fields': {field: getattr(user, field) for field in USER_CACHE_FIELDS},
+                'session_hash': user.get_session_auth_hash(),
+            }
+            cache.set(key, entry, USER_CACHE_TIMEOUT)
+        else:
+            # Поля вне USER_CACHE_FIELDS отложены: сохранение такого объекта
+            # пишет только загруженные поля и не затрет пароль
+            # from_db ждет значения в порядке полей модели
+            fields = [f.attname for f in User._meta.concrete_fields if f.attname in entry['fields']]
+            user = User.from_db(User.objects.db, fields, [entry['fields'][name] for name in fields])
+            session_hash = entry['session_hash']
+            user.get_session_auth_hash = lambda: session_hash
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,140 @@
+"""Базовый класс тестов бюджета запросов и времени ответа представлений.
+
+Каждое представление проверяется на реалистичном наборе данных: число
+SQL-запросов не должно превышать объявленный бюджет. Время ответа зависит
+от машины, поэтому сравнивается с сохраненным baseline (не хуже чем в
+1 + PLANNER_BENCH_THRESHOLD раз) только по PLANNER_BENCH_TIMING=1.
+
+Переменные окружения:
+    PLANNER_BENCH_SCALE      - множитель объема данных (по умолчанию 1)
+    PLANNER_BENCH_TIMING=1   - проверять время ответа по baseline
+    PLANNER_BENCH_THRESHOLD  - допустимое замедление (по умолчанию 1.0, т.е. 2x)
+    PLANNER_BENCH_UPDATE=1   - перезаписать baseline текущими замерами
+"""
+import copy
+import gc
+import json
+import os
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+
+from .seeding import seed_dataset
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmarks' / 'baseline.json'
+# Абсолютный допуск, чтобы не ловить шум на очень быстрых представлениях
+MIN_SLACK_MS = 5.0
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def load_baseline():
+    try:
+        return json.loads(BASELINE_PATH.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def url_names(urlconf):
+    return {pattern.name for pattern in get_resolver(urlconf).url_patterns if pattern.name}
+
+
+class QueryBudgetTestCase(TestCase):
+    # имя замера -> максимальное число запросов
+    budgets = {}
+    repeat = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = _env_float('PLANNER_BENCH_SCALE', 1.0)
+        cls.seeder, user_ids = seed_dataset(
+            series=max(int(1000 * scale), 50),
+            users=3,
+            plans_per_user=max(int(200 * scale), 30),
+            history_per_user=max(int(1000 * scale), 50),
+            prefix='budget',
+        )
+        cls.user = User.objects.get(pk=user_ids[0])
+        cls.other_user = User.objects.get(pk=user_ids[1])
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baseline = load_baseline()
+        cls.threshold = _env_float('PLANNER_BENCH_THRESHOLD', 1.0)
+        cls.update_baseline = os.environ.get('PLANNER_BENCH_UPDATE') == '1'
+        cls.check_timing = os.environ.get('PLANNER_BENCH_TIMING') == '1'
+        cls.measurements = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.update_baseline and cls.measurements:
+            baseline = load_baseline()
+            baseline.update(cls.measurements)
+            BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            BASELINE_PATH.write_text(
+                json.dumps(baseline, indent=2, sort_keys=True, ensure_ascii=False) + '\n',
+                encoding='utf-8',
+            )
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def measure(self, name, url, method='get', data=None, status=200, repeat=None, **extra):
+        """Выполняет запрос и проверяет бюджет запросов и время ответа.
+
+        Запрос повторяется repeat раз и берется лучшее время. Все повторы,
+        кроме последнего, откатываются вместе с cookie клиента, так что
+        изменяющие данные запросы каждый раз видят одно и то же состояние.
+        На время замера сборщик мусора отключается.
+        """
+        budget = self.budgets[name]
+        repeat = repeat or self.repeat
+        best_ms = None
+
+        for attempt in range(repeat):
+            last = attempt == repeat - 1
+            cookies = copy.deepcopy(self.client.cookies)
+            with transaction.atomic():
+                gc.collect()
+                gc.disable()
+                try:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = getattr(self.client, method)(url, data or {}, **extra)
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                finally:
+                    gc.enable()
+                if not last:
+                    transaction.set_rollback(True)
+            if not last:
+                self.client.cookies = cookies
+            best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+        self.assertEqual(response.status_code, status, f'{name}: {url}')
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{name}: {len(queries)} запросов при бюджете {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries),
+        )
+
+        self.measurements[name] = {'queries': len(queries), 'ms': round(best_ms, 2)}
+        expected = self.baseline.get(name)
+        if expected and self.check_timing and not self.update_baseline:
+            limit = max(expected['ms'] * (1 + self.threshold), expected['ms'] + MIN_SLACK_MS)
+            self.assertLessEqual(
+                best_ms, limit,
+                f'{name}: {best_ms:.1f} мс, baseline {expected["ms"]} мс',
+            )
+        return response
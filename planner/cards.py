@@ -0,0 +1,55 @@
+"""Кэш отрендеренных карточек каталога.
+
+HTML карточки сериала не зависит от пользователя, поэтому кэшируется один
+раз на сериал и отдается всем. Запись хранит версию (updated_at сериала и
+версию шаблона): если сериал изменился в обход сигналов, например через
+QuerySet.update(), устаревшая карточка просто не совпадет по версии.
+Пользовательские отметки ("в списке") накладываются поверх в шаблоне страницы.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'planner/_series_card.html'
+# Увеличить при изменении шаблона карточки
+CARD_TEMPLATE_VERSION = 1
+CARD_TIMEOUT = 24 * 60 * 60
+
+Card = namedtuple('Card', ['id', 'html'])
+
+
+def card_key(series_id):
+    return f'planner:card:{series_id}'
+
+
+def card_version(series):
+    return f'{CARD_TEMPLATE_VERSION}:{series.updated_at.timestamp()}'
+
+
+def render_cards(series_list):
+    """Карточки для списка сериалов: одно обращение к кэшу на страницу."""
+    series_list = list(series_list)
+    cached = cache.get_many([card_key(series.id) for series in series_list])
+
+    cards = []
+    missing = {}
+    for series in series_list:
+        key = card_key(series.id)
+        version = card_version(series)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == version:
+            html = entry[1]
+        else:
+            html = render_to_string(CARD_TEMPLATE, {'series': series})
+            missing[key] = (version, str(html))
+        cards.append(Card(series.id, mark_safe(html)))
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return cards
+
+
+def invalidate_card(series_id):
+    cache.delete(card_key(series_id))
@@ -0,0 +1,67 @@
+import hashlib
+from functools import wraps
+
+from decouple import config
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+# Версия сборки входит в ETag, чтобы после деплоя с новыми шаблонами
+# браузеры не показывали сохраненные страницы
+BUILD_VERSION = config('RENDER_GIT_COMMIT', default='dev')
+
+
+def _csrf_secret(request):
+    # Страница содержит csrf-токен: при смене секрета ее нужно перерисовать.
+    # get_token создает секрет, если его еще нет, чтобы ETag первого ответа
+    # совпал с ETag следующего запроса.
+    get_token(request)
+    return request.META['CSRF_COOKIE']
+
+
+def conditional_page(state_func):
+    """Условный GET (ETag/Last-Modified) для страниц пользователя.
+
+    state_func(request, *args, **kwargs) должна одним легким запросом вернуть
+    (last_modified, parts): время последнего изменения данных страницы (или
+    None) и кортеж значений, от которых она зависит. last_modified можно
+    отдавать, только если его двигает любое изменение, включая удаление;
+    иначе достаточно ETag по parts. Если клиент прислал
+    совпадающие If-None-Match/If-Modified-Since, представление не вызывается
+    и возвращается 304. None из state_func отключает проверку (например,
+    чтобы представление само ответило 404).
+
+    Страницы не кэшируются без проверки (Cache-Control: private, no-cache),
+    а при непоказанных flash-сообщениях всегда рендерятся заново.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            state = state_func(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            last_modified, parts = state
+            raw = repr((
+                BUILD_VERSION, request.user.pk, _csrf_secret(request), request.get_full_path(), parts,
+            ))
+            etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                if timestamp is not None:
+                    response.headers.setdefault('Last-Modified', http_date(timestamp))
+
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapped
+    return decorator
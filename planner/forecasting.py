@@ -0,0 +1,141 @@
+"""Прогноз завершения планов по реальному темпу просмотра.
+
+Темп плана - экспоненциально взвешенное среднее эпизодов в день за
+последние FORECAST_DAYS полных дней из суточной сводки DailyWatchStats:
+вес дня убывает вдвое каждые HALF_LIFE дней, дни до начала плана не
+учитываются. Заявленный episodes_per_day входит в среднее как PRIOR_WEIGHT
+дней наблюдений, поэтому у нового плана без истории прогноз совпадает с
+заявленным темпом и сдвигается к реальному по мере накопления истории.
+
+Диапазон дат - темп плюс-минус Z стандартных ошибок взвешенного среднего.
+Все планы пачки пользователей считаются одной матрицей NumPy (план x день),
+в базу записываются только изменившиеся прогнозы, поэтому повторный
+пересчет без новой истории ничего не пишет.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DailyWatchStats, UserViewingPlan
+
+FORECAST_DAYS = 56
+HALF_LIFE = 7
+PRIOR_WEIGHT = 3.0
+# Границы 80% интервала нормального распределения
+Z = 1.2816
+MIN_PACE = 0.01
+MAX_DAYS = 5 * 365
+
+FORECAST_FIELDS = ['forecast_pace', 'forecast_date', 'forecast_earliest', 'forecast_latest']
+PLAN_FIELDS = ['id', 'user_id', 'series_id', 'status', 'episodes_per_day', 'started_at', 'progress_remaining']
+
+
+def forecast_users():
+    """Пользователи, у которых прогноз есть или должен появиться."""
+    return UserViewingPlan.objects.filter(
+        Q(status='watching') | Q(forecast_pace__isnull=False),
+    ).order_by('user_id').values_list('user_id', flat=True).distinct()
+
+
+def day_weights(days=FORECAST_DAYS, half_life=HALF_LIFE):
+    """Веса дней окна; индекс 0 - вчера."""
+    return 0.5 ** (np.arange(days) / half_life)
+
+
+def estimate_pace(counts, observed, prior):
+    """Темп и его стандартная ошибка для каждой строки матрицы counts.
+
+    counts - эпизоды по дням (планы x дни, столбец 0 - вчера), observed -
+    сколько последних дней каждого плана учитывать, prior - заявленный
+    темп. Априорные дни считаются пуассоновскими: их дисперсия равна prior.
+    """
+    days = counts.shape[1]
+    weights = np.where(np.arange(days) < observed[:, None], day_weights(days), 0.0)
+    total = weights.sum(axis=1) + PRIOR_WEIGHT
+    pace = ((counts * weights).sum(axis=1) + PRIOR_WEIGHT * prior) / total
+
+    spread = ((counts - pace[:, None]) ** 2 * weights).sum(axis=1)
+    spread += PRIOR_WEIGHT * (prior + (prior - pace) ** 2)
+    effective = total ** 2 / ((weights ** 2).sum(axis=1) + PRIOR_WEIGHT)
+    return pace, np.sqrt(spread / total / effective)
+
+
+def completion_days(remaining, pace):
+    """Дней до конца при темпе pace; NaN, если темп слишком мал для прогноза."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days = np.ceil(remaining / np.maximum(pace, MIN_PACE))
+    return np.where((pace >= MIN_PACE) & (days <= MAX_DAYS), days, np.nan)
+
+
+def forecast_plans(plans, rollup, today):
+    """Прогнозы планов: {id плана: значения FORECAST_FIELDS}.
+
+    plans - строки с полями PLAN_FIELDS (progress_remaining из
+    with_progress), rollup - строки (user_id, series_id, date, episodes)
+    сводки за окно. Планы не в статусе "Смотрю" получают пустой прогноз.
+    """
+    forecasts = {plan['id']: (None,) * len(FORECAST_FIELDS) for plan in plans}
+    watching = [plan for plan in plans if plan['status'] == 'watching']
+    if not watching:
+        return forecasts
+
+    position = {(plan['user_id'], plan['series_id']): n for n, plan in enumerate(watching)}
+    cells = [
+        (position[user_id, series_id], (today - day).days - 1, episodes)
+        for user_id, series_id, day, episodes in rollup
+        if (user_id, series_id) in position and 0 < (today - day).days <= FORECAST_DAYS
+    ]
+    counts = np.zeros((len(watching), FORECAST_DAYS))
+    if cells:
+        rows, ages, episodes = np.array(cells, dtype=np.int64).T
+        # Сводка уникальна по (пользователь, сериал, день): ячейки не повторяются
+        counts[rows, ages] = episodes
+
+    observed = np.array([(today - timezone.localdate(plan['started_at'])).days for plan in watching])
+    prior = np.array([max(plan['episodes_per_day'], 0) for plan in watching], dtype=float)
+    remaining = np.array([plan['progress_remaining'] for plan in watching], dtype=float)
+
+    pace, error = estimate_pace(counts, observed, prior)
+    expected = completion_days(remaining, pace)
+    earliest = completion_days(remaining, pace + Z * error)
+    latest = completion_days(remaining, pace - Z * error)
+
+    def day(value):
+        return None if np.isnan(value) else today + timedelta(days=int(value))
+
+    for n, plan in enumerate(watching):
+        forecasts[plan['id']] = (
+            round(float(pace[n]), 2), day(expected[n]), day(earliest[n]), day(latest[n]),
+        )
+    return forecasts
+
+
+def refresh_forecasts(user_ids, today=None):
+    """Пересчитывает прогнозы пачки пользователей; возвращает число измененных планов.
+
+    Три запроса: планы с прогрессом, сводка за окно и один UPDATE
+    изменившихся планов. updated_at планов не меняется.
+    """
+    today = today or timezone.localdate()
+    plans = list(
+        UserViewingPlan.objects.filter(user_id__in=user_ids).with_progress()
+        .order_by().values(*PLAN_FIELDS, *FORECAST_FIELDS)
+    )
+    rollup = DailyWatchStats.objects.filter(
+        user_id__in=user_ids, date__gte=today - timedelta(days=FORECAST_DAYS), date__lt=today,
+    ).order_by().values_list('user_id', 'series_id', 'date', 'episodes')
+
+    now = timezone.now()
+    changed = []
+    forecasts = forecast_plans(plans, rollup, today)
+    for plan in plans:
+        values = forecasts[plan['id']]
+        if values != tuple(plan[field] for field in FORECAST_FIELDS):
+            changed.append(UserViewingPlan(
+                id=plan['id'], forecast_updated_at=now, **dict(zip(FORECAST_FIELDS, values)),
+            ))
+    if changed:
+        UserViewingPlan.objects.bulk_update(changed, FORECAST_FIELDS + ['forecast_updated_at'], batch_size=500)
+    return len(changed)
@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.text import slugify
+
+from .autocomplete import get_catalog_version
+from .models import Genre, UserViewingPlan
+from .stats import split_genres
+
+FACETS_TIMEOUT = 24 * 60 * 60
+
+
+def unique_slug(name):
+    base = slugify(name, allow_unicode=True) or 'genre'
+    slug = base
+    suffix = 2
+    while Genre.objects.filter(slug=slug).exists():
+        slug = f'{base}-{suffix}'
+        suffix += 1
+    return slug
+
+
+def get_or_create_genre(name, tmdb_id=None):
+    name = name.strip()
+    genre = None
+    if tmdb_id is not None:
+        genre = Genre.objects.filter(tmdb_id=tmdb_id).first()
+    if genre is None:
+        genre, _ = Genre.objects.get_or_create(
+            name=name,
+            defaults={'slug': unique_slug(name), 'tmdb_id': tmdb_id},
+        )
+    if tmdb_id is not None and genre.tmdb_id is None:
+        genre.tmdb_id = tmdb_id
+        genre.save(update_fields=['tmdb_id'])
+    return genre
+
+
+def set_series_genres(series, genres):
+    """Привязывает жанры к сериалу и синхронизирует строку Series.genres.
+
+    genres - список названий или словарей TMDB вида {"id": ..., "name": ...}.
+    """
+    objects = []
+    for genre in genres:
+        if isinstance(genre, dict):
+            objects.append(get_or_create_genre(genre['name'], genre.get('id')))
+        elif genre.strip():
+            objects.append(get_or_create_genre(genre))
+
+    series.genre_tags.set(objects)
+
+    genres_value = ', '.join(genre.name for genre in objects)
+    if series.genres != genres_value:
+        series.genres = genres_value
+        # Строка уже совпадает с тегами: сигналу незачем синхронизировать снова
+        series._genres_snapshot = genres_value
+        series.save(update_fields=['genres', 'updated_at'])
+    return objects
+
+
+def sync_genres_from_string(series):
+    """Приводит genre_tags к строке Series.genres (вызывается сигналом при ее изменении)."""
+    return set_series_genres(series, split_genres(series.genres))
+
+
+def catalog_facets():
+    """Жанры с числом сериалов в каталоге; кэшируются до смены версии каталога."""
+    key = f'planner:genre_facets:{get_catalog_version()}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = list(
+            Genre.objects.annotate(catalog_count=Count('series'))
+            .filter(catalog_count__gt=0).order_by('-catalog_count', 'name')
+        )
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def genre_facets(user=None):
+    """Число сериалов по жанрам в каталоге и в списке пользователя.
+
+    Счетчики каталога берутся из кэша (catalog_facets); при переданном user
+    у каждого жанра есть еще user_count - отдельный сгруппированный запрос
+    только по планам этого пользователя.
+    """
+    facets = catalog_facets()
+    if user is None or not user.is_authenticated:
+        return facets
+
+    counts = dict(
+        UserViewingPlan.objects.filter(user=user, series__genre_tags__isnull=False).order_by()
+        .values_list('series__genre_tags').annotate(count=Count('series_id', distinct=True))
+    )
+    for genre in facets:
+        genre.user_count = counts.get(genre.pk, 0)
+    return sorted(facets, key=lambda genre: -genre.user_count)
+
+
+def filter_by_genre(queryset, slug):
+    if not slug:
+        return queryset
+    return queryset.filter(genre_tags__slug=slug)
@@ -0,0 +1,116 @@
+"""Отметка просмотренных эпизодов диапазоном.
+
+Эпизоды диапазона (или списка диапазонов) находятся одним запросом,
+история пишется одним bulk_create, план сохраняется один раз - все в одной
+транзакции. bulk_create не вызывает сигналы WatchingHistory, поэтому
+статистика и суточная сводка обновляются здесь явно.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Episode, WatchingHistory
+from .stats import record_daily_watch, record_history_change
+
+EPISODE_RE = re.compile(r'^s(\d+)e(\d+)$', re.IGNORECASE)
+DASH_RE = re.compile(r'\s*[-–—]\s*')
+
+
+def parse_episode(value):
+    match = EPISODE_RE.match(value)
+    if not match:
+        raise ValueError(f'Неверный эпизод: {value!r}, ожидается вид S01E02')
+    return int(match.group(1)), int(match.group(2))
+
+
+def parse_ranges(value):
+    """'S01E01-S03E10, S04E02' -> [((1, 1), (3, 10)), ((4, 2), (4, 2))]."""
+    ranges = []
+    for part in re.split(r'[,;\s]+', DASH_RE.sub('-', value.strip())):
+        if not part:
+            continue
+        bounds = part.split('-')
+        if len(bounds) > 2:
+            raise ValueError(f'Неверный диапазон: {part!r}')
+        start, end = parse_episode(bounds[0]), parse_episode(bounds[-1])
+        if end < start:
+            raise ValueError(f'Конец диапазона раньше начала: {part!r}')
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError('Не указаны эпизоды')
+    return ranges
+
+
+def _range_q(start, end):
+    (first_season, first_episode), (last_season, last_episode) = start, end
+    after = Q(season_number__gt=first_season) | Q(season_number=first_season, episode_number__gte=first_episode)
+    before = Q(season_number__lt=last_season) | Q(season_number=last_season, episode_number__lte=last_episode)
+    return after & before
+
+
+def resolve_episodes(series, ranges):
+    """[(episode_id, сезон, эпизод, минут)] для диапазонов по порядку просмотра.
+
+    Для сериала без загруженных эпизодов номера берутся из индекса сезонов,
+    а episode_id равен None. Если о сериале не известно даже число эпизодов,
+    отдельные эпизоды (не диапазоны) принимаются как есть.
+    """
+    if series.season_index and series.season_index.get('seasons'):
+        return list(
+            Episode.objects.filter(series=series)
+            .filter(reduce(or_, (_range_q(start, end) for start, end in ranges)))
+            .order_by('season_number', 'episode_number')
+            .values_list('id', 'season_number', 'episode_number', 'duration')
+        )
+
+    index = series.get_season_index()
+    if not index.total_episodes:
+        episodes = {start for start, end in ranges if start == end}
+        return [(None, *episode, series.average_episode_duration) for episode in sorted(episodes)]
+
+    ordinals = set()
+    for start, end in ranges:
+        first = max(index.to_ordinal(*start), 1)
+        last = min(index.to_ordinal(*end), index.total_episodes)
+        ordinals.update(range(first, last + 1))
+    return [
+        (None, *index.from_ordinal(ordinal), series.average_episode_duration)
+        for ordinal in sorted(ordinals)
+    ]
+
+
+def mark_watched(plan, ranges):
+    """Записывает эпизоды диапазонов в историю и двигает прогресс плана.
+
+    Прогресс ставится на последний найденный эпизод; план со статусом
+    "В планах" переходит в "Смотрю", досмотренный до конца - в "Завершено".
+    Если в сериале нет ни одного эпизода диапазонов, план не меняется и
+    выбрасывается ValidationError. Возвращает число записанных эпизодов.
+    plan должен быть загружен вместе с series.
+    """
+    series = plan.series
+    with transaction.atomic():
+        episodes = resolve_episodes(series, ranges)
+        if not episodes:
+            raise ValidationError('В сериале нет таких эпизодов')
+        last = episodes[-1][1:3]
+        history = WatchingHistory.objects.bulk_create([
+            WatchingHistory(user_id=plan.user_id, series=series, episode_id=episode_id, duration_watched=minutes)
+            for episode_id, _, _, minutes in episodes
+        ])
+        if history:
+            minutes = sum(record.duration_watched for record in history)
+            record_history_change(plan.user_id, len(history), minutes)
+            record_daily_watch(plan.user_id, series.id, history[0].watched_at, len(history), minutes)
+
+        plan.last_season_watched, plan.last_episode_watched = last
+        if series.total_episodes and series.get_season_index().to_ordinal(*last) >= series.total_episodes:
+            plan.status = 'completed'
+        elif plan.status == 'planning':
+            plan.status = 'watching'
+        plan.save()
+    return len(history)
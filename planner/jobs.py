@@ -0,0 +1,177 @@
+"""Очередь фоновых задач в основной базе данных.
+
+Задача - строка Job с именем зарегистрированной функции и ее аргументами.
+Постановка в очередь - один INSERT в текущей транзакции: если запрос
+откатится, задача тоже исчезнет, а воркер увидит ее только после коммита.
+
+Воркеры (manage.py run_worker) захватывают задачи через
+SELECT ... FOR UPDATE SKIP LOCKED там, где он есть (PostgreSQL, MySQL 8),
+и условным UPDATE по статусу на SQLite. Упавшая задача повторяется с
+экспоненциальной задержкой, пока не кончатся попытки; задача воркера,
+который умер, не завершив ее, возвращается в очередь по таймауту.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+STALE_AFTER = 30 * 60
+ERROR_LENGTH = 4000
+
+# имя задачи -> (функция, максимум попыток)
+TASKS = {}
+
+
+def task(name, max_attempts=MAX_ATTEMPTS):
+    """Регистрирует функцию как фоновую задачу; аргументы - ключи payload."""
+    def decorator(func):
+        TASKS[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, dedupe_key=None, delay=0):
+    """Ставит задачу в очередь.
+
+    Если в очереди уже ждет задача с тем же dedupe_key, новая не
+    добавляется. Один запрос к БД.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    job = Job(
+        name=name,
+        payload=payload or {},
+        dedupe_key=dedupe_key,
+        max_attempts=TASKS[name][1],
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    Job.objects.bulk_create([job], ignore_conflicts=True)
+
+
+def claim(worker, limit=1):
+    """Захватывает до limit готовых к запуску задач и возвращает их.
+
+    В базе dedupe_key захваченной задачи очищается, чтобы такое же изменение
+    можно было поставить, пока она выполняется; у возвращенных объектов
+    ключ остается прежним, чтобы run_job вернул его при повторе.
+    """
+    now = timezone.now()
+    token = f'{worker}:{uuid.uuid4().hex[:12]}'
+    ready = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+    fields = {
+        'status': 'running',
+        'locked_by': token,
+        'locked_at': now,
+        'attempts': F('attempts') + 1,
+        'dedupe_key': None,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            keys = dict(ready.select_for_update(skip_locked=True).values_list('id', 'dedupe_key')[:limit])
+            if not keys:
+                return []
+            Job.objects.filter(pk__in=keys).update(**fields)
+    else:
+        # Без SKIP LOCKED воркеры могут выбрать одни и те же id; условие на
+        # статус в UPDATE отдает каждую задачу только одному из них
+        keys = dict(ready.values_list('id', 'dedupe_key')[:limit])
+        if not keys or not Job.objects.filter(pk__in=keys, status='queued').update(**fields):
+            return []
+    claimed = list(Job.objects.filter(locked_by=token, status='running').order_by('run_at', 'id'))
+    for job in claimed:
+        job.dedupe_key = keys[job.pk]
+    return claimed
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 10)
+
+
+def run_job(job):
+    """Выполняет захваченную задачу и записывает результат. True при успехе."""
+    entry = TASKS.get(job.name)
+    try:
+        if entry is None:
+            raise LookupError(f'Неизвестная задача: {job.name}')
+        entry[0](**job.payload)
+    except Exception:
+        error = traceback.format_exc()[-ERROR_LENGTH:]
+        retry = entry is not None and job.attempts < job.max_attempts
+        logger.warning('Job %s #%s failed (attempt %s/%s)', job.name, job.pk, job.attempts, job.max_attempts,
+                       exc_info=True)
+        if retry:
+            try:
+                # Ключ возвращается, чтобы на время ожидания повтора такую же задачу не поставили снова
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status='queued', locked_by='', locked_at=None, last_error=error,
+                        dedupe_key=job.dedupe_key,
+                        run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+                    )
+            except IntegrityError:
+                # Пока задача выполнялась, поставили такую же: повтор выполнит она
+                Job.objects.filter(pk=job.pk).update(status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            Job.objects.filter(pk=job.pk).update(status='failed', last_error=error, finished_at=timezone.now())
+        return False
+
+    Job.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def requeue_stale(timeout=STALE_AFTER):
+    """Возвращает в очередь задачи, которые слишком долго числятся выполняемыми."""
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Воркер не завершил задачу', finished_at=now,
+    )
+    return failed + stale.update(status='queued', locked_by='', locked_at=None, run_at=now)
+
+
+def purge_finished(days):
+    """Удаляет выполненные задачи старше days дней."""
+    return Job.objects.filter(
+        status='done', finished_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()[0]
+
+
+def work(worker, stop, batch=1, poll=1.0, once=False, stale_after=STALE_AFTER):
+    """Цикл воркера: захватывает и выполняет задачи, пока не выставлен stop.
+
+    once - выйти, как только очередь опустеет. Возвращает (выполнено, с ошибкой).
+    """
+    done = failed = 0
+    last_check = None
+    while not stop.is_set():
+        now = timezone.now()
+        if last_check is None or (now - last_check).total_seconds() >= 60:
+            requeue_stale(stale_after)
+            last_check = now
+
+        jobs = claim(worker, batch)
+        if not jobs:
+            if once:
+                break
+            stop.wait(poll)
+            continue
+        for job in jobs:
+            if run_job(job):
+                done += 1
+            else:
+                failed += 1
+    return done, failed
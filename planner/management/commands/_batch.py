@@ -0,0 +1,59 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+
+def run_chunk(args):
+    """Один процесс пула: пачка пользователей со своим соединением с БД."""
+    func, chunk = args
+    try:
+        return func(*chunk)
+    finally:
+        connection.close()
+
+
+class UserBatchCommand(BaseCommand):
+    """Команда, которая обрабатывает пользователей пачками, при желании в пуле процессов.
+
+    Наследник задает chunk_size и progress_message ({done}, {total} и
+    {count} - сумма результатов пачек) и вызывает run_chunks.
+    """
+    chunk_size = 200
+    chunk_help = 'Пользователей в пачке'
+    progress_message = '{done}/{total} пачек, {count}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='ID пользователей (по умолчанию все)')
+        parser.add_argument('--chunk-size', type=int, default=self.chunk_size, help=self.chunk_help)
+        parser.add_argument('--processes', type=int, default=1)
+
+    def chunks(self, user_ids, step, *args):
+        return [(user_ids[n:n + step], *args) for n in range(0, len(user_ids), step)]
+
+    def run_chunks(self, func, chunks, processes=1):
+        """Выполняет func(*chunk) для всех пачек; возвращает сумму результатов и время."""
+        started = time.perf_counter()
+        last_report = started
+        count = 0
+        if processes > 1:
+            # Соединение родителя не должно достаться дочерним процессам
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                jobs = [(func, chunk) for chunk in chunks]
+                for done, result in enumerate(pool.imap_unordered(run_chunk, jobs), 1):
+                    count += result
+                    last_report = self.progress(done, len(chunks), count, last_report)
+        else:
+            for done, chunk in enumerate(chunks, 1):
+                count += func(*chunk)
+                last_report = self.progress(done, len(chunks), count, last_report)
+        return count, time.perf_counter() - started
+
+    def progress(self, done, total, count, last_report):
+        now = time.perf_counter()
+        if now - last_report >= 2:
+            self.stdout.write(self.progress_message.format(done=done, total=total, count=count))
+            return now
+        return last_report
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from planner.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Заполняет суточную сводку просмотров из существующей истории'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='ID пользователей (по умолчанию все)')
+        parser.add_argument('--users-per-batch', type=int, default=500, help='Пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or list(User.objects.order_by('id').values_list('id', flat=True))
+        step = options['users_per_batch']
+
+        started = time.perf_counter()
+        last_report = started
+        rows = 0
+        for start in range(0, len(user_ids), step):
+            rows += rebuild_daily_stats(user_ids[start:start + step])
+
+            now = time.perf_counter()
+            if now - last_report >= 2:
+                last_report = now
+                self.stdout.write(f'{min(start + step, len(user_ids))}/{len(user_ids)} пользователей, {rows} строк')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Суточная сводка пересобрана для {len(user_ids)} пользователей: {rows} строк '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
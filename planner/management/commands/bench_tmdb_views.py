@@ -0,0 +1,220 @@
+import asyncio
+import multiprocessing
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from planner import tmdb_service
+from planner.tmdb_stub import StubTMDBServer
+
+from .load_test import call_wsgi, login_cookies, percentile
+
+ENDPOINTS = ('search', 'import')
+
+
+class Requests:
+    """Одинаковая для обоих режимов последовательность запросов к TMDB-представлениям."""
+
+    def __init__(self, endpoint, cookies, catalog_size, seed=0):
+        self.endpoint = endpoint
+        self.cookies = cookies
+        self.catalog_size = catalog_size
+        self.random = random.Random(seed)
+        # Для POST: несекретный CSRF-токен в cookie и тот же токен в заголовке
+        self.csrf = get_random_string(32)
+
+    def next_request(self):
+        cookie = self.random.choice(self.cookies)
+        tmdb_id = self.random.randint(1, self.catalog_size)
+        if self.endpoint == 'search':
+            return 'GET', reverse('tmdb_search'), f'q={tmdb_id}', cookie, {}
+        return (
+            'POST', reverse('tmdb_import', args=[tmdb_id]), '',
+            f'{cookie}; {settings.CSRF_COOKIE_NAME}={self.csrf}', {'X-CSRFToken': self.csrf},
+        )
+
+
+async def call_asgi(application, method, path, query, cookie, headers):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'), (b'cookie', cookie.encode()),
+            *((name.lower().encode(), value.encode()) for name, value in headers.items()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    done = asyncio.Event()
+    status = []
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django слушает разрыв соединения, пока готовит ответ
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_wsgi(requests, threads, count):
+    from config.wsgi import application
+
+    latencies = []
+    errors = 0
+    queue = list(range(count))
+    lock = threading.Lock()
+
+    def loop():
+        nonlocal errors
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    queue.pop()
+                    method, path, query, cookie, headers = requests.next_request()
+                started = time.perf_counter()
+                try:
+                    status = call_wsgi(application, path, query, cookie, method=method, headers=headers)
+                except Exception:
+                    status = 599
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    errors += status >= 400
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, errors
+
+
+def run_asgi(requests, concurrency, count):
+    from config.asgi import application
+
+    latencies = []
+    errors = 0
+
+    async def worker(queue):
+        nonlocal errors
+        while queue:
+            queue.pop()
+            method, path, query, cookie, headers = requests.next_request()
+            started = time.perf_counter()
+            try:
+                status = await call_asgi(application, method, path, query, cookie, headers)
+            except Exception:
+                status = 599
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += status >= 400
+
+    async def main():
+        queue = list(range(count))
+        await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность TMDB-представлений под WSGI (пул потоков) '
+        'и ASGI (одна петля событий) на заглушке TMDB с задержкой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='search')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на режим')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков WSGI-сервера')
+        parser.add_argument('--concurrency', type=int, default=64, help='Одновременных запросов к ASGI')
+        parser.add_argument('--latency', type=float, default=0.2, help='Задержка ответа заглушки, сек')
+        parser.add_argument('--catalog-size', type=int, default=200)
+        parser.add_argument('--rate-limit', type=float, default=1000, help='Лимит запросов к заглушке в секунду')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--prefix', default='bench', help='Префикс пользователей из generate_data')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=f'{options["prefix"]}_').order_by('id')[:options['users']])
+        if not users:
+            raise CommandError(f'Нет пользователей {options["prefix"]}_*: сначала выполните generate_data')
+        cookies = login_cookies(users)
+
+        self.stdout.write(
+            f'{options["endpoint"]}: {options["requests"]} запросов на режим, задержка TMDB '
+            f'{options["latency"] * 1000:.0f} мс, WSGI {options["threads"]} потоков, '
+            f'ASGI {options["concurrency"]} одновременных запросов'
+        )
+        # Заглушка работает в отдельном процессе, чтобы не делить GIL с приложением
+        server = StubTMDBServer(latency=options['latency'], catalog_size=options['catalog_size'])
+        connections.close_all()
+        stub = multiprocessing.get_context('fork').Process(target=server.httpd.serve_forever, daemon=True)
+        stub.start()
+
+        results = {}
+        saved = tmdb_service.BASE_URL, tmdb_service.TMDB_API_KEY, tmdb_service.RATE_LIMIT
+        tmdb_service.BASE_URL, tmdb_service.TMDB_API_KEY = server.url, 'stub'
+        tmdb_service.RATE_LIMIT = options['rate_limit']
+        try:
+            # Без кэша каждый запрос доходит до заглушки: сравнивается именно ожидание TMDB
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                for mode, run, workers in (
+                    ('WSGI', run_wsgi, options['threads']),
+                    ('ASGI', run_asgi, options['concurrency']),
+                ):
+                    requests = Requests(options['endpoint'], cookies, options['catalog_size'], options['seed'])
+                    started = time.perf_counter()
+                    latencies, errors = run(requests, workers, options['requests'])
+                    results[mode] = (latencies, errors, time.perf_counter() - started)
+        finally:
+            tmdb_service.BASE_URL, tmdb_service.TMDB_API_KEY, tmdb_service.RATE_LIMIT = saved
+            stub.terminate()
+            stub.join()
+            server.httpd.server_close()
+
+        self.report(results)
+
+    def report(self, results):
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"Режим":<6} {"Запросов":>9} {"Ошибок":>7} {"RPS":>8} {"p50, мс":>9} {"p95, мс":>9}'
+        )
+        for mode, (latencies, errors, elapsed) in results.items():
+            self.stdout.write(
+                f'{mode:<6} {len(latencies):>9} {errors:>7} {len(latencies) / elapsed:>8.1f} '
+                f'{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f}'
+            )
+        wsgi, asgi = results['WSGI'], results['ASGI']
+        speedup = (len(asgi[0]) / asgi[2]) / (len(wsgi[0]) / wsgi[2])
+        self.stdout.write(self.style.SUCCESS(f'ASGI быстрее WSGI в {speedup:.1f} раза по RPS'))
@@ -0,0 +1,27 @@
+from django.utils import timezone
+
+from planner.models import UserViewingPlan
+from planner.scheduling import SCHEDULE_WEEKS, rebuild_schedules
+
+from ._batch import UserBatchCommand
+
+
+class Command(UserBatchCommand):
+    help = 'Пересчитывает расписания просмотра всех пользователей с планами "Смотрю"'
+    chunk_help = 'Пользователей на один запрос планов'
+    progress_message = '{done}/{total} пачек, {count} расписаний'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--weeks', type=int, default=SCHEDULE_WEEKS)
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or list(
+            UserViewingPlan.objects.filter(status='watching').order_by('user_id')
+            .values_list('user_id', flat=True).distinct()
+        )
+        chunks = self.chunks(user_ids, options['chunk_size'], options['weeks'], timezone.localdate())
+        built, elapsed = self.run_chunks(rebuild_schedules, chunks, options['processes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено {built} расписаний за {elapsed:.1f} с ({built / max(elapsed, 1e-9):.0f} в секунду)'
+        ))
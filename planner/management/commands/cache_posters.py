@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from planner.models import Series
+from planner.posters import cache_poster
+
+
+def _cache(series_id):
+    try:
+        return cache_poster(series_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Скачивает постеры сериалов и создает миниатюры WebP/JPEG в MEDIA_ROOT/posters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--force', action='store_true', help='Пересоздать миниатюры для всех сериалов')
+
+    def handle(self, *args, **options):
+        if options['force']:
+            Series.objects.exclude(poster_thumbs={}).update(poster_thumbs={})
+
+        series_ids = [
+            series_id
+            for series_id, url, thumbs in Series.objects.filter(poster_url__isnull=False).exclude(
+                poster_url=''
+            ).values_list('id', 'poster_url', 'poster_thumbs').iterator()
+            if (thumbs or {}).get('source') != url
+        ]
+        self.stdout.write(f'Постеров к обработке: {len(series_ids)}')
+
+        started = time.perf_counter()
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for result in pool.map(_cache, series_ids):
+                if result is None:
+                    failed += 1
+                else:
+                    done += 1
+                if (done + failed) % 100 == 0:
+                    self.stdout.write(f'{done + failed}/{len(series_ids)}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,21 @@
+from django.utils import timezone
+
+from planner.forecasting import forecast_users, refresh_forecasts
+
+from ._batch import UserBatchCommand
+
+
+class Command(UserBatchCommand):
+    help = 'Пересчитывает прогнозы завершения планов "Смотрю" по реальному темпу просмотра'
+    chunk_size = 500
+    chunk_help = 'Пользователей на одну матрицу NumPy'
+    progress_message = '{done}/{total} пачек, изменилось планов: {count}'
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or list(forecast_users())
+        chunks = self.chunks(user_ids, options['chunk_size'], timezone.localdate())
+        changed, elapsed = self.run_chunks(refresh_forecasts, chunks, options['processes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогнозы пересчитаны для {len(user_ids)} пользователей за {elapsed:.1f} с, '
+            f'изменилось планов: {changed}'
+        ))
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from planner.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический набор данных для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, default=1000)
+        parser.add_argument('--seasons', type=int, default=3, help='Среднее число сезонов')
+        parser.add_argument('--episodes-per-season', type=int, default=10)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--plans-per-user', type=int, default=50)
+        parser.add_argument('--history-per-user', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help='Префикс имен пользователей')
+        parser.add_argument('--password', default='benchmark')
+        parser.add_argument(
+            '--skip-stats', action='store_true',
+            help='Не пересчитывать UserStats (они будут построены при первом обращении)',
+        )
+
+    def handle(self, *args, **options):
+        self.last_report = 0.0
+        seeder = Seeder(
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=self.report,
+            password=options['password'],
+        )
+
+        started = time.perf_counter()
+        if options['series']:
+            seeder.series(options['series'], options['seasons'], options['episodes_per_season'])
+        if options['users']:
+            seeder.users(
+                options['users'],
+                options['plans_per_user'],
+                options['history_per_user'],
+                prefix=options['prefix'],
+                rebuild_stats=not options['skip_stats'],
+            )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write('')
+        self.stdout.write(f'{"Таблица":<15} {"Строк":>12} {"Сек":>9} {"Строк/с":>10}')
+        total_rows = 0
+        for table, (rows, seconds) in seeder.totals.items():
+            total_rows += rows
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{table:<15} {rows:>12} {seconds:>9.1f} {rate:>10.0f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {total_rows} строк за {elapsed:.1f} с ({total_rows / elapsed:.0f} строк/с)'
+        ))
+
+    def report(self, table, rows, seconds):
+        now = time.monotonic()
+        if now - self.last_report < 2:
+            return
+        self.last_report = now
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(f'{table}: {rows} строк, {rate:.0f} строк/с')
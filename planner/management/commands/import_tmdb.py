@@ -0,0 +1,171 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.models import Series
+from planner.ratelimit import shared_bucket
+from planner.tmdb_service import (
+    RATE_LIMIT, TMDB_API_KEY, TMDBClient, TMDBError, finish_episode_import, season_hashes,
+    season_numbers, series_fields_from_tmdb, sync_season_episodes, upsert_series,
+)
+
+
+class Command(BaseCommand):
+    help = 'Параллельный импорт сериалов из TMDB по списку id или страницам поиска/discover'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='TMDB id сериалов')
+        parser.add_argument('--ids-file', help='Файл с TMDB id, по одному на строку')
+        parser.add_argument('--search', action='append', default=[], help='Поисковый запрос (можно несколько)')
+        parser.add_argument('--discover', action='store_true', help='Брать id из /discover/tv')
+        parser.add_argument('--pages', type=int, default=1, help='Сколько страниц поиска/discover обойти')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--skip-episodes', action='store_true', help='Не загружать сезоны и эпизоды')
+        parser.add_argument('--retries', type=int, default=3, help='Повторов на 429/5xx')
+        parser.add_argument('--rate', type=float, default=RATE_LIMIT, help='Запросов в секунду на все процессы')
+        parser.add_argument('--api-key', default=TMDB_API_KEY)
+        parser.add_argument('--base-url', help='Адрес API, например заглушки из planner.tmdb_stub')
+
+    def handle(self, *args, **options):
+        if not options['api_key']:
+            raise CommandError('Не задан TMDB_API_KEY (или --api-key)')
+
+        client = TMDBClient(
+            api_key=options['api_key'],
+            base_url=options['base_url'],
+            pool_size=options['workers'],
+            retries=options['retries'],
+            rate_limiter=shared_bucket('tmdb', options['rate']),
+        )
+        self.started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            ids = self.collect_ids(client, pool, options)
+            if not ids:
+                raise CommandError('Нет id для импорта')
+            existing = set(Series.objects.filter(tmdb_id__in=ids).values_list('tmdb_id', flat=True))
+            self.stdout.write(f'К импорту {len(ids)} сериалов ({len(existing)} уже в каталоге)')
+
+            failures = {}
+            batch = []
+            written = 0
+            imported = {}
+            last_report = 0.0
+            futures = {pool.submit(client.get_series_details, tmdb_id): tmdb_id for tmdb_id in ids}
+
+            for done, future in enumerate(as_completed(futures), 1):
+                tmdb_id = futures[future]
+                try:
+                    batch.append(future.result())
+                except TMDBError as e:
+                    failures[tmdb_id] = str(e)
+
+                if len(batch) >= options['batch_size']:
+                    written += self.flush(batch, imported)
+                    batch = []
+
+                now = time.perf_counter()
+                if now - last_report >= 2:
+                    last_report = now
+                    self.stdout.write(
+                        f'{done}/{len(ids)} получено, {written} записано, '
+                        f'{len(failures)} ошибок, {done / (now - self.started):.1f} сериалов/с'
+                    )
+
+            if batch:
+                written += self.flush(batch, imported)
+
+            episodes = 0
+            if not options['skip_episodes']:
+                episodes = self.import_episodes(client, pool, imported, failures)
+
+        self.report(ids, existing, written, episodes, failures)
+
+    def flush(self, batch, imported):
+        series_ids = upsert_series(batch)
+        for details in batch:
+            imported[details['id']] = (series_ids[details['id']], details)
+        return len(series_ids)
+
+    def import_episodes(self, client, pool, imported, failures):
+        """Загружает сезоны всех импортированных сериалов в общем пуле потоков.
+
+        Эпизоды сезона пишутся одним upsert, индекс сезонов пересобирается,
+        когда загружен последний сезон сериала.
+        """
+        futures = {}
+        remaining = {}
+        written = {}
+        hashes = {}
+        for tmdb_id, (series_id, details) in imported.items():
+            numbers = season_numbers(details)
+            remaining[series_id] = len(numbers)
+            written[series_id] = 0
+            hashes[series_id] = season_hashes(details)
+            default_duration = series_fields_from_tmdb(details)['average_episode_duration']
+            for number in numbers:
+                future = pool.submit(client.get_season, tmdb_id, number)
+                futures[future] = (tmdb_id, series_id, number, default_duration)
+
+        total = 0
+        last_report = time.perf_counter()
+        for done, future in enumerate(as_completed(futures), 1):
+            tmdb_id, series_id, number, default_duration = futures[future]
+            try:
+                season = future.result()
+            except TMDBError as e:
+                failures[f'{tmdb_id}/season/{number}'] = str(e)
+                hashes[series_id].pop(str(number), None)
+            else:
+                count = sync_season_episodes(series_id, number, season.get('episodes', []), default_duration)
+                written[series_id] += count
+                total += count
+
+            remaining[series_id] -= 1
+            if not remaining[series_id]:
+                finish_episode_import(
+                    series_id, rebuild_index=bool(written[series_id]), season_hashes=hashes[series_id]
+                )
+
+            now = time.perf_counter()
+            if now - last_report >= 2:
+                last_report = now
+                self.stdout.write(f'Сезоны: {done}/{len(futures)}, записано эпизодов: {total}')
+        return total
+
+    def collect_ids(self, client, pool, options):
+        ids = list(options['ids'])
+        if options['ids_file']:
+            with open(options['ids_file'], encoding='utf-8') as f:
+                ids.extend(int(line) for line in f if line.strip())
+
+        pages = range(1, options['pages'] + 1)
+        calls = [(client.search_page, query, page) for query in options['search'] for page in pages]
+        if options['discover']:
+            calls.extend((client.discover_page, page) for page in pages)
+
+        for future in as_completed([pool.submit(*call) for call in calls]):
+            try:
+                ids.extend(result['id'] for result in future.result().get('results', []))
+            except TMDBError as e:
+                self.stderr.write(f'Не удалось получить страницу: {e}')
+
+        return list(dict.fromkeys(ids))
+
+    def report(self, ids, existing, written, episodes, failures):
+        elapsed = time.perf_counter() - self.started
+        created = written - len(existing & set(ids) - set(failures))
+        self.stdout.write('')
+        self.stdout.write(
+            f'Создано: {created}, обновлено: {written - created}, '
+            f'эпизодов записано: {episodes}, ошибок: {len(failures)}'
+        )
+        for tmdb_id, error in list(failures.items())[:10]:
+            self.stdout.write(f'  {tmdb_id}: {error}')
+        if len(failures) > 10:
+            self.stdout.write(f'  ... и еще {len(failures) - 10}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {written} сериалов за {elapsed:.1f} с ({written / elapsed:.1f} сериалов/с)'
+        ))
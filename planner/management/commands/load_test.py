@@ -0,0 +1,251 @@
+import io
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+from importlib import import_module
+
+from planner.models import UserViewingPlan
+from planner.seeding import WORDS
+
+DEFAULT_MIX = 'home=30,series_detail=25,mark_watched=10,statistics=15,search=20'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class Scenario:
+    """Взвешенный набор запросов от имени заранее залогиненных пользователей."""
+
+    def __init__(self, mix, sessions, plans, seed=0):
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.sessions = sessions
+        self.plans = plans
+        self.random = random.Random(seed)
+
+    def next_request(self):
+        endpoint = self.random.choices(self.endpoints, self.weights)[0]
+        user_id, cookie = self.random.choice(self.sessions)
+        query = ''
+
+        if endpoint == 'home':
+            path = reverse('home')
+        elif endpoint == 'statistics':
+            path = reverse('statistics')
+        elif endpoint == 'search':
+            path = reverse('search')
+            query = urlencode({'q': self.random.choice(WORDS)})
+        else:
+            plan_id, series_id = self.random.choice(self.plans[user_id])
+            if endpoint == 'series_detail':
+                path = reverse('series_detail', args=[series_id])
+            elif endpoint == 'mark_watched':
+                path = reverse('mark_episode_watched', args=[
+                    plan_id, self.random.randint(1, 2), self.random.randint(1, 8),
+                ])
+            else:
+                raise CommandError(f'Неизвестный endpoint: {endpoint}')
+        return endpoint, path, query, cookie
+
+
+def login_cookies(users):
+    """Значение заголовка Cookie с новой сессией для каждого пользователя."""
+    engine = import_module(settings.SESSION_ENGINE)
+    backend = settings.AUTHENTICATION_BACKENDS[0]
+    cookies = []
+    for user in users:
+        session = engine.SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+    return cookies
+
+
+def call_wsgi(application, path, query, cookie, method='GET', headers=None):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    status = []
+
+    def start_response(value, headers, exc_info=None):
+        status.append(int(value.split(' ', 1)[0]))
+
+    body = application(environ, start_response)
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return status[0]
+
+
+def run_worker(scenario_args, threads, duration, requests_per_thread, seed):
+    """Один процесс: threads потоков гоняют WSGI-приложение."""
+    from config.wsgi import application
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def loop(thread_number):
+        scenario = Scenario(*scenario_args, seed=seed * 1000 + thread_number)
+        deadline = time.monotonic() + duration if duration else None
+        done = 0
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        try:
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                if requests_per_thread and done >= requests_per_thread:
+                    break
+                endpoint, path, query, cookie = scenario.next_request()
+                started = time.perf_counter()
+                try:
+                    status = call_wsgi(application, path, query, cookie)
+                except Exception:
+                    status = 599
+                local[endpoint].append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    local_errors[endpoint] += 1
+                done += 1
+        finally:
+            connections.close_all()
+        with lock:
+            for endpoint, values in local.items():
+                latencies[endpoint].extend(values)
+            for endpoint, count in local_errors.items():
+                errors[endpoint] += count
+
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return dict(latencies), dict(errors)
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест WSGI-приложения (config.wsgi.application) со взвешенным набором запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Потоков в каждом процессе')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--duration', type=float, default=30, help='Длительность, сек (0 - без ограничения)')
+        parser.add_argument('--requests', type=int, default=0, help='Запросов на поток (0 - без ограничения)')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Веса запросов, по умолчанию {DEFAULT_MIX}')
+        parser.add_argument('--users', type=int, default=50, help='Сколько пользователей использовать')
+        parser.add_argument('--prefix', default='bench', help='Префикс пользователей из generate_data')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not options['duration'] and not options['requests']:
+            raise CommandError('Укажите --duration или --requests')
+
+        mix = {}
+        for item in options['mix'].split(','):
+            name, _, weight = item.partition('=')
+            mix[name.strip()] = float(weight or 1)
+
+        scenario_args = self.prepare(mix, options['users'], options['prefix'])
+
+        self.stdout.write(
+            f'Процессов: {options["processes"]}, потоков: {options["threads"]}, '
+            f'пользователей: {len(scenario_args[1])}'
+        )
+        worker_args = [
+            (scenario_args, options['threads'], options['duration'], options['requests'], options['seed'] + n)
+            for n in range(options['processes'])
+        ]
+
+        started = time.perf_counter()
+        if options['processes'] > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                results = pool.starmap(run_worker, worker_args)
+        else:
+            results = [run_worker(*worker_args[0])]
+        elapsed = time.perf_counter() - started
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        for worker_latencies, worker_errors in results:
+            for endpoint, values in worker_latencies.items():
+                latencies[endpoint].extend(values)
+            for endpoint, count in worker_errors.items():
+                errors[endpoint] += count
+
+        self.report(latencies, errors, elapsed)
+
+    def prepare(self, mix, user_count, prefix):
+        users = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id')[:user_count])
+        if not users:
+            raise CommandError(f'Нет пользователей {prefix}_*: сначала выполните generate_data')
+
+        sessions = [(user.pk, cookie) for user, cookie in zip(users, login_cookies(users))]
+        plans = defaultdict(list)
+
+        for plan_id, user_id, series_id in UserViewingPlan.objects.filter(
+            user__in=users
+        ).values_list('id', 'user_id', 'series_id'):
+            plans[user_id].append((plan_id, series_id))
+
+        sessions = [(user_id, cookie) for user_id, cookie in sessions if plans[user_id]]
+        if not sessions:
+            raise CommandError('У тестовых пользователей нет сериалов в списке')
+        return mix, sessions, dict(plans)
+
+    def report(self, latencies, errors, elapsed):
+        total = sum(len(values) for values in latencies.values())
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"Endpoint":<15} {"Запросов":>9} {"Ошибок":>7} {"RPS":>8} '
+            f'{"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9}'
+        )
+        for endpoint in sorted(latencies):
+            values = latencies[endpoint]
+            self.stdout.write(
+                f'{endpoint:<15} {len(values):>9} {errors.get(endpoint, 0):>7} '
+                f'{len(values) / elapsed:>8.1f} {percentile(values, 0.5):>9.1f} '
+                f'{percentile(values, 0.95):>9.1f} {percentile(values, 0.99):>9.1f}'
+            )
+        all_values = [value for values in latencies.values() for value in values]
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total} запросов за {elapsed:.1f} с: {total / elapsed:.1f} RPS, '
+            f'p50 {percentile(all_values, 0.5):.1f} мс, p95 {percentile(all_values, 0.95):.1f} мс, '
+            f'p99 {percentile(all_values, 0.99):.1f} мс'
+        ))
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from planner.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='ID пользователей (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or User.objects.values_list('id', flat=True).iterator()
+
+        count = 0
+        for user_id in user_ids:
+            rebuild_user_stats(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана для {count} пользователей'))
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Count
+
+from planner import jobs
+from planner.models import Job
+
+
+def worker_main(name, stop, options):
+    """Один процесс-воркер: по сигналу доделывает текущую задачу и выходит."""
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+    try:
+        jobs.work(name, stop, options['batch'], options['poll'], options['once'], options['stale_after'])
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди planner.Job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Сколько процессов-воркеров запустить')
+        parser.add_argument('--batch', type=int, default=1, help='Задач на один захват')
+        parser.add_argument('--poll', type=float, default=1.0, help='Пауза при пустой очереди, сек')
+        parser.add_argument('--once', action='store_true', help='Выйти, когда очередь опустеет')
+        parser.add_argument('--stale-after', type=int, default=jobs.STALE_AFTER,
+                            help='Через сколько секунд вернуть в очередь задачу зависшего воркера')
+        parser.add_argument('--keep-days', type=int, default=7, help='Сколько дней хранить выполненные задачи')
+
+    def handle(self, *args, **options):
+        purged = jobs.purge_finished(options['keep_days'])
+        if purged:
+            self.stdout.write(f'Удалено выполненных задач: {purged}')
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        started = time.perf_counter()
+        if options['workers'] > 1:
+            # Соединение родителя не должно достаться дочерним процессам
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            processes = [
+                context.Process(target=worker_main, args=(f'{prefix}-{n}', stop, options))
+                for n in range(options['workers'])
+            ]
+            for process in processes:
+                process.start()
+            self.wait(processes, stop)
+        else:
+            stop = threading.Event()
+            handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+            for signum in handlers:
+                signal.signal(signum, lambda *args: stop.set())
+            try:
+                done, failed = jobs.work(
+                    prefix, stop, options['batch'], options['poll'], options['once'], options['stale_after'],
+                )
+            finally:
+                for signum, handler in handlers.items():
+                    signal.signal(signum, handler)
+            self.stdout.write(f'Выполнено задач: {done}, с ошибкой: {failed}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Воркеры остановлены через {time.perf_counter() - started:.1f} с; {self.queue_state()}'
+        ))
+
+    def wait(self, processes, stop):
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        last_report = time.perf_counter()
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(0.2)
+            now = time.perf_counter()
+            if now - last_report >= 2 and not stop.is_set():
+                self.stdout.write(self.queue_state())
+                last_report = now
+        connections.close_all()
+
+    def queue_state(self):
+        counts = dict(Job.objects.order_by().values_list('status').annotate(count=Count('id')))
+        return ', '.join(
+            f'{label.lower()}: {counts.get(status, 0)}' for status, label in Job.STATUS_CHOICES
+        )
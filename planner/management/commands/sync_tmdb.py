@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.ratelimit import shared_bucket
+from planner.tmdb_service import RATE_LIMIT, TMDB_API_KEY, TMDBClient
+from planner.tmdb_sync import sync_catalog
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальная синхронизация каталога с TMDB (продолжает прерванный прогон)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Проверить все сериалы по хэшам, а не по /tv/changes')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--retries', type=int, default=3, help='Повторов на 429/5xx')
+        parser.add_argument('--rate', type=float, default=RATE_LIMIT, help='Запросов в секунду на все процессы')
+        parser.add_argument('--api-key', default=TMDB_API_KEY)
+        parser.add_argument('--base-url', help='Адрес API, например заглушки из planner.tmdb_stub')
+
+    def handle(self, *args, **options):
+        if not options['api_key']:
+            raise CommandError('Не задан TMDB_API_KEY (или --api-key)')
+
+        client = TMDBClient(
+            api_key=options['api_key'],
+            base_url=options['base_url'],
+            pool_size=options['workers'],
+            retries=options['retries'],
+            rate_limiter=shared_bucket('tmdb', options['rate']),
+        )
+        metrics = sync_catalog(
+            client,
+            full=options['full'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=self.progress,
+        )
+
+        self.stdout.write('')
+        for name, value in metrics.items():
+            self.stdout.write(f'{name:<20} {value}')
+        self.stdout.write(self.style.SUCCESS('Синхронизация завершена'))
+
+    def progress(self, metrics, remaining):
+        self.stdout.write(
+            f'Проверено {metrics["series_fetched"]}, обновлено {metrics["series_updated"]}, '
+            f'эпизодов записано {metrics["episodes_written"]}, осталось {remaining}'
+        )
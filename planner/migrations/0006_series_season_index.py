@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+from planner.season_index import index_from_rows
+
+
+def build_indexes(apps, schema_editor):
+    Series = apps.get_model('planner', 'Series')
+    Episode = apps.get_model('planner', 'Episode')
+
+    series_ids = Episode.objects.values_list('series_id', flat=True).distinct()
+    for series_id in series_ids:
+        rows = Episode.objects.filter(series_id=series_id).order_by(
+            'season_number', 'episode_number'
+        ).values_list('season_number', 'duration')
+        Series.objects.filter(pk=series_id).update(season_index=index_from_rows(rows))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0005_alter_userviewingplan_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='series',
+            name='season_index',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Индекс сезонов'),
+        ),
+        migrations.RunPython(build_indexes, migrations.RunPython.noop),
+    ]
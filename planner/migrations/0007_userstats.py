@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_series_season_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_series', models.IntegerField(default=0, verbose_name='Всего сериалов')),
+                ('watching', models.IntegerField(default=0, verbose_name='Смотрю')),
+                ('completed', models.IntegerField(default=0, verbose_name='Завершено')),
+                ('paused', models.IntegerField(default=0, verbose_name='На паузе')),
+                ('planning', models.IntegerField(default=0, verbose_name='В планах')),
+                ('dropped', models.IntegerField(default=0, verbose_name='Брошено')),
+                ('total_episodes', models.IntegerField(default=0, verbose_name='Эпизодов просмотрено')),
+                ('total_minutes', models.IntegerField(default=0, verbose_name='Минут просмотрено')),
+                ('genre_counts', models.JSONField(blank=True, default=dict, verbose_name='Жанры')),
+                ('history_entries', models.IntegerField(default=0, verbose_name='Записей в истории')),
+                ('history_minutes', models.IntegerField(default=0, verbose_name='Минут в истории')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:17
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def unique_slug(name, Genre):
+    base = slugify(name, allow_unicode=True) or 'genre'
+    slug = base
+    suffix = 2
+    while Genre.objects.filter(slug=slug).exists():
+        slug = f'{base}-{suffix}'
+        suffix += 1
+    return slug
+
+
+def split_genres(apps, schema_editor):
+    Genre = apps.get_model('planner', 'Genre')
+    Series = apps.get_model('planner', 'Series')
+
+    genres = {}
+    for series in Series.objects.exclude(genres='').only('id', 'genres'):
+        names = [name.strip() for name in series.genres.split(',') if name.strip()]
+        tags = []
+        for name in names:
+            if name not in genres:
+                genres[name] = Genre.objects.get_or_create(
+                    name=name, defaults={'slug': unique_slug(name, Genre)}
+                )[0]
+            tags.append(genres[name])
+        series.genre_tags.set(tags)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('slug', models.SlugField(allow_unicode=True, max_length=100, unique=True, verbose_name='Слаг')),
+                ('tmdb_id', models.IntegerField(blank=True, null=True, unique=True, verbose_name='TMDB ID')),
+            ],
+            options={
+                'verbose_name': 'Жанр',
+                'verbose_name_plural': 'Жанры',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='genre_tags',
+            field=models.ManyToManyField(blank=True, related_name='series', to='planner.genre', verbose_name='Жанры (справочник)'),
+        ),
+        migrations.RunPython(split_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+
+def fold(column):
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE planner_series_fts USING fts5(
+        title, genres, description,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER planner_series_fts_insert AFTER INSERT ON planner_series BEGIN
+        INSERT INTO planner_series_fts(rowid, title, genres, description)
+        VALUES (new.id, {fold('new.title')}, {fold('new.genres')}, {fold('new.description')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER planner_series_fts_update AFTER UPDATE OF title, genres, description ON planner_series BEGIN
+        DELETE FROM planner_series_fts WHERE rowid = old.id;
+        INSERT INTO planner_series_fts(rowid, title, genres, description)
+        VALUES (new.id, {fold('new.title')}, {fold('new.genres')}, {fold('new.description')});
+    END
+    """,
+    """
+    CREATE TRIGGER planner_series_fts_delete AFTER DELETE ON planner_series BEGIN
+        DELETE FROM planner_series_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    INSERT INTO planner_series_fts(rowid, title, genres, description)
+    SELECT id, {fold('title')}, {fold('genres')}, {fold('description')} FROM planner_series
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS planner_series_fts_insert",
+    "DROP TRIGGER IF EXISTS planner_series_fts_update",
+    "DROP TRIGGER IF EXISTS planner_series_fts_delete",
+    "DROP TABLE IF EXISTS planner_series_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE planner_series ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', translate(coalesce(title, ''), 'ёЁ', 'еЕ')), 'A') ||
+        setweight(to_tsvector('simple', translate(coalesce(genres, ''), 'ёЁ', 'еЕ')), 'B') ||
+        setweight(to_tsvector('simple', translate(coalesce(description, ''), 'ёЁ', 'еЕ')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX planner_series_search_idx ON planner_series USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS planner_series_search_idx",
+    "ALTER TABLE planner_series DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_genre'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:21
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0009_series_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('rating', models.Value(-1.0)), descending=True), models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('id')), name='planner_series_catalog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userviewingplan',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='planner_plan_user_order_idx'),
+        ),
+    ]
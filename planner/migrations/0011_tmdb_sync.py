@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0010_catalog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('watermark', models.DateTimeField(blank=True, null=True, verbose_name='Синхронизировано на')),
+                ('run_started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало текущего прогона')),
+                ('pending', models.JSONField(blank=True, default=list, verbose_name='Осталось обработать')),
+                ('metrics', models.JSONField(blank=True, default=dict, verbose_name='Метрики последнего прогона')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Состояние синхронизации',
+                'verbose_name_plural': 'Состояния синхронизации',
+            },
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='tmdb_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Хэш данных TMDB'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='tmdb_season_hashes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Хэши сезонов TMDB'),
+        ),
+    ]
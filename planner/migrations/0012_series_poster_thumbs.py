@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_tmdb_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='series',
+            name='poster_thumbs',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Миниатюры постера'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0012_series_poster_thumbs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userseriesrating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0013_userseriesrating_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyWatchStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('minutes', models.IntegerField(default=0, verbose_name='Минут просмотрено')),
+                ('episodes', models.IntegerField(default=0, verbose_name='Эпизодов просмотрено')),
+                ('series', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_watch_stats', to='planner.series', verbose_name='Сериал')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_watch_stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Просмотр за день',
+                'verbose_name_plural': 'Просмотр по дням',
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'series'), name='daily_watch_stats_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-17 02:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0015_viewing_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(fields=['updated_at', 'id'], name='planner_series_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchinghistory',
+            index=models.Index(fields=['user', 'watched_at', 'id'], name='planner_history_user_time_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# auth_user принадлежит django.contrib.auth, поэтому индекс создается через
+# schema_editor, а не AddIndex: состояние чужой модели не меняется.
+# Без поддержки индексов по выражениям (MySQL < 8.0.13) schema_editor его пропускает.
+INDEX = models.Index(Lower('email'), name='planner_user_email_lower_idx')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0017_job_queue'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0018_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='forecast_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='forecast_earliest',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='forecast_latest',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='forecast_pace',
+            field=models.FloatField(blank=True, help_text='Эпизодов в день по истории', null=True),
+        ),
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='forecast_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+from planner.season_index import SeasonIndex
+
+
+def fill_episodes_watched(apps, schema_editor):
+    Series = apps.get_model('planner', 'Series')
+    UserViewingPlan = apps.get_model('planner', 'UserViewingPlan')
+
+    series_ids = UserViewingPlan.objects.values_list('series_id', flat=True).distinct()
+    for series in Series.objects.filter(pk__in=series_ids).iterator():
+        index = SeasonIndex.for_series(series)
+        plans = list(UserViewingPlan.objects.filter(series_id=series.pk).only(
+            'last_season_watched', 'last_episode_watched'
+        ))
+        for plan in plans:
+            plan.episodes_watched = index.to_ordinal(plan.last_season_watched, plan.last_episode_watched)
+        UserViewingPlan.objects.bulk_update(plans, ['episodes_watched'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0020_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userviewingplan',
+            name='episodes_watched',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_episodes_watched, migrations.RunPython.noop),
+    ]
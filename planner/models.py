@@ -1,8 +1,43 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Cast, Ceil, Coalesce, Floor, Greatest
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from .season_index import SeasonIndex
+
+
+class Genre(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+    slug = models.SlugField(max_length=100, unique=True, allow_unicode=True, verbose_name="Слаг")
+    tmdb_id = models.IntegerField(
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="TMDB ID"
+    )
+
+    class Meta:
+        verbose_name = "Жанр"
+        verbose_name_plural = "Жанры"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class SeriesQuerySet(models.QuerySet):
+    def with_catalog_rating(self):
+        # Без NULL, чтобы сортировка совпадала с индексом на любой СУБД
+        return self.annotate(catalog_rating=Coalesce('rating', Value(-1.0)))
+
+    def for_cards(self):
+        return self.only(
+            'id', 'title', 'poster_url', 'poster_thumbs', 'genres', 'total_episodes',
+            'average_episode_duration', 'rating', 'created_at', 'updated_at',
+        )
+
 
 class Series(models.Model):
     title = models.CharField(max_length=255, verbose_name="Название")
@@ -27,6 +62,12 @@ class Series(models.Model):
         blank=True,
         verbose_name="Жанры"
     )
+    genre_tags = models.ManyToManyField(
+        Genre,
+        blank=True,
+        related_name='series',
+        verbose_name="Жанры (справочник)"
+    )
     poster_url = models.URLField(
         blank=True,
         null=True,
@@ -48,6 +89,30 @@ class Series(models.Model):
         blank=True,
         verbose_name="Год выхода"
     )
+    season_index = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Индекс сезонов"
+    )
+    tmdb_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        verbose_name="Хэш данных TMDB"
+    )
+    tmdb_season_hashes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Хэши сезонов TMDB"
+    )
+    poster_thumbs = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Миниатюры постера"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата добавления"
@@ -57,10 +122,23 @@ class Series(models.Model):
         verbose_name="Дата обновления"
     )
 
+    CATALOG_ORDERING = ['-catalog_rating', '-created_at', 'id']
+
+    objects = SeriesQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Сериал"
         verbose_name_plural = "Сериалы"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                Coalesce('rating', Value(-1.0)).desc(),
+                F('created_at').desc(),
+                F('id').asc(),
+                name='planner_series_catalog_idx',
+            ),
+            models.Index(fields=['updated_at', 'id'], name='planner_series_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -71,6 +149,9 @@ class Series(models.Model):
     def get_total_duration_hours(self):
         return round(self.get_total_duration_minutes() / 60, 1)
 
+    def get_season_index(self):
+        return SeasonIndex.for_series(self)
+
 
 class Episode(models.Model):
     series = models.ForeignKey(
@@ -120,6 +201,49 @@ class Episode(models.Model):
         return f"S{self.season_number:02d}E{self.episode_number:02d}"
 
 
+class UserViewingPlanQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Прогресс просмотра для всех планов одним SQL-запросом.
+
+        Просмотренные эпизоды берутся из episodes_watched, который считается
+        тем же SeasonIndex.to_ordinal(), что и get_episodes_watched();
+        остальное повторяет арифметику связанных методов. Результаты доступны
+        как progress_watched, progress_remaining, progress_percentage и
+        progress_days.
+        """
+        return self.annotate(
+            progress_watched=F('episodes_watched'),
+        ).annotate(
+            progress_remaining=Greatest(F('series__total_episodes') - F('progress_watched'), 0),
+            progress_percentage=Case(
+                When(
+                    series__total_episodes__gt=0,
+                    then=Cast(
+                        Floor(
+                            Cast('progress_watched', FloatField())
+                            / F('series__total_episodes') * 100
+                        ),
+                        IntegerField(),
+                    ),
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        ).annotate(
+            progress_days=Case(
+                When(
+                    episodes_per_day__gt=0,
+                    then=Cast(
+                        Ceil(Cast('progress_remaining', FloatField()) / F('episodes_per_day')),
+                        IntegerField(),
+                    ),
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+
+
 class UserViewingPlan(models.Model):
     STATUS_CHOICES = [
         ('watching', 'Смотрю'),
@@ -135,6 +259,9 @@ class UserViewingPlan(models.Model):
     
     last_season_watched = models.IntegerField(default=0)
     last_episode_watched = models.IntegerField(default=0)
+    # SeasonIndex.to_ordinal() последней серии; пишется при сохранении плана
+    # и в schedule_series_stats при изменении сериала, with_progress только читает
+    episodes_watched = models.IntegerField(default=0, editable=False)
     
     episodes_per_day = models.IntegerField(default=2, help_text="Сколько эпизодов смотрите в день")
     
@@ -143,46 +270,44 @@ class UserViewingPlan(models.Model):
     started_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Прогноз по реальному темпу из истории (planner.forecasting); считается
+    # пачками командой compute_forecasts и фоновой задачей, шаблоны только читают
+    forecast_pace = models.FloatField(null=True, blank=True, help_text="Эпизодов в день по истории")
+    forecast_date = models.DateField(null=True, blank=True)
+    forecast_earliest = models.DateField(null=True, blank=True)
+    forecast_latest = models.DateField(null=True, blank=True)
+    forecast_updated_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = UserViewingPlanQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('user', 'series')
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at', '-id'], name='planner_plan_user_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.series.title} ({self.get_status_display()})"
     
     def get_episodes_watched(self):
-        has_episodes = Episode.objects.filter(series=self.series).exists()
+        if hasattr(self, 'progress_watched'):
+            return self.progress_watched
         
-        if has_episodes:
-            episodes = Episode.objects.filter(
-                series=self.series,
-                season_number__lt=self.last_season_watched
-            ).count()
-            
-            episodes += Episode.objects.filter(
-                series=self.series,
-                season_number=self.last_season_watched,
-                episode_number__lte=self.last_episode_watched
-            ).count()
-            
-            return episodes
-        else:
-            if self.series.total_seasons > 0 and self.last_season_watched > 0:
-                episodes_per_season = self.series.total_episodes / self.series.total_seasons
-                
-                watched = (self.last_season_watched - 1) * episodes_per_season
-                watched += self.last_episode_watched
-                return int(watched)
-            else:
-                return self.last_episode_watched if self.last_episode_watched > 0 else 0
-
+        return self.series.get_season_index().to_ordinal(
+            self.last_season_watched, self.last_episode_watched
+        )
     
     def calculate_remaining_episodes(self):
+        if hasattr(self, 'progress_remaining'):
+            return self.progress_remaining
         watched = self.get_episodes_watched()
         total = self.series.total_episodes
         return max(0, total - watched)
     
     def calculate_completion_days(self):
+        if hasattr(self, 'progress_days'):
+            return self.progress_days
         remaining = self.calculate_remaining_episodes()
         if self.episodes_per_day > 0:
             return int(remaining / self.episodes_per_day) + (1 if remaining % self.episodes_per_day > 0 else 0)
@@ -195,6 +320,8 @@ class UserViewingPlan(models.Model):
         return timezone.now() + timedelta(days=days)
     
     def get_progress_percentage(self):
+        if hasattr(self, 'progress_percentage'):
+            return self.progress_percentage
         watched = self.get_episodes_watched()
         total = self.series.total_episodes
         if total > 0:
@@ -203,8 +330,28 @@ class UserViewingPlan(models.Model):
     
     def get_recommended_episodes_today(self):
         return self.episodes_per_day
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        loaded = 'last_season_watched' in self.__dict__ and 'last_episode_watched' in self.__dict__
+        if loaded and (update_fields is None or PROGRESS_FIELDS & set(update_fields)):
+            self.episodes_watched = self.series.get_season_index().to_ordinal(
+                self.last_season_watched, self.last_episode_watched
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'episodes_watched'}
+        # Сигналы статистики выполняются в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
 
+# Поля плана, от которых зависит episodes_watched
+PROGRESS_FIELDS = {'series', 'last_season_watched', 'last_episode_watched'}
+
 
 class WatchingHistory(models.Model):
     user = models.ForeignKey(
@@ -241,11 +388,55 @@ class WatchingHistory(models.Model):
         verbose_name = "Запись просмотра"
         verbose_name_plural = "История просмотра"
         ordering = ['-watched_at']
+        indexes = [
+            models.Index(fields=['user', 'watched_at', 'id'], name='planner_history_user_time_idx'),
+        ]
 
     def __str__(self):
         ep_code = self.episode.get_episode_code() if self.episode else "N/A"
         return f"{self.user.username} - {ep_code} - {self.watched_at.strftime('%Y-%m-%d')}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class DailyWatchStats(models.Model):
+    """Суточная сводка истории просмотра: минуты и эпизоды за день по сериалу.
+
+    Обновляется в той же транзакции, что и запись WatchingHistory, поэтому
+    графики и выборки по периодам читают по строке на день, а не всю историю.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_watch_stats',
+        verbose_name="Пользователь"
+    )
+    series = models.ForeignKey(
+        Series,
+        on_delete=models.CASCADE,
+        related_name='daily_watch_stats',
+        verbose_name="Сериал"
+    )
+    date = models.DateField(verbose_name="Дата")
+    minutes = models.IntegerField(default=0, verbose_name="Минут просмотрено")
+    episodes = models.IntegerField(default=0, verbose_name="Эпизодов просмотрено")
+
+    class Meta:
+        verbose_name = "Просмотр за день"
+        verbose_name_plural = "Просмотр по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'series'], name='daily_watch_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.series_id} - {self.date}: {self.minutes} мин"
+
 
 class UserSeriesRating(models.Model):
     user = models.ForeignKey(
@@ -272,6 +463,10 @@ class UserSeriesRating(models.Model):
         auto_now_add=True,
         verbose_name="Дата оценки"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
     
     class Meta:
         verbose_name = "Оценка пользователя"
@@ -280,3 +475,150 @@ class UserSeriesRating(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.series.title}: {self.rating}/10"
+
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name="Пользователь"
+    )
+    total_series = models.IntegerField(default=0, verbose_name="Всего сериалов")
+    watching = models.IntegerField(default=0, verbose_name="Смотрю")
+    completed = models.IntegerField(default=0, verbose_name="Завершено")
+    paused = models.IntegerField(default=0, verbose_name="На паузе")
+    planning = models.IntegerField(default=0, verbose_name="В планах")
+    dropped = models.IntegerField(default=0, verbose_name="Брошено")
+    total_episodes = models.IntegerField(default=0, verbose_name="Эпизодов просмотрено")
+    total_minutes = models.IntegerField(default=0, verbose_name="Минут просмотрено")
+    genre_counts = models.JSONField(default=dict, blank=True, verbose_name="Жанры")
+    history_entries = models.IntegerField(default=0, verbose_name="Записей в истории")
+    history_minutes = models.IntegerField(default=0, verbose_name="Минут в истории")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.total_series} сериалов"
+
+    @property
+    def total_hours(self):
+        return round(self.total_minutes / 60, 1)
+
+    def get_favorite_genres(self, limit=5):
+        return sorted(self.genre_counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+class ViewingSchedule(models.Model):
+    """Рассчитанное расписание просмотра пользователя на несколько недель.
+
+    fingerprint - хэш планов "Смотрю", по которым оно построено: пока
+    прогресс и настройки планов не меняются, расписание не пересчитывается.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='viewing_schedule',
+        verbose_name="Пользователь"
+    )
+    fingerprint = models.CharField(max_length=40, verbose_name="Хэш планов")
+    start_date = models.DateField(verbose_name="Начало расписания")
+    days = models.JSONField(default=list, blank=True, verbose_name="Эпизоды по дням")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Расписание просмотра"
+        verbose_name_plural = "Расписания просмотра"
+
+    def __str__(self):
+        return f"{self.user_id}: с {self.start_date}"
+
+
+class CatalogVersion(models.Model):
+    """Версия каталога сериалов, одна строка с pk=1.
+
+    Растет при каждом изменении сериалов; по ней перестраиваются индекс
+    автодополнения и кэш счетчиков жанров. Хранится в БД, чтобы все
+    процессы видели одну версию и с локальным кэшем.
+    """
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Версия")
+
+    class Meta:
+        verbose_name = "Версия каталога"
+        verbose_name_plural = "Версия каталога"
+
+    def __str__(self):
+        return f"Каталог v{self.version}"
+
+
+class SyncState(models.Model):
+    """Состояние фоновой синхронизации с внешним источником.
+
+    watermark - момент, на который данные считаются синхронизированными;
+    pending - еще не обработанные id текущего прогона, чтобы прерванную
+    синхронизацию можно было продолжить с того же места.
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name="Название")
+    watermark = models.DateTimeField(null=True, blank=True, verbose_name="Синхронизировано на")
+    run_started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало текущего прогона")
+    pending = models.JSONField(default=list, blank=True, verbose_name="Осталось обработать")
+    metrics = models.JSONField(default=dict, blank=True, verbose_name="Метрики последнего прогона")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Состояние синхронизации"
+        verbose_name_plural = "Состояния синхронизации"
+
+    def __str__(self):
+        return f"{self.name}: {self.watermark or 'никогда'}"
+
+    @property
+    def in_progress(self):
+        return self.run_started_at is not None
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди на базе основной БД.
+
+    dedupe_key держится, пока задача ждет в очереди, в том числе повтора
+    после ошибки: повторная постановка с тем же ключом ничего не добавляет.
+    На время выполнения ключ освобождается, чтобы новые изменения снова
+    попали в очередь; упавшая задача возвращает его при постановке на
+    повтор, а если такую же задачу уже поставили, помечается failed, и
+    повтор выполнит новая.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Аргументы")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="Статус")
+    dedupe_key = models.CharField(
+        max_length=200, null=True, blank=True, unique=True, verbose_name="Ключ дедупликации"
+    )
+    attempts = models.IntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.IntegerField(default=5, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запустить не раньше")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Захвачена")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'], name='planner_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
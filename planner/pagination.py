@@ -0,0 +1,125 @@
+"""Keyset-пагинация: следующая страница выбирается условием по ключу
+сортировки последней записи, поэтому ее стоимость не зависит от номера.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PER_PAGE = 24
+CURSOR_TYPES = (str, int, float)
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _json_default(value):
+    # Полная точность: DjangoJSONEncoder обрезает микросекунды
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} не поддерживается в курсоре')
+
+
+def encode_cursor(values):
+    data = json.dumps(values, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _output_field(queryset, name):
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    return queryset.model._meta.get_field(name)
+
+
+def _cursor_values(queryset, fields, cursor):
+    """Значения курсора, приведенные к типам полей, или None для чужого курсора.
+
+    Курсор приходит от клиента: допускаются только скаляры нужного числа,
+    а все, что не приводится к типу поля, означает первую страницу.
+    """
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    if not all(isinstance(value, CURSOR_TYPES) and not isinstance(value, bool) for value in values):
+        return None
+    try:
+        values = [
+            _output_field(queryset, name).to_python(value)
+            for (name, _), value in zip(fields, values)
+        ]
+    except (ValidationError, TypeError, ValueError, ArithmeticError):
+        return None
+    return None if any(value is None for value in values) else values
+
+
+def _after(fields, values):
+    """Условие "строго после курсора" для сортировки fields."""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(fields, values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=PER_PAGE):
+    """Страница queryset в порядке ordering, начиная после cursor.
+
+    Последнее поле ordering должно быть уникальным (обычно id), а поля -
+    не NULL: для nullable-полей сортируйте по Coalesce-аннотации.
+    """
+    fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    queryset = queryset.order_by(*ordering)
+
+    values = _cursor_values(queryset, fields, cursor)
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values))
+
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor([getattr(items[-1], name) for name, _ in fields])
+    return Page(items, next_cursor)
+
+
+def offset_paginate(items, cursor=None, per_page=PER_PAGE):
+    """Для уже ограниченных списков (например, результатов поиска)."""
+    try:
+        offset = max(int(cursor or 0), 0)
+    except ValueError:
+        offset = 0
+    page = items[offset:offset + per_page]
+    next_offset = offset + per_page
+    return Page(page, str(next_offset) if next_offset < len(items) else None, total=len(items))
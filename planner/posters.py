@@ -0,0 +1,122 @@
+"""Локальный кэш уменьшенных постеров.
+
+Постер с TMDB скачивается один раз, ужимается Pillow до нескольких
+фиксированных ширин в WebP и JPEG и сохраняется в MEDIA_ROOT/posters под
+именем из хэша содержимого. Имена неизменяемы, поэтому файлы отдаются с
+заголовками долгого кэширования. Описание файлов хранится в
+Series.poster_thumbs, и карточкам не нужны дополнительные запросы.
+"""
+import hashlib
+import io
+import logging
+import re
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .jobs import enqueue
+from .models import Series
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (200, 320, 500)
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+POSTER_DIR = 'posters'
+POSTER_FILE_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{20}-\d+\.(webp|jpg)$')
+DOWNLOAD_TIMEOUT = 10
+
+_session = requests.Session()
+
+
+def poster_path(digest, width, ext):
+    return f'{POSTER_DIR}/{digest[:2]}/{digest}-{width}.{ext}'
+
+
+def generate_thumbnails(data):
+    """Сохраняет уменьшенные копии изображения и возвращает их описание.
+
+    Ширины больше исходной пропускаются; файлы, которые уже есть в
+    хранилище (тот же хэш содержимого), повторно не пишутся.
+    """
+    digest = hashlib.sha1(data).hexdigest()[:20]
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGB')
+        widths = [width for width in WIDTHS if width < image.width] + [min(image.width, WIDTHS[-1])]
+
+        files = {}
+        for width in sorted(set(widths)):
+            height = round(image.height * width / image.width)
+            resized = None
+            for ext, options in FORMATS.items():
+                path = poster_path(digest, width, ext)
+                if not default_storage.exists(path):
+                    if resized is None:
+                        resized = image.resize((width, height), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    resized.save(buffer, **options)
+                    default_storage.save(path, ContentFile(buffer.getvalue()))
+                files.setdefault(ext, {})[str(width)] = path
+
+    return {'hash': digest, 'files': files}
+
+
+def cache_poster(series_id, raise_errors=False):
+    """Скачивает и ужимает постер сериала. Возвращает описание или None.
+
+    raise_errors - пробросить ошибку загрузки, чтобы фоновая задача повторилась.
+    """
+    series = Series.objects.filter(pk=series_id).only('id', 'poster_url', 'poster_thumbs').first()
+    if series is None or not series.poster_url:
+        return None
+    if series.poster_thumbs.get('source') == series.poster_url:
+        return series.poster_thumbs
+
+    try:
+        response = _session.get(series.poster_url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        thumbs = generate_thumbnails(response.content)
+    except (requests.RequestException, OSError) as e:
+        logger.warning('Poster for series %s failed: %s', series_id, e)
+        if raise_errors:
+            raise
+        return None
+
+    thumbs['source'] = series.poster_url
+    # Обновляем, только если постер не сменился, пока мы его качали
+    Series.objects.filter(pk=series_id, poster_url=series.poster_url).update(
+        poster_thumbs=thumbs, updated_at=timezone.now(),
+    )
+    return thumbs
+
+
+def schedule_poster(series_id):
+    """Ставит загрузку постера в очередь фоновых задач."""
+    enqueue('cache_poster', {'series_id': series_id}, dedupe_key=f'poster:{series_id}')
+
+
+def needs_poster(series):
+    """Нужно ли (пере)создавать миниатюры; не делает запросов к БД."""
+    fields = series.__dict__
+    if 'poster_url' not in fields or 'poster_thumbs' not in fields:
+        return False
+    return bool(series.poster_url) and (series.poster_thumbs or {}).get('source') != series.poster_url
+
+
+def poster_url(path):
+    """URL файла из poster_thumbs; отдается представлением poster."""
+    return reverse('poster', args=[path.removeprefix(f'{POSTER_DIR}/')])
+
+
+def srcset(thumbs, ext):
+    files = (thumbs or {}).get('files', {}).get(ext, {})
+    return ', '.join(
+        f'{poster_url(path)} {width}w'
+        for width, path in sorted(files.items(), key=lambda item: int(item[0]))
+    )
@@ -0,0 +1,89 @@
+"""Token bucket для исходящих запросов к внешним API.
+
+Состояние корзины (число токенов и время последнего пополнения) хранится
+в маленьком файле под блокировкой fcntl, поэтому лимит общий для всех
+потоков и процессов на машине: параллельный импорт в несколько процессов
+не превысит лимит TMDB. Без fcntl (Windows) лимит действует в пределах процесса.
+"""
+import asyncio
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_STATE = struct.Struct('dd')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None, path=None):
+        if rate <= 0:
+            raise ValueError('rate должен быть положительным')
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.path = path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.time()
+
+    def _take(self, tokens, updated, now, count):
+        """Пополняет корзину и пытается взять count токенов.
+
+        Возвращает (новое число токенов, сколько секунд ждать до повтора).
+        """
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        if tokens >= count:
+            return tokens - count, 0.0
+        return tokens, (count - tokens) / self.rate
+
+    def _try_acquire(self, count):
+        with self._lock:
+            if self.path:
+                return self._acquire_shared(count)
+            now = time.time()
+            self._tokens, wait = self._take(self._tokens, self._updated, now, count)
+            self._updated = now
+            return wait
+
+    def acquire(self, count=1):
+        """Блокирует поток, пока в корзине не найдется count токенов."""
+        while True:
+            wait = self._try_acquire(count)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, count=1):
+        """То же для корутин: ждет через asyncio.sleep, не занимая поток."""
+        while True:
+            wait = self._try_acquire(count)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _acquire_shared(self, count):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, _STATE.size, 0)
+            now = time.time()
+            if len(raw) == _STATE.size:
+                tokens, updated = _STATE.unpack(raw)
+            else:
+                tokens, updated = self.capacity, now
+            tokens, wait = self._take(tokens, updated, now, count)
+            os.pwrite(fd, _STATE.pack(tokens, now), 0)
+            return wait
+        finally:
+            os.close(fd)
+
+
+def shared_bucket(name, rate, capacity=None):
+    """Корзина, общая для всех процессов, использующих то же имя."""
+    path = os.path.join(tempfile.gettempdir(), f'series_planner_{name}.bucket')
+    return TokenBucket(rate, capacity, path=path)
@@ -0,0 +1,165 @@
+"""Расписание просмотра на несколько недель вперед.
+
+Следующие непросмотренные эпизоды всех планов "Смотрю" раскладываются по
+дням так, чтобы их суммарная длительность (по реальным Episode.duration из
+индекса сезонов) укладывалась в дневной бюджет daily_hours_available.
+Планы берут по эпизоду по кругу, не больше episodes_per_day в день.
+
+Готовое расписание хранится в ViewingSchedule вместе с хэшем планов, по
+которым оно построено. Для проверки хэша нужен один легкий запрос без
+индексов сезонов, а пересчет происходит только при изменении прогресса или
+настроек планов (или эпизодов сериала) и со сменой дня.
+"""
+import hashlib
+from datetime import timedelta
+from itertools import groupby
+
+from django.utils import timezone
+
+from .models import Series, UserViewingPlan, ViewingSchedule
+from .upsert import upsert_options
+
+SCHEDULE_WEEKS = 4
+# Меняется вместе с алгоритмом, чтобы сохраненные расписания пересчитались
+SCHEDULE_VERSION = 1
+
+FINGERPRINT_FIELDS = [
+    'id', 'series_id', 'last_season_watched', 'last_episode_watched',
+    'episodes_per_day', 'daily_hours_available', 'series__updated_at',
+]
+SERIES_FIELDS = [
+    'series__title', 'series__season_index', 'series__total_episodes',
+    'series__total_seasons', 'series__average_episode_duration',
+]
+
+
+def watching_plans(user_ids, fields):
+    return UserViewingPlan.objects.filter(
+        user_id__in=user_ids, status='watching',
+    ).order_by('user_id', '-updated_at', '-id').values('user_id', *fields)
+
+
+def schedule_fingerprint(rows, start, weeks):
+    digest = hashlib.sha1(f'{SCHEDULE_VERSION}:{start.isoformat()}:{weeks}'.encode())
+    for row in rows:
+        digest.update(repr(tuple(str(row[field]) for field in FINGERPRINT_FIELDS)).encode())
+    return digest.hexdigest()
+
+
+def _series(row):
+    # Несохраняемый объект: нужен только для индекса сезонов
+    return Series(
+        id=row['series_id'],
+        title=row['series__title'],
+        season_index=row['series__season_index'],
+        total_episodes=row['series__total_episodes'],
+        total_seasons=row['series__total_seasons'],
+        average_episode_duration=row['series__average_episode_duration'],
+    )
+
+
+def build_schedule(plans, start, weeks=SCHEDULE_WEEKS):
+    """Раскладывает эпизоды планов по дням начиная с даты start.
+
+    plans - строки watching_plans с полями SERIES_FIELDS. Эпизод, который
+    длиннее всего дневного бюджета, ставится на день один, чтобы расписание
+    не застревало.
+    """
+    budget = max((float(plan['daily_hours_available']) for plan in plans), default=0) * 60
+    queues = []
+    for plan in plans:
+        index = _series(plan).get_season_index()
+        watched = index.to_ordinal(plan['last_season_watched'], plan['last_episode_watched'])
+        if watched < index.total_episodes:
+            queues.append({
+                'series_id': plan['series_id'],
+                'title': plan['series__title'],
+                'index': index,
+                'next': watched + 1,
+                'last': index.total_episodes,
+                'per_day': plan['episodes_per_day'],
+            })
+
+    days = []
+    for offset in range(weeks * 7):
+        if not queues or budget <= 0:
+            break
+        left = budget
+        taken = dict.fromkeys(range(len(queues)), 0)
+        episodes = []
+        added = True
+        while added:
+            added = False
+            for position, queue in enumerate(queues):
+                if queue['next'] > queue['last']:
+                    continue
+                if queue['per_day'] > 0 and taken[position] >= queue['per_day']:
+                    continue
+                duration = max(queue['index'].episode_duration(queue['next']), 1)
+                if duration > left and episodes:
+                    continue
+                season, episode = queue['index'].from_ordinal(queue['next'])
+                episodes.append({
+                    'series_id': queue['series_id'],
+                    'title': queue['title'],
+                    'season': season,
+                    'episode': episode,
+                    'minutes': duration,
+                    'finale': queue['next'] == queue['last'],
+                })
+                queue['next'] += 1
+                taken[position] += 1
+                left -= duration
+                added = left > 0
+
+        days.append({
+            'date': (start + timedelta(days=offset)).isoformat(),
+            'minutes': sum(item['minutes'] for item in episodes),
+            'episodes': episodes,
+        })
+        queues = [queue for queue in queues if queue['next'] <= queue['last']]
+    return days
+
+
+def save_schedules(schedules):
+    ViewingSchedule.objects.bulk_create(
+        schedules,
+        **upsert_options(['user'], ['fingerprint', 'start_date', 'days', 'updated_at']),
+    )
+
+
+def get_schedule(user, weeks=SCHEDULE_WEEKS):
+    """Расписание пользователя по дням; пересчитывается, только если планы изменились."""
+    start = timezone.localdate()
+    rows = list(watching_plans([user.pk], FINGERPRINT_FIELDS))
+    if not rows:
+        return []
+
+    fingerprint = schedule_fingerprint(rows, start, weeks)
+    stored = ViewingSchedule.objects.filter(
+        user=user, fingerprint=fingerprint,
+    ).values_list('days', flat=True).first()
+    if stored is not None:
+        return stored
+
+    days = build_schedule(list(watching_plans([user.pk], FINGERPRINT_FIELDS + SERIES_FIELDS)), start, weeks)
+    save_schedules([ViewingSchedule(user=user, fingerprint=fingerprint, start_date=start, days=days)])
+    return days
+
+
+def rebuild_schedules(user_ids, weeks=SCHEDULE_WEEKS, start=None):
+    """Пересчитывает расписания пачки пользователей одним запросом планов."""
+    start = start or timezone.localdate()
+    schedules = []
+    rows = watching_plans(user_ids, FINGERPRINT_FIELDS + SERIES_FIELDS)
+    for user_id, plans in groupby(rows, key=lambda row: row['user_id']):
+        plans = list(plans)
+        schedules.append(ViewingSchedule(
+            user_id=user_id,
+            fingerprint=schedule_fingerprint(plans, start, weeks),
+            start_date=start,
+            days=build_schedule(plans, start, weeks),
+        ))
+    if schedules:
+        save_schedules(schedules)
+    return len(schedules)
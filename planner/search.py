@@ -0,0 +1,182 @@
+"""Полнотекстовый поиск по каталогу.
+
+SQLite использует таблицу FTS5 planner_series_fts, PostgreSQL -
+генерируемую колонку planner_series.search_vector с GIN-индексом.
+Обе поддерживаются базой сами (триггеры/GENERATED), поэтому индекс не
+отстает и при bulk_create. На остальных СУБД - поиск через icontains.
+"""
+import re
+
+from django.db import DatabaseError, connection, connections
+from django.db.models import Q
+
+from .models import Genre, Series
+from .pagination import PER_PAGE, offset_paginate
+
+MAX_RESULTS = 200
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(normalize(query))
+
+
+class SQLiteBackend:
+    # Вес колонок для bm25: название, жанры, описание
+    SQL = """
+        SELECT rowid FROM planner_series_fts
+        WHERE planner_series_fts MATCH %s
+        ORDER BY bm25(planner_series_fts, 10.0, 4.0, 1.0)
+        LIMIT %s
+    """
+
+    def ranked_ids(self, tokens, limit):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(self.SQL, [match, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    SQL = """
+        SELECT id FROM planner_series
+        WHERE search_vector @@ to_tsquery('simple', %s)
+        ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, id
+        LIMIT %s
+    """
+
+    def ranked_ids(self, tokens, limit):
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(self.SQL, [tsquery, tsquery, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackBackend:
+    def ranked_ids(self, tokens, limit):
+        query = ' '.join(tokens)
+        return list(
+            Series.objects.filter(
+                Q(title__icontains=query) |
+                Q(description__icontains=query) |
+                Q(genre_tags__in=Genre.objects.filter(name__icontains=query))
+            ).distinct().order_by('-rating', '-created_at').values_list('id', flat=True)[:limit]
+        )
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'sqlite' and _sqlite_fts_available():
+            _backend = SQLiteBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresBackend()
+        else:
+            _backend = FallbackBackend()
+    return _backend
+
+
+def _sqlite_fts_available():
+    try:
+        return 'planner_series_fts' in connection.introspection.table_names()
+    except DatabaseError:
+        return False
+
+
+def _fold(column):
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+SQLITE_TRIGGERS = {
+    'planner_series_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS planner_series_fts_insert AFTER INSERT ON planner_series BEGIN
+            INSERT INTO planner_series_fts(rowid, title, genres, description)
+            VALUES (new.id, {_fold('new.title')}, {_fold('new.genres')}, {_fold('new.description')});
+        END
+    """,
+    'planner_series_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS planner_series_fts_update
+        AFTER UPDATE OF title, genres, description ON planner_series BEGIN
+            DELETE FROM planner_series_fts WHERE rowid = old.id;
+            INSERT INTO planner_series_fts(rowid, title, genres, description)
+            VALUES (new.id, {_fold('new.title')}, {_fold('new.genres')}, {_fold('new.description')});
+        END
+    """,
+    'planner_series_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS planner_series_fts_delete AFTER DELETE ON planner_series BEGIN
+            DELETE FROM planner_series_fts WHERE rowid = old.id;
+        END
+    """,
+}
+
+
+def ensure_sqlite_triggers(using='default'):
+    """Восстанавливает триггеры FTS, если SQLite потерял их при миграции.
+
+    Часть ALTER (например, AddField с default) SQLite выполняет пересозданием
+    таблицы planner_series, и ее триггеры при этом удаляются. Если триггеров
+    не хватает, они создаются заново, а индекс перестраивается целиком.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'planner_series_fts%'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if 'planner_series_fts' not in existing or set(SQLITE_TRIGGERS) <= existing:
+            return False
+
+        for sql in SQLITE_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute('DELETE FROM planner_series_fts')
+        cursor.execute(f"""
+            INSERT INTO planner_series_fts(rowid, title, genres, description)
+            SELECT id, {_fold('title')}, {_fold('genres')}, {_fold('description')} FROM planner_series
+        """)
+    return True
+
+
+def ranked_series_ids(query, limit=MAX_RESULTS):
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    return get_backend().ranked_ids(tokens, limit)
+
+
+def search_series(query, queryset=None, limit=MAX_RESULTS):
+    """Сериалы по запросу, от самых релевантных (вес названия выше всего).
+
+    queryset позволяет сузить выдачу (например, по жанру) и задать only().
+    """
+    ids = ranked_series_ids(query, limit)
+    if not ids:
+        return []
+    if queryset is None:
+        queryset = Series.objects.all()
+    found = queryset.in_bulk(ids)
+    return [found[series_id] for series_id in ids if series_id in found]
+
+
+def search_page(query, queryset=None, cursor=None, per_page=PER_PAGE):
+    """Страница результатов search_series; cursor - смещение в выдаче."""
+    ids = ranked_series_ids(query)
+    if queryset is None:
+        queryset = Series.objects.all()
+    elif ids and queryset.query.has_filters():
+        allowed = set(queryset.filter(id__in=ids).values_list('id', flat=True))
+        ids = [series_id for series_id in ids if series_id in allowed]
+
+    page = offset_paginate(ids, cursor, per_page)
+    found = queryset.in_bulk(page.items) if page.items else {}
+    page.items = [found[series_id] for series_id in page.items if series_id in found]
+    return page
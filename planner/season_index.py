@@ -0,0 +1,137 @@
+from bisect import bisect_left
+
+from django.utils import timezone
+
+
+class SeasonIndex:
+    """Таблица сезонов сериала: пересчет (сезон, эпизод) <-> порядковый номер.
+
+    Хранится в Series.season_index в виде
+    {"seasons": [[номер, эпизодов, эпизодов_до, минут_до], ...],
+     "minutes": [накопленные минуты по порядковому номеру]}
+    и пересобирается при изменении эпизодов, так что запросов не требует.
+    """
+
+    def __init__(self, seasons, minutes):
+        self.seasons = seasons
+        self.minutes = minutes
+        self.numbers = [row[0] for row in seasons]
+        self.ends = [row[2] + row[1] for row in seasons]
+        self.positions = {row[0]: i for i, row in enumerate(seasons)}
+
+    @classmethod
+    def for_series(cls, series):
+        data = series.season_index
+        if data and data.get('seasons'):
+            return cls(data['seasons'], data['minutes'])
+        return UniformSeasonIndex(series)
+
+    @property
+    def total_episodes(self):
+        return self.ends[-1] if self.ends else 0
+
+    @property
+    def total_minutes(self):
+        return self.minutes[-1] if self.minutes else 0
+
+    def to_ordinal(self, season, episode):
+        """Сколько эпизодов просмотрено, если последний - season/episode."""
+        if season <= 0:
+            return 0
+        position = self.positions.get(season)
+        if position is None:
+            # Сезона нет в индексе: считаем все эпизоды предыдущих сезонов
+            position = bisect_left(self.numbers, season)
+            return self.ends[position - 1] if position > 0 else 0
+        number, count, before, _ = self.seasons[position]
+        return before + min(max(episode, 0), count)
+
+    def from_ordinal(self, ordinal):
+        """Обратное преобразование: порядковый номер -> (сезон, эпизод)."""
+        if ordinal <= 0 or not self.seasons:
+            return 0, 0
+        ordinal = min(ordinal, self.total_episodes)
+        number, count, before, _ = self.seasons[bisect_left(self.ends, ordinal)]
+        return number, ordinal - before
+
+    def elapsed_minutes(self, season, episode):
+        return self.minutes[self.to_ordinal(season, episode)]
+
+    def episode_duration(self, ordinal):
+        """Длительность эпизода с порядковым номером ordinal (с единицы)."""
+        return self.minutes[ordinal] - self.minutes[ordinal - 1]
+
+
+class UniformSeasonIndex(SeasonIndex):
+    """Индекс для сериала без эпизодов: сезоны считаются одинаковыми."""
+
+    def __init__(self, series):
+        self.series = series
+        self.per_season = (
+            series.total_episodes / series.total_seasons if series.total_seasons > 0 else 0
+        )
+        self.duration = series.average_episode_duration
+
+    @property
+    def total_episodes(self):
+        return self.series.total_episodes
+
+    @property
+    def total_minutes(self):
+        return self.series.total_episodes * self.duration
+
+    def to_ordinal(self, season, episode):
+        if self.per_season and season > 0:
+            return int((season - 1) * self.per_season + episode)
+        return episode if episode > 0 else 0
+
+    def from_ordinal(self, ordinal):
+        if ordinal <= 0:
+            return 0, 0
+        if not self.per_season:
+            return 0, min(ordinal, self.total_episodes)
+        ordinal = min(ordinal, self.total_episodes)
+        season = max(1, -(-ordinal // self.per_season))
+        season = int(min(season, self.series.total_seasons))
+        return season, ordinal - int((season - 1) * self.per_season)
+
+    def elapsed_minutes(self, season, episode):
+        return self.to_ordinal(season, episode) * self.duration
+
+    def episode_duration(self, ordinal):
+        return self.duration
+
+
+def index_from_rows(rows):
+    """Индекс из пар (сезон, длительность), упорядоченных по сезону и эпизоду."""
+    seasons = []
+    minutes = [0]
+    for season_number, duration in rows:
+        if not seasons or seasons[-1][0] != season_number:
+            seasons.append([season_number, 0, len(minutes) - 1, minutes[-1]])
+        seasons[-1][1] += 1
+        minutes.append(minutes[-1] + duration)
+
+    if not seasons:
+        return {}
+    return {'seasons': seasons, 'minutes': minutes}
+
+
+def build_season_index(series_id):
+    """Собирает индекс по эпизодам сериала одним запросом."""
+    from .models import Episode
+
+    return index_from_rows(
+        Episode.objects.filter(series_id=series_id).order_by(
+            'season_number', 'episode_number'
+        ).values_list('season_number', 'duration')
+    )
+
+
+def rebuild_season_index(series_id):
+    from .models import Series
+
+    Series.objects.filter(pk=series_id).update(
+        season_index=build_season_index(series_id),
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,289 @@
+"""Генерация синтетических данных пакетами bulk_create.
+
+Используется тестами бюджета запросов и командой generate_data.
+bulk_create обходит сигналы, поэтому индекс сезонов заполняется сразу
+при создании сериалов, а статистика пользователей пересчитывается в конце.
+Первичные ключи сериалов, эпизодов и пользователей назначаются заранее:
+на MySQL bulk_create их не возвращает. После вставки счетчики
+автоинкремента сдвигаются за выданные ключи.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .autocomplete import bump_catalog_version
+from .models import Episode, Genre, Series, UserViewingPlan, WatchingHistory
+from .season_index import index_from_rows
+from .stats import rebuild_daily_stats, rebuild_user_stats, refresh_plan_progress
+
+GENRES = [
+    'Драма', 'Комедия', 'Криминал', 'Фантастика', 'Фэнтези', 'Детектив',
+    'Мультфильм', 'Документальный', 'Триллер', 'Мелодрама', 'Боевик', 'Семейный',
+]
+WORDS = [
+    'тайна', 'город', 'игра', 'ночь', 'дом', 'дорога', 'остров', 'река', 'тень',
+    'империя', 'огонь', 'закон', 'море', 'звезда', 'лес', 'ветер', 'время', 'сердце',
+]
+STATUSES = ['watching', 'watching', 'completed', 'paused', 'planning', 'dropped']
+
+
+def _chunks(iterable_size, size):
+    for start in range(0, iterable_size, size):
+        yield start, min(start + size, iterable_size)
+
+
+def _insert_with_timestamps(model, objects):
+    """Вставляет пачку, сохраняя заданные значения auto_now/auto_now_add-полей.
+
+    Как при loaddata, raw-вставка не вызывает pre_save полей, поэтому
+    отметки времени пишутся тем же INSERT без второго запроса и без правки
+    флагов полей модели. Незаданные отметки получают текущее время.
+    """
+    now = timezone.now()
+    fields = [field for field in model._meta.local_concrete_fields if not field.primary_key]
+    for field in fields:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            for obj in objects:
+                if getattr(obj, field.attname) is None:
+                    setattr(obj, field.attname, now)
+    step = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), step):
+        model._base_manager._insert(objects[start:start + step], fields=fields, raw=True)
+
+
+class Seeder:
+    def __init__(self, batch_size=1000, seed=0, progress=None, password='benchmark'):
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.progress = progress
+        self.password = password
+        self.totals = {}
+        # series_id -> (id первого эпизода, количество) или список id
+        self.episode_ids = {}
+        self.series_ids = []
+        self.next_ids = {}
+
+    def _assign_ids(self, model, objects):
+        """Назначает объектам пачки идущие подряд первичные ключи."""
+        next_id = self.next_ids.get(model)
+        if next_id is None:
+            next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        for n, obj in enumerate(objects):
+            obj.pk = next_id + n
+        self.next_ids[model] = next_id + len(objects)
+        return objects
+
+    @staticmethod
+    def _reset_sequences(*models):
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(statement)
+
+    def _report(self, table, rows, started):
+        elapsed = time.perf_counter() - started
+        count, seconds = self.totals.get(table, (0, 0.0))
+        self.totals[table] = (count + rows, seconds + elapsed)
+        if self.progress:
+            self.progress(table, *self.totals[table])
+
+    def genres(self):
+        existing = set(Genre.objects.values_list('name', flat=True))
+        Genre.objects.bulk_create([
+            Genre(name=name, slug=f'genre-{i}')
+            for i, name in enumerate(GENRES) if name not in existing
+        ])
+        return list(Genre.objects.filter(name__in=GENRES))
+
+    def series(self, count, seasons=2, episodes_per_season=10):
+        genres = self.genres()
+        GenreLink = Series.genre_tags.through
+        rnd = self.random
+
+        for start, end in _chunks(count, self.batch_size):
+            started = time.perf_counter()
+            batch = []
+            layouts = []
+            for _ in range(start, end):
+                season_count = rnd.randint(1, seasons * 2 - 1) if seasons > 1 else 1
+                layout = []
+                for season in range(1, season_count + 1):
+                    episodes = max(1, episodes_per_season + rnd.randint(-2, 2))
+                    layout.extend((season, number, rnd.choice((22, 25, 42, 45, 50, 58)))
+                                  for number in range(1, episodes + 1))
+                series_genres = rnd.sample(genres, rnd.randint(1, 3))
+                title = ' '.join(rnd.sample(WORDS, rnd.randint(1, 3))).capitalize()
+                batch.append(Series(
+                    title=f'{title} {rnd.randint(1, 99999)}',
+                    description=' '.join(rnd.choices(WORDS, k=30)),
+                    total_seasons=season_count,
+                    total_episodes=len(layout),
+                    average_episode_duration=round(sum(d for _, _, d in layout) / len(layout)),
+                    genres=', '.join(genre.name for genre in series_genres),
+                    rating=round(rnd.uniform(4, 9.5), 1) if rnd.random() > 0.05 else None,
+                    release_year=rnd.randint(1990, 2026),
+                    season_index=index_from_rows((s, d) for s, _, d in layout),
+                ))
+                layouts.append((layout, series_genres))
+            created = Series.objects.bulk_create(self._assign_ids(Series, batch))
+            self._report('series', len(created), started)
+
+            started = time.perf_counter()
+            GenreLink.objects.bulk_create([
+                GenreLink(series_id=series.id, genre_id=genre.id)
+                for series, (_, series_genres) in zip(created, layouts)
+                for genre in series_genres
+            ], batch_size=self.batch_size)
+            self._report('series_genres', sum(len(g) for _, g in layouts), started)
+
+            pending = []
+            for series, (layout, _) in zip(created, layouts):
+                self.series_ids.append(series.id)
+                for season, number, duration in layout:
+                    pending.append(Episode(
+                        series_id=series.id,
+                        season_number=season,
+                        episode_number=number,
+                        title=f'Эпизод {number}',
+                        duration=duration,
+                    ))
+            self._episodes(pending)
+
+        self._reset_sequences(Series, Episode)
+        bump_catalog_version()
+
+    def _episodes(self, pending):
+        for start, end in _chunks(len(pending), self.batch_size):
+            started = time.perf_counter()
+            created = Episode.objects.bulk_create(self._assign_ids(Episode, pending[start:end]))
+            self._report('episodes', len(created), started)
+            by_series = {}
+            for episode in created:
+                by_series.setdefault(episode.series_id, []).append(episode.id)
+            for series_id, ids in by_series.items():
+                known = self.episode_ids.get(series_id)
+                if known is not None:
+                    ids = self._expand(known) + ids
+                if ids[-1] - ids[0] == len(ids) - 1:
+                    self.episode_ids[series_id] = (ids[0], len(ids))
+                else:
+                    self.episode_ids[series_id] = ids
+
+    @staticmethod
+    def _expand(known):
+        if isinstance(known, tuple):
+            return list(range(known[0], known[0] + known[1]))
+        return known
+
+    def _episode_id(self, series_id, position):
+        known = self.episode_ids[series_id]
+        if isinstance(known, tuple):
+            return known[0] + position % known[1]
+        return known[position % len(known)]
+
+    def users(self, count, plans_per_user=50, history_per_user=200, prefix='bench', rebuild_stats=True):
+        if not self.series_ids:
+            self.series_ids = list(Series.objects.values_list('id', flat=True))
+            for series_id, ids in _group_episode_ids():
+                contiguous = ids[-1] - ids[0] == len(ids) - 1
+                self.episode_ids[series_id] = (ids[0], len(ids)) if contiguous else ids
+        password = make_password(self.password)
+        offset = User.objects.filter(username__startswith=f'{prefix}_').count()
+        now = timezone.now()
+        rnd = self.random
+        user_ids = []
+        # Пользователей в пачке столько, чтобы их строк было ~20 пакетов
+        users_per_chunk = max(1, min(
+            self.batch_size, self.batch_size * 20 // max(plans_per_user + history_per_user, 1)
+        ))
+
+        for start, end in _chunks(count, users_per_chunk):
+            began = time.perf_counter()
+            created = User.objects.bulk_create(self._assign_ids(User, [
+                User(
+                    username=f'{prefix}_{offset + n}',
+                    email=f'{prefix}_{offset + n}@example.com',
+                    password=password,
+                )
+                for n in range(start, end)
+            ]))
+            self._report('users', len(created), began)
+
+            plans = []
+            history = []
+            for user in created:
+                user_ids.append(user.id)
+                picked = rnd.sample(self.series_ids, min(plans_per_user, len(self.series_ids)))
+                for series_id in picked:
+                    plans.append(UserViewingPlan(
+                        user_id=user.id,
+                        series_id=series_id,
+                        status=rnd.choice(STATUSES),
+                        last_season_watched=rnd.randint(0, 3),
+                        last_episode_watched=rnd.randint(0, 10),
+                        episodes_per_day=rnd.randint(1, 4),
+                        started_at=now - timedelta(days=rnd.randint(0, 365)),
+                    ))
+                for n in range(history_per_user if picked else 0):
+                    series_id = picked[n % len(picked)]
+                    history.append(WatchingHistory(
+                        user_id=user.id,
+                        series_id=series_id,
+                        episode_id=self._episode_id(series_id, n // len(picked)),
+                        duration_watched=rnd.choice((22, 25, 42, 45, 50)),
+                        watched_at=now - timedelta(minutes=rnd.randint(0, 365 * 24 * 60)),
+                    ))
+
+            for chunk_start, chunk_end in _chunks(len(plans), self.batch_size):
+                began = time.perf_counter()
+                _insert_with_timestamps(UserViewingPlan, plans[chunk_start:chunk_end])
+                self._report('plans', chunk_end - chunk_start, began)
+            for chunk_start, chunk_end in _chunks(len(history), self.batch_size):
+                began = time.perf_counter()
+                _insert_with_timestamps(WatchingHistory, history[chunk_start:chunk_end])
+                self._report('history', chunk_end - chunk_start, began)
+            # bulk_create обходит UserViewingPlan.save()
+            refresh_plan_progress(UserViewingPlan.objects.filter(user_id__in=[user.id for user in created]))
+
+        self._reset_sequences(User)
+        if rebuild_stats:
+            began = time.perf_counter()
+            for user_id in user_ids:
+                rebuild_user_stats(user_id)
+            self._report('user_stats', len(user_ids), began)
+            for chunk_start, chunk_end in _chunks(len(user_ids), 500):
+                began = time.perf_counter()
+                rows = rebuild_daily_stats(user_ids[chunk_start:chunk_end])
+                self._report('daily_stats', rows, began)
+
+        return user_ids
+
+
+def _group_episode_ids():
+    current = None
+    ids = []
+    for series_id, episode_id in Episode.objects.order_by('series_id', 'id').values_list(
+        'series_id', 'id'
+    ).iterator(chunk_size=10000):
+        if series_id != current:
+            if current is not None:
+                yield current, ids
+            current, ids = series_id, []
+        ids.append(episode_id)
+    if current is not None:
+        yield current, ids
+
+
+def seed_dataset(series=1000, seasons=2, episodes_per_season=10, users=3,
+                 plans_per_user=200, history_per_user=1000, batch_size=1000, seed=0,
+                 progress=None, password='benchmark', prefix='bench'):
+    seeder = Seeder(batch_size=batch_size, seed=seed, progress=progress, password=password)
+    seeder.series(series, seasons, episodes_per_season)
+    user_ids = seeder.users(users, plans_per_user, history_per_user, prefix=prefix)
+    return seeder, user_ids
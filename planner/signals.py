@@ -0,0 +1,144 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_migrate, post_save
+from django.dispatch import receiver
+
+from .autocomplete import bump_catalog_version
+from .backends import invalidate_user
+from .cards import invalidate_card
+from .genres import sync_genres_from_string
+from .jobs import enqueue
+from .models import Episode, Series, UserViewingPlan, WatchingHistory
+from .posters import needs_poster, schedule_poster
+from .search import ensure_sqlite_triggers
+from .season_index import rebuild_season_index
+from .stats import (
+    apply_plan_change, plan_snapshot, rebuild_user_stats, record_daily_watch, record_history_change,
+    schedule_series_stats,
+)
+
+# Поля сериала, от которых зависит вклад плана в UserStats
+SERIES_STATS_FIELDS = {'genres', 'total_episodes', 'total_seasons', 'average_episode_duration', 'season_index'}
+
+
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+def series_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+    invalidate_card(instance.pk)
+
+
+@receiver(m2m_changed, sender=Series.genre_tags.through)
+def series_genres_linked(sender, action, **kwargs):
+    # Счетчики жанров кэшируются под версией каталога
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+
+
+@receiver(post_init, sender=Series)
+def remember_series_genres(sender, instance, **kwargs):
+    instance._genres_snapshot = instance.__dict__.get('genres')
+
+
+@receiver(post_save, sender=Series)
+def series_genres_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Строка жанров - источник правды для genre_tags при правке в админке и коде
+    genres = instance.__dict__.get('genres')
+    if genres is None or (update_fields is not None and 'genres' not in update_fields):
+        return
+    changed = bool(genres) if created else genres != instance._genres_snapshot
+    if changed:
+        sync_genres_from_string(instance)
+    instance._genres_snapshot = instance.genres
+
+
+@receiver(post_save, sender=Series)
+def series_stats_changed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or SERIES_STATS_FIELDS & set(update_fields)):
+        schedule_series_stats([instance.pk])
+
+
+@receiver(post_save, sender=Series)
+def series_poster_changed(sender, instance, **kwargs):
+    # Задача пишется в той же транзакции и видна воркеру только после коммита
+    if needs_poster(instance):
+        schedule_poster(instance.pk)
+
+
+@receiver(post_save, sender=Episode)
+@receiver(post_delete, sender=Episode)
+def episode_changed(sender, instance, origin=None, **kwargs):
+    # При каскадном удалении сериала индекс пересобирать незачем
+    if isinstance(origin, Series):
+        return
+    rebuild_season_index(instance.series_id)
+    schedule_series_stats([instance.series_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_init, sender=UserViewingPlan)
+def remember_plan_state(sender, instance, **kwargs):
+    instance._stats_snapshot = plan_snapshot(instance)
+
+
+def schedule_rebuild(user_id, *snapshots):
+    """Ставит пересчет расписания в очередь, если план был или стал "Смотрю".
+
+    Снимок None означает, что статус неизвестен (поля были отложены).
+    """
+    if any(snapshot is None or snapshot[0] == 'watching' for snapshot in snapshots):
+        enqueue('rebuild_schedule', {'user_id': user_id}, dedupe_key=f'schedule:{user_id}')
+
+
+@receiver(post_save, sender=UserViewingPlan)
+def plan_saved(sender, instance, created, **kwargs):
+    new = plan_snapshot(instance)
+    old = None if created else instance._stats_snapshot
+
+    if not created and (old is None or new is None):
+        rebuild_user_stats(instance.user_id)
+    elif old != new:
+        apply_plan_change(instance, old, new)
+    if created:
+        schedule_rebuild(instance.user_id, new)
+    else:
+        schedule_rebuild(instance.user_id, old, new)
+
+    instance._stats_snapshot = new
+
+
+@receiver(post_delete, sender=UserViewingPlan)
+def plan_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return
+    old = instance._stats_snapshot or plan_snapshot(instance)
+    if old is None:
+        rebuild_user_stats(instance.user_id)
+    else:
+        apply_plan_change(instance, old, None)
+    schedule_rebuild(instance.user_id, old)
+
+
+@receiver(post_save, sender=WatchingHistory)
+def history_saved(sender, instance, created, **kwargs):
+    if created:
+        record_history_change(instance.user_id, 1, instance.duration_watched)
+        record_daily_watch(instance.user_id, instance.series_id, instance.watched_at, 1, instance.duration_watched)
+
+
+@receiver(post_delete, sender=WatchingHistory)
+def history_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return
+    record_history_change(instance.user_id, -1, -instance.duration_watched)
+    record_daily_watch(instance.user_id, instance.series_id, instance.watched_at, -1, -instance.duration_watched)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'planner':
+        ensure_sqlite_triggers(using)
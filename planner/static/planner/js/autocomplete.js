@@ -0,0 +1,38 @@
+// Подсказки названий для полей поиска с атрибутом data-autocomplete-url
+document.querySelectorAll('input[data-autocomplete-url]').forEach(function (input) {
+    var list = document.createElement('datalist');
+    list.id = 'autocomplete-' + Math.random().toString(36).slice(2);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(list);
+
+    var timer = null;
+    var controller = null;
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        var query = input.value.trim();
+        if (!query) {
+            list.innerHTML = '';
+            return;
+        }
+        timer = setTimeout(function () {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            var url = input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(query);
+            fetch(url, {signal: controller.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    list.innerHTML = '';
+                    data.results.forEach(function (item) {
+                        var option = document.createElement('option');
+                        option.value = item.title;
+                        list.appendChild(option);
+                    });
+                })
+                .catch(function () {});
+        }, 120);
+    });
+});
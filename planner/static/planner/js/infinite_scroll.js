@@ -0,0 +1,58 @@
+// Подгрузка следующей страницы по ссылке rel="next" при прокрутке
+(function () {
+    var container = document.querySelector('[data-page-items]');
+    if (!container || !('IntersectionObserver' in window)) {
+        return;
+    }
+
+    var loading = false;
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                loadNext(entry.target);
+            }
+        });
+    }, {rootMargin: '400px'});
+
+    function watch() {
+        var pager = document.querySelector('[data-next-page]');
+        if (pager) {
+            observer.observe(pager);
+        }
+    }
+
+    function loadNext(pager) {
+        if (loading) {
+            return;
+        }
+        loading = true;
+        observer.unobserve(pager);
+        var link = pager.querySelector('a[rel="next"]');
+
+        fetch(link.href, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(function (response) { return response.text(); })
+            .then(function (html) {
+                var page = new DOMParser().parseFromString(html, 'text/html');
+                var items = page.querySelector('[data-page-items]');
+                if (items) {
+                    Array.from(items.children).forEach(function (child) {
+                        container.appendChild(child);
+                    });
+                }
+                var nextPager = page.querySelector('[data-next-page]');
+                if (nextPager) {
+                    pager.replaceWith(nextPager);
+                } else {
+                    pager.remove();
+                }
+                history.replaceState(null, '', link.href);
+                loading = false;
+                watch();
+            })
+            .catch(function () {
+                loading = false;
+            });
+    }
+
+    watch();
+})();
@@ -0,0 +1,242 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import DailyWatchStats, Series, UserStats, UserViewingPlan, WatchingHistory
+
+STATUS_FIELDS = [code for code, _ in UserViewingPlan.STATUS_CHOICES]
+
+
+def split_genres(value):
+    if not value:
+        return []
+    return [genre.strip() for genre in value.split(',') if genre.strip()]
+
+
+def plan_snapshot(plan):
+    """Поля плана, от которых зависит статистика (None, если они отложены)."""
+    try:
+        return (
+            plan.__dict__['status'],
+            plan.__dict__['last_season_watched'],
+            plan.__dict__['last_episode_watched'],
+        )
+    except KeyError:
+        return None
+
+
+def rebuild_user_stats(user_id):
+    """Полный пересчет статистики пользователя."""
+    plans = UserViewingPlan.objects.filter(user_id=user_id)
+
+    totals = plans.with_progress().aggregate(
+        total_series=Count('id'),
+        total_episodes=Sum('progress_watched'),
+        total_minutes=Sum(F('progress_watched') * F('series__average_episode_duration')),
+        **{
+            status: Count('id', filter=Q(status=status))
+            for status in STATUS_FIELDS
+        }
+    )
+    totals['total_episodes'] = totals['total_episodes'] or 0
+    totals['total_minutes'] = totals['total_minutes'] or 0
+
+    genre_counts = {}
+    for genres in plans.values_list('series__genres', flat=True):
+        for genre in split_genres(genres):
+            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+
+    history = WatchingHistory.objects.filter(user_id=user_id).aggregate(
+        entries=Count('id'),
+        minutes=Sum('duration_watched'),
+    )
+
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            **totals,
+            'genre_counts': genre_counts,
+            'history_entries': history['entries'],
+            'history_minutes': history['minutes'] or 0,
+        }
+    )
+    return stats
+
+
+def refresh_plan_progress(plans):
+    """Пересчитывает episodes_watched планов по текущим индексам их сериалов.
+
+    plans - QuerySet планов. Пишутся только изменившиеся строки одним
+    bulk_update. Возвращает id сериалов, у которых есть планы.
+    """
+    rows = list(plans.order_by().values_list(
+        'id', 'series_id', 'last_season_watched', 'last_episode_watched', 'episodes_watched',
+    ))
+    if not rows:
+        return []
+    series = Series.objects.only(
+        'season_index', 'total_episodes', 'total_seasons', 'average_episode_duration',
+    ).in_bulk({row[1] for row in rows})
+    indexes = {series_id: item.get_season_index() for series_id, item in series.items()}
+
+    changed = []
+    for plan_id, series_id, season, episode, current in rows:
+        watched = indexes[series_id].to_ordinal(season, episode)
+        if watched != current:
+            changed.append(UserViewingPlan(id=plan_id, episodes_watched=watched))
+    if changed:
+        UserViewingPlan.objects.bulk_update(changed, ['episodes_watched'], batch_size=500)
+    return sorted(indexes)
+
+
+def schedule_series_stats(series_ids):
+    """Обновляет прогресс планов сериалов и ставит в очередь статистику зрителей.
+
+    Вызывается после изменения индекса сезонов, числа эпизодов или жанров
+    сериала: episodes_watched планов пересчитывается сразу, а накопленные
+    apply_plan_change суммы UserStats - фоновой задачей с нуля. Без планов
+    стоит один запрос.
+    """
+    plans = UserViewingPlan.objects.filter(series_id__in=list(series_ids))
+    for series_id in refresh_plan_progress(plans):
+        enqueue('rebuild_series_stats', {'series_id': series_id}, dedupe_key=f'series_stats:{series_id}')
+
+
+def rebuild_series_stats(series_id):
+    user_ids = UserViewingPlan.objects.filter(series_id=series_id).values_list('user_id', flat=True)
+    for user_id in user_ids.iterator():
+        rebuild_user_stats(user_id)
+
+
+def get_user_stats(user):
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return rebuild_user_stats(user.pk)
+
+
+def apply_plan_change(plan, old=None, new=None):
+    """Применяет к статистике разницу между старым и новым состоянием плана.
+
+    old/new - результат plan_snapshot(); None означает, что план
+    создан (old) или удален (new).
+    """
+    with transaction.atomic():
+        stats, created = UserStats.objects.select_for_update().get_or_create(
+            user_id=plan.user_id
+        )
+        if created:
+            rebuild_user_stats(plan.user_id)
+            return
+
+        series = plan.series
+        index = series.get_season_index()
+
+        for sign, snapshot in ((-1, old), (1, new)):
+            if snapshot is None:
+                continue
+            status, season, episode = snapshot
+            if status in STATUS_FIELDS:
+                setattr(stats, status, getattr(stats, status) + sign)
+            watched = index.to_ordinal(season, episode)
+            stats.total_episodes += sign * watched
+            stats.total_minutes += sign * watched * series.average_episode_duration
+
+        if old is None or new is None:
+            sign = 1 if old is None else -1
+            stats.total_series += sign
+            for genre in split_genres(series.genres):
+                count = stats.genre_counts.get(genre, 0) + sign
+                if count > 0:
+                    stats.genre_counts[genre] = count
+                else:
+                    stats.genre_counts.pop(genre, None)
+
+        stats.save()
+
+
+def record_history_change(user_id, entries, minutes):
+    """Учитывает добавленные (или удаленные, с минусом) записи истории."""
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        history_entries=F('history_entries') + entries,
+        history_minutes=F('history_minutes') + minutes,
+    )
+    if not updated:
+        rebuild_user_stats(user_id)
+
+
+# Один запрос на запись истории: INSERT с прибавлением при конфликте
+DAILY_TABLE = DailyWatchStats._meta.db_table
+DAILY_INSERT_SQL = f"""
+    INSERT INTO {DAILY_TABLE} (user_id, series_id, date, episodes, minutes)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+DAILY_UPSERT_SQL = {
+    'mysql': DAILY_INSERT_SQL + """
+    ON DUPLICATE KEY UPDATE episodes = episodes + VALUES(episodes), minutes = minutes + VALUES(minutes)
+""",
+    # SQLite и PostgreSQL
+    'default': DAILY_INSERT_SQL + f"""
+    ON CONFLICT (user_id, date, series_id) DO UPDATE SET
+        episodes = {DAILY_TABLE}.episodes + excluded.episodes,
+        minutes = {DAILY_TABLE}.minutes + excluded.minutes
+""",
+}
+
+
+def record_daily_watch(user_id, series_id, watched_at, episodes, minutes):
+    """Добавляет (или вычитает) просмотр в суточную сводку.
+
+    День берется в часовом поясе сайта. Строка создается при первом
+    просмотре за день, а опустевшая после удаления истории - удаляется.
+    """
+    day = timezone.localdate(watched_at)
+    if episodes > 0:
+        with connection.cursor() as cursor:
+            sql = DAILY_UPSERT_SQL.get(connection.vendor, DAILY_UPSERT_SQL['default'])
+            cursor.execute(sql, [user_id, series_id, day, episodes, minutes])
+        return
+
+    rows = DailyWatchStats.objects.filter(user_id=user_id, series_id=series_id, date=day)
+    if rows.update(episodes=F('episodes') + episodes, minutes=F('minutes') + minutes):
+        rows.filter(episodes__lte=0).delete()
+
+
+def rebuild_daily_stats(user_ids=None, batch_size=1000):
+    """Пересобирает суточную сводку из истории. Возвращает число строк."""
+    history = WatchingHistory.objects.order_by()
+    rollup = DailyWatchStats.objects.all()
+    if user_ids is not None:
+        history = history.filter(user_id__in=user_ids)
+        rollup = rollup.filter(user_id__in=user_ids)
+
+    days = history.values('user_id', 'series_id', day=TruncDate('watched_at')).annotate(
+        total_minutes=Sum('duration_watched'), total_episodes=Count('id'),
+    )
+
+    count = 0
+    with transaction.atomic():
+        rollup.delete()
+        batch = []
+        for row in days.iterator(chunk_size=batch_size):
+            batch.append(DailyWatchStats(
+                user_id=row['user_id'], series_id=row['series_id'], date=row['day'],
+                minutes=row['total_minutes'], episodes=row['total_episodes'],
+            ))
+            if len(batch) >= batch_size:
+                DailyWatchStats.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        DailyWatchStats.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def daily_totals(user, since):
+    """Сумма минут и эпизодов из суточной сводки начиная с даты since."""
+    totals = DailyWatchStats.objects.filter(user=user, date__gte=since).aggregate(
+        minutes=Sum('minutes'), episodes=Sum('episodes'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
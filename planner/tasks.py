@@ -0,0 +1,35 @@
+"""Фоновые задачи очереди planner.jobs.
+
+Модуль импортируется при старте приложения, чтобы задачи были
+зарегистрированы и в процессах сайта (для enqueue), и в воркерах.
+"""
+from .forecasting import refresh_forecasts
+from .jobs import task
+from .posters import cache_poster
+from .scheduling import rebuild_schedules
+from .stats import rebuild_series_stats
+from .tmdb_service import TMDBError, import_from_tmdb
+
+
+@task('cache_poster')
+def cache_poster_task(series_id):
+    cache_poster(series_id, raise_errors=True)
+
+
+@task('rebuild_schedule', max_attempts=3)
+def rebuild_schedule_task(user_id):
+    # Ставится при изменении планов "Смотрю" - тогда же меняется и прогноз
+    rebuild_schedules([user_id])
+    refresh_forecasts([user_id])
+
+
+@task('rebuild_series_stats', max_attempts=3)
+def rebuild_series_stats_task(series_id):
+    rebuild_series_stats(series_id)
+
+
+@task('import_tmdb_series', max_attempts=8)
+def import_tmdb_series_task(tmdb_id):
+    # import_from_tmdb пишет ошибку TMDB в лог и возвращает None
+    if import_from_tmdb(tmdb_id) is None:
+        raise TMDBError(f'Не удалось загрузить сериал {tmdb_id} с TMDB')
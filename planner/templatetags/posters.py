@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html
+
+from planner.posters import poster_url, srcset
+
+register = template.Library()
+
+CARD_SIZES = '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+
+@register.simple_tag
+def poster(series, css_class='', height=None, sizes=CARD_SIZES):
+    """<picture> с WebP/JPEG миниатюрами из кэша, иначе - исходный постер"""
+    style = f'height: {height}px; object-fit: cover;' if height else ''
+    thumbs = series.poster_thumbs or {}
+    jpg = thumbs.get('files', {}).get('jpg')
+    if not jpg:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy">',
+            series.poster_url, css_class, series.title, style,
+        )
+
+    widths = sorted(jpg, key=int)
+    fallback = jpg[widths[len(widths) // 2]]
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" style="{}" loading="lazy">'
+        '</picture>',
+        srcset(thumbs, 'webp'), sizes,
+        poster_url(fallback), srcset(thumbs, 'jpg'), sizes, css_class, series.title, style,
+    )
@@ -1,3 +1,945 @@
-from django.test import TestCase
+import asyncio
+import io
+import shutil
+import time
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from PIL import Image
+
+from . import autocomplete, tmdb_service
+from .benchmark import QueryBudgetTestCase, url_names
+from .cards import card_key, render_cards
+from .forecasting import refresh_forecasts
+from .genres import genre_facets
+from .models import (
+    DailyWatchStats, Episode, Job, Series, SyncState, UserSeriesRating, UserViewingPlan, WatchingHistory,
+)
+from .history import mark_watched, parse_ranges
+from . import jobs
+from .pagination import encode_cursor, keyset_paginate
+from .scheduling import build_schedule, get_schedule
+from .posters import cache_poster, generate_thumbnails, poster_url
+from .templatetags.posters import poster
+from .tmdb_async import AsyncTMDBClient
+from .tmdb_service import EPISODE_FIELDS, TMDBClient, sync_season_episodes
+from .tmdb_stub import StubTMDBServer
+
+
+def poster_bytes(width=500, height=750):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class PlannerViewBudgetTests(TempMediaMixin, QueryBudgetTestCase):
+    budgets = {
+        'home': 4,
+        'home_anonymous': 1,
+        'home_genre': 4,
+        'home_next_page': 4,
+        'series_list': 4,
+        'series_list_next_page': 4,
+        'series_list_status': 4,
+        'series_detail': 6,
+        'series_detail_not_modified': 3,
+        'series_list_not_modified': 3,
+        'add_to_list': 13,
+        'remove_from_list': 12,
+        'update_progress': 12,
+        'quick_update': 17,
+        'mark_episode_watched': 17,
+        'mark_range_watched': 17,
+        'rate_series': 9,
+        'statistics': 5,
+        'schedule': 4,
+        'schedule_rebuild': 6,
+        'analytics': 4,
+        'analytics_chart': 3,
+        'search': 5,
+        'search_genre': 4,
+        'autocomplete': 0,
+        'tmdb_search': 3,
+        'tmdb_import': 30,
+        'poster': 0,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.plan = UserViewingPlan.objects.filter(user=self.user).select_related('series').first()
+        self.series = self.plan.series
+        self.new_series = Series.objects.exclude(user_plans__user=self.user).first()
+
+    def test_all_urls_have_budgets(self):
+        missing = url_names('planner.urls') - set(self.budgets)
+        self.assertFalse(missing, f'Нет бюджета для: {sorted(missing)}')
+
+    def test_home(self):
+        self.measure('home', reverse('home'))
+
+    def test_home_anonymous(self):
+        self.client.logout()
+        self.measure('home_anonymous', reverse('home'))
+
+    def test_home_genre(self):
+        genre = self.series.genre_tags.first()
+        response = self.measure('home_genre', reverse('home'), data={'genre': genre.slug})
+        self.assertTrue(response.context['series_list'].items)
+
+    def test_home_next_page(self):
+        first = self.client.get(reverse('home')).context['series_list']
+        self.measure('home_next_page', reverse('home'), data={'cursor': first.next_cursor})
+
+    def test_series_list(self):
+        self.measure('series_list', reverse('series_list'))
+
+    def test_series_list_next_page(self):
+        first = self.client.get(reverse('series_list')).context['viewing_plans']
+        self.measure('series_list_next_page', reverse('series_list'), data={'cursor': first.next_cursor})
+
+    def test_series_list_status(self):
+        self.measure('series_list_status', reverse('series_list'), data={'status': 'watching'})
+
+    def test_series_detail(self):
+        self.measure('series_detail', reverse('series_detail', args=[self.series.id]))
+
+    def test_series_detail_not_modified(self):
+        url = reverse('series_detail', args=[self.series.id])
+        etag = self.client.get(url)['ETag']
+        self.measure('series_detail_not_modified', url, status=304, HTTP_IF_NONE_MATCH=etag)
+
+        self.client.post(reverse('rate_series', args=[self.series.id]), {'rating': 7})
+        self.client.get(url)  # показывает flash-сообщение
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+        # Удаление и смена дня тоже меняют ETag
+        etag = response['ETag']
+        UserSeriesRating.objects.filter(user=self.user, series=self.series).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('planner.views.timezone.localdate', return_value=tomorrow):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_series_list_not_modified(self):
+        url = reverse('series_list')
+        etag = self.client.get(url)['ETag']
+        self.measure('series_list_not_modified', url, status=304, HTTP_IF_NONE_MATCH=etag)
+
+        self.client.get(reverse('mark_episode_watched', args=[self.plan.id, 1, 2]))
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_add_to_list(self):
+        self.measure('add_to_list', reverse('add_to_list', args=[self.new_series.id]), status=302)
+        self.assertTrue(UserViewingPlan.objects.filter(user=self.user, series=self.new_series).exists())
+
+    def test_remove_from_list(self):
+        self.measure('remove_from_list', reverse('remove_from_list', args=[self.plan.id]), status=302)
+        self.assertFalse(UserViewingPlan.objects.filter(pk=self.plan.pk).exists())
+
+    def test_update_progress(self):
+        self.measure(
+            'update_progress', reverse('update_progress', args=[self.plan.id]), method='post',
+            data={'status': 'watching', 'last_season': 1, 'last_episode': 3, 'daily_hours': 2},
+            status=302,
+        )
+
+    def test_quick_update(self):
+        self.measure(
+            'quick_update', reverse('quick_update', args=[self.plan.id]), method='post',
+            data={'episodes_watched': 2}, status=302,
+        )
+
+    def test_quick_update_without_progress_is_not_reported_as_added(self):
+        index = self.series.get_season_index()
+        season, episode = index.from_ordinal(index.total_episodes)
+        UserViewingPlan.objects.filter(pk=self.plan.pk).update(
+            last_season_watched=season, last_episode_watched=episode, episodes_watched=index.total_episodes,
+        )
+        before = self.user.watching_history.count()
+        response = self.client.post(
+            reverse('quick_update', args=[self.plan.id]), {'episodes_watched': 2}, follow=True,
+        )
+        [message] = response.context['messages']
+        self.assertEqual(message.level_tag, 'info')
+        self.assertNotIn('Добавлено', message.message)
+        self.assertEqual(self.user.watching_history.count(), before)
+
+    def test_mark_episode_watched(self):
+        self.measure(
+            'mark_episode_watched', reverse('mark_episode_watched', args=[self.plan.id, 1, 2]),
+            status=302,
+        )
+
+    def test_mark_range_watched(self):
+        before = self.user.watching_history.count()
+        self.measure(
+            'mark_range_watched', reverse('mark_range_watched', args=[self.plan.id]), method='post',
+            data={'episodes': 'S01E01-S02E03, S03E01'}, status=302,
+        )
+        self.assertGreater(self.user.watching_history.count(), before + 1)
+
+    def test_rate_series(self):
+        self.measure(
+            'rate_series', reverse('rate_series', args=[self.series.id]), method='post',
+            data={'rating': 8, 'review': 'Отлично'}, status=302,
+        )
+
+    def test_analytics(self):
+        response = self.measure('analytics', reverse('analytics'))
+        self.assertEqual(response.context['total_entries'], self.user.watching_history.count())
+        self.assertEqual(len(response.context['per_series']), 3)
+
+    def test_analytics_chart(self):
+        response = self.measure('analytics_chart', reverse('analytics_chart'))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    def test_statistics(self):
+        self.measure('statistics', reverse('statistics'))
+
+    def test_schedule(self):
+        self.client.get(reverse('schedule'))
+        response = self.measure('schedule', reverse('schedule'))
+        self.assertTrue(response.context['days'])
+
+    def test_schedule_rebuild(self):
+        UserViewingPlan.objects.filter(pk=self.plan.pk).update(status='watching', last_episode_watched=0)
+        self.measure('schedule_rebuild', reverse('schedule'))
+
+    def test_search(self):
+        word = self.series.title.split()[0]
+        response = self.measure('search', reverse('search'), data={'q': word})
+        self.assertTrue(response.context['results'].items)
+
+    def test_search_genre(self):
+        genre = self.series.genre_tags.first()
+        self.measure('search_genre', reverse('search'), data={'genre': genre.slug})
+
+    def stub_tmdb(self):
+        server = StubTMDBServer(catalog_size=200).start()
+        self.addCleanup(server.stop)
+        for name, value in (('BASE_URL', server.url), ('TMDB_API_KEY', 'stub')):
+            patcher = mock.patch.object(tmdb_service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return server
+
+    def test_tmdb_search(self):
+        server = self.stub_tmdb()
+        Series.objects.filter(pk=self.series.pk).update(tmdb_id=7)
+        response = self.measure('tmdb_search', reverse('tmdb_search'), data={'q': server.show(7)['name']})
+        known = {item['id']: item['series_id'] for item in response.context['results']}
+        self.assertEqual(known.pop(7), self.series.id)
+        self.assertFalse(any(known.values()))
+
+    def test_tmdb_import(self):
+        server = self.stub_tmdb()
+        response = self.measure(
+            'tmdb_import', reverse('tmdb_import', args=[150]), method='post', status=302,
+        )
+        series = Series.objects.get(tmdb_id=150)
+        self.assertEqual(response.url, reverse('series_detail', args=[series.id]))
+        self.assertEqual(series.episodes.count(), server.show(150)['number_of_episodes'])
+        self.assertEqual(series.get_season_index().total_episodes, series.episodes.count())
+
+    def test_autocomplete(self):
+        url = reverse('autocomplete')
+        self.client.get(url, {'q': 'и'})
+        response = self.measure('autocomplete', url, data={'q': self.series.title[:4]})
+        self.assertTrue(response.json()['results'])
+
+    def test_poster(self):
+        path = generate_thumbnails(poster_bytes())['files']['webp']['200']
+        response = self.measure('poster', poster_url(path))
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class ApiBudgetTests(QueryBudgetTestCase):
+    budgets = {
+        'api_series_list': 3,
+        'api_series_list_not_modified': 3,
+        'api_series_detail': 3,
+        'api_plan_list': 3,
+        'api_plan_progress': 15,
+        'api_rating_list': 3,
+        'api_history_list': 3,
+    }
+
+    def test_all_urls_have_budgets(self):
+        missing = url_names('planner.api_urls') - set(self.budgets)
+        self.assertFalse(missing, f'Нет бюджета для: {sorted(missing)}')
+
+    def test_series_list_pages_and_delta(self):
+        url = reverse('api_series_list')
+        response = self.measure('api_series_list', url, data={'limit': 50})
+        page = response.json()
+        self.assertEqual(len(page['results']), 50)
+        second = self.client.get(url, {'limit': 50, 'cursor': page['next']}).json()
+        self.assertFalse({item['id'] for item in page['results']} & {item['id'] for item in second['results']})
+
+        since = Series.objects.latest('updated_at').updated_at.isoformat()
+        Series.objects.filter(pk=page['results'][0]['id']).update(updated_at=timezone.now())
+        delta = self.client.get(url, {'since': since}).json()
+        self.assertEqual([item['id'] for item in delta['results']], [page['results'][0]['id']])
+        self.assertIsNone(delta['next'])
+
+        etag = self.client.get(url, {'since': since})['ETag']
+        self.measure(
+            'api_series_list_not_modified', url, data={'since': since}, status=304, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(self.client.get(url, {'since': 'вчера'}).status_code, 400)
+
+    def test_series_detail(self):
+        series = Series.objects.exclude(season_index={}).first()
+        response = self.measure('api_series_detail', reverse('api_series_detail', args=[series.id]))
+        self.assertEqual(sum(count for _, count in response.json()['seasons']), series.episodes.count())
+        self.assertEqual(self.client.get(reverse('api_series_detail', args=[0])).status_code, 404)
+
+    def test_plan_list(self):
+        response = self.measure('api_plan_list', reverse('api_plan_list'), data={'limit': 500})
+        self.assertEqual(len(response.json()['results']), self.user.viewing_plans.count())
+
+    def test_rating_list(self):
+        self.measure('api_rating_list', reverse('api_rating_list'))
+
+    def test_history_list(self):
+        response = self.measure('api_history_list', reverse('api_history_list'))
+        self.assertEqual(len(response.json()['results']), 100)
+
+    def test_plan_progress_is_applied_in_one_batch(self):
+        plans = list(self.user.viewing_plans.order_by('id')[:20])
+        new_series = Series.objects.exclude(user_plans__user=self.user).first()
+        updates = [
+            {'series_id': plan.series_id, 'last_season_watched': 1, 'last_episode_watched': 1, 'status': 'watching'}
+            for plan in plans
+        ] + [{'series_id': new_series.id, 'status': 'planning', 'daily_hours_available': 1.5}]
+
+        response = self.measure(
+            'api_plan_progress', reverse('api_plan_progress'), method='post',
+            data={'updates': updates}, content_type='application/json',
+        )
+        self.assertEqual(len(response.json()['results']), 21)
+        self.assertEqual(
+            self.user.viewing_plans.filter(series_id__in=[plan.series_id for plan in plans], status='watching',
+                                           last_season_watched=1, last_episode_watched=1).count(),
+            20,
+        )
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.total_series, self.user.viewing_plans.count())
+
+        series = Series.objects.create(title='Пакетный', total_seasons=2, total_episodes=20)
+        Episode.objects.bulk_create([
+            Episode(series=series, season_number=season, episode_number=number, duration=30)
+            for season in (1, 2) for number in range(1, 11)
+        ])
+        tmdb_service.finish_episode_import(series.pk)
+        before = self.user.stats.total_episodes
+        self.client.post(
+            reverse('api_plan_progress'), content_type='application/json',
+            data={'updates': [{'series_id': series.pk, 'last_season_watched': 2, 'last_episode_watched': 5}]},
+        )
+        self.assertEqual(UserViewingPlan.objects.get(user=self.user, series=series).episodes_watched, 15)
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.total_episodes, before + 15)
+
+        bad = self.client.post(
+            reverse('api_plan_progress'), content_type='application/json',
+            data={'updates': [{'series_id': plans[0].series_id, 'status': 'paused'},
+                              {'series_id': plans[1].series_id, 'last_episode_watched': -1}]},
+        )
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(bad.json()['details'], {'1': 'Неверные поля: last_episode_watched'})
+        self.assertEqual(UserViewingPlan.objects.get(pk=plans[0].pk).status, 'watching')
+
+    def test_anonymous_gets_401(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_plan_list')).status_code, 401)
+
+
+class ProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='viewer')
+        cls.series = Series.objects.create(title='Неровные сезоны', total_seasons=3, total_episodes=10)
+        for season, count in ((1, 2), (2, 5), (3, 3)):
+            for number in range(1, count + 1):
+                Episode.objects.create(
+                    series=cls.series, season_number=season, episode_number=number, duration=30 + season
+                )
+        cls.series.refresh_from_db()
+        cls.plain = Series.objects.create(title='Без эпизодов', total_seasons=3, total_episodes=10)
+
+    def test_season_index_is_rebuilt_from_episodes(self):
+        self.series.refresh_from_db()
+        index = self.series.get_season_index()
+        self.assertEqual(index.to_ordinal(2, 3), 5)
+        self.assertEqual(index.from_ordinal(8), (3, 1))
+        self.assertEqual(index.elapsed_minutes(2, 1), 2 * 31 + 32)
+
+    def test_with_progress_matches_model_methods(self):
+        for series in (self.series, self.plain):
+            for season, episode in ((0, 0), (1, 2), (2, 4), (3, 3), (5, 1)):
+                plan = UserViewingPlan.objects.create(
+                    user=self.user, series=series,
+                    last_season_watched=season, last_episode_watched=episode,
+                )
+                annotated = UserViewingPlan.objects.with_progress().get(pk=plan.pk)
+                fresh = UserViewingPlan.objects.get(pk=plan.pk)
+                self.assertEqual(
+                    (annotated.get_episodes_watched(), annotated.get_progress_percentage(),
+                     annotated.calculate_completion_days()),
+                    (fresh.get_episodes_watched(), fresh.get_progress_percentage(),
+                     fresh.calculate_completion_days()),
+                )
+                plan.delete()
+
+    def test_progress_follows_episode_numbering_gaps(self):
+        series = Series.objects.create(title='С пропусками', total_seasons=2, total_episodes=5)
+        for season, number in ((1, 2), (1, 3), (2, 1), (2, 5), (2, 6)):
+            Episode.objects.create(series=series, season_number=season, episode_number=number, duration=30)
+        plan = UserViewingPlan.objects.create(
+            user=self.user, series=series, last_season_watched=2, last_episode_watched=2,
+        )
+        annotated = UserViewingPlan.objects.with_progress().get(pk=plan.pk)
+        self.assertEqual(annotated.get_episodes_watched(), plan.get_episodes_watched())
+        self.assertEqual(annotated.get_episodes_watched(), 4)
+
+        # Новый эпизод прошлого сезона сдвигает прогресс и в SQL
+        Episode.objects.create(series=series, season_number=1, episode_number=4, duration=30)
+        fresh = UserViewingPlan.objects.select_related('series').get(pk=plan.pk)
+        annotated = UserViewingPlan.objects.with_progress().get(pk=plan.pk)
+        self.assertEqual((annotated.get_episodes_watched(), fresh.get_episodes_watched()), (5, 5))
+
+    def test_user_stats_follow_plan_changes(self):
+        plan = UserViewingPlan.objects.create(user=self.user, series=self.series, status='watching')
+        plan.last_season_watched, plan.last_episode_watched = 2, 2
+        plan.save()
+        stats = self.user.stats
+        stats.refresh_from_db()
+        self.assertEqual((stats.total_series, stats.watching, stats.total_episodes), (1, 1, 4))
+        plan.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.total_series, stats.watching, stats.total_episodes), (0, 0, 0))
+
+    def test_user_stats_follow_series_changes(self):
+        UserViewingPlan.objects.create(
+            user=self.user, series=self.plain, status='watching', last_season_watched=2, last_episode_watched=1,
+        )
+        stats = self.user.stats
+        self.assertEqual(stats.total_episodes, 4)
+
+        # Сериалу загрузили эпизоды и поменяли жанры: вклад плана пересчитывается в фоне
+        for number in range(1, 6):
+            Episode.objects.create(series=self.plain, season_number=1, episode_number=number, duration=20)
+        Episode.objects.create(series=self.plain, season_number=2, episode_number=1, duration=20)
+        self.plain.refresh_from_db()
+        self.plain.genres = 'Драма'
+        self.plain.save()
+        self.assertEqual(Job.objects.filter(name='rebuild_series_stats', status='queued').count(), 1)
+        call_command('run_worker', once=True, stdout=io.StringIO())
+        stats.refresh_from_db()
+        self.assertEqual((stats.total_episodes, stats.genre_counts), (6, {'Драма': 1}))
+        self.assertEqual(stats.total_minutes, 6 * self.plain.average_episode_duration)
+
+    def test_schedule_fits_daily_budget_and_is_reused(self):
+        UserViewingPlan.objects.create(
+            user=self.user, series=self.series, status='watching',
+            last_season_watched=1, last_episode_watched=2, episodes_per_day=2, daily_hours_available=1.5,
+        )
+        UserViewingPlan.objects.create(
+            user=self.user, series=self.plain, status='watching',
+            last_season_watched=3, last_episode_watched=2, episodes_per_day=0, daily_hours_available=1,
+        )
+        days = get_schedule(self.user)
+        # 8 эпизодов по 32-33 мин и 2 по 45 мин при 90 минутах в день
+        self.assertEqual(
+            [[(item['season'], item['episode']) for item in day['episodes']] for day in days],
+            [[(3, 3), (2, 1)], [(3, 4), (2, 2)], [(2, 3), (2, 4)], [(2, 5), (3, 1)], [(3, 2), (3, 3)]],
+        )
+        self.assertTrue(all(day['minutes'] <= 90 for day in days))
+        self.assertTrue(days[-1]['episodes'][-1]['finale'])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(get_schedule(self.user), days)
+        self.assertEqual(build_schedule([], timezone.localdate()), [])
+
+    def test_forecast_follows_recent_pace(self):
+        today = timezone.localdate()
+        plan = UserViewingPlan.objects.create(user=self.user, series=self.plain, status='watching', episodes_per_day=1)
+        paused = UserViewingPlan.objects.create(
+            user=self.user, series=self.series, status='paused', forecast_pace=2, forecast_date=today,
+        )
+        updated_at = UserViewingPlan.objects.get(pk=plan.pk).updated_at
+
+        # Без истории прогноз совпадает с заявленным темпом
+        self.assertEqual(refresh_forecasts([self.user.pk]), 2)
+        plan.refresh_from_db()
+        self.assertEqual((plan.forecast_pace, plan.forecast_date), (1.0, today + timedelta(days=10)))
+        self.assertLess(plan.forecast_earliest, plan.forecast_date)
+        self.assertGreater(plan.forecast_latest, plan.forecast_date)
+        self.assertEqual(plan.updated_at, updated_at)
+        paused.refresh_from_db()
+        self.assertIsNone(paused.forecast_pace)
+        with self.assertNumQueries(2):
+            self.assertEqual(refresh_forecasts([self.user.pk]), 0)
+
+        # Две недели по 3 эпизода в день перевешивают заявленный 1; сегодняшний день не учитывается
+        UserViewingPlan.objects.filter(pk=plan.pk).update(started_at=timezone.now() - timedelta(days=20))
+        DailyWatchStats.objects.bulk_create(
+            DailyWatchStats(user=self.user, series=self.plain, date=today - timedelta(days=age), episodes=3)
+            for age in range(1, 15)
+        )
+        DailyWatchStats.objects.create(user=self.user, series=self.plain, date=today, episodes=50)
+        self.assertEqual(refresh_forecasts([self.user.pk]), 1)
+        plan.refresh_from_db()
+        # (3 * 7.96 + 1 * 3) / (7.96 + 1.19 + 3): недели без истории и заявленный темп тянут вниз
+        self.assertEqual(plan.forecast_pace, 2.21)
+        self.assertEqual(plan.forecast_date, today + timedelta(days=5))
+        self.assertLessEqual(plan.forecast_earliest, plan.forecast_date)
+        self.assertGreaterEqual(plan.forecast_latest, plan.forecast_date)
+
+        UserViewingPlan.objects.filter(pk=plan.pk).update(status='paused')
+        out = io.StringIO()
+        call_command('compute_forecasts', stdout=out)
+        self.assertIn('изменилось планов: 1', out.getvalue())
+        plan.refresh_from_db()
+        self.assertEqual((plan.forecast_pace, plan.forecast_date, plan.forecast_latest), (None, None, None))
+
+    def test_range_is_recorded_in_one_pass(self):
+        plan = UserViewingPlan.objects.create(user=self.user, series=self.series, status='planning')
+        plan = UserViewingPlan.objects.select_related('series').get(pk=plan.pk)
+        self.assertEqual(parse_ranges('S01E02 – S02E02; s3e3'), [((1, 2), (2, 2)), ((3, 3), (3, 3))])
+
+        # Несуществующие эпизоды не двигают прогресс; конец диапазона за концом сезона обрезается
+        with self.assertRaises(ValidationError):
+            mark_watched(plan, parse_ranges('S99E01-S99E03'))
+        self.assertEqual((plan.status, plan.last_season_watched), ('planning', 0))
+        self.assertFalse(WatchingHistory.objects.filter(user=self.user).exists())
+        self.assertEqual(mark_watched(plan, parse_ranges('S01E01-S01E09')), 2)
+        self.assertEqual((plan.status, plan.last_season_watched, plan.last_episode_watched), ('watching', 1, 2))
+        WatchingHistory.objects.filter(user=self.user).delete()
+
+        self.assertEqual(mark_watched(plan, parse_ranges('S01E02-S02E02, S03E03')), 4)
+        history = WatchingHistory.objects.filter(user=self.user)
+        self.assertEqual(
+            sorted(history.values_list('episode__season_number', 'episode__episode_number')),
+            [(1, 2), (2, 1), (2, 2), (3, 3)],
+        )
+        plan.refresh_from_db()
+        self.assertEqual((plan.status, plan.last_season_watched, plan.last_episode_watched), ('completed', 3, 3))
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.history_entries, 4)
+        self.assertEqual(DailyWatchStats.objects.get(user=self.user).episodes, 4)
+
+        plain = UserViewingPlan.objects.create(user=self.user, series=self.plain, status='watching')
+        plain = UserViewingPlan.objects.select_related('series').get(pk=plain.pk)
+        self.assertEqual(mark_watched(plain, parse_ranges('S01E01-S01E03')), 3)
+
+        # О сериале ничего не известно: отдельный эпизод записывается без Episode
+        unknown = Series.objects.create(title='Без данных')
+        unknown_plan = UserViewingPlan.objects.create(user=self.user, series=unknown, status='watching')
+        unknown_plan = UserViewingPlan.objects.select_related('series').get(pk=unknown_plan.pk)
+        self.assertEqual(mark_watched(unknown_plan, parse_ranges('S02E05')), 1)
+        self.assertEqual((unknown_plan.last_season_watched, unknown_plan.last_episode_watched), (2, 5))
+        self.assertIsNone(WatchingHistory.objects.get(series=unknown).episode_id)
+
+    def test_daily_rollup_follows_history_and_backfill(self):
+        episodes = list(self.series.episodes.order_by('season_number', 'episode_number')[:3])
+        records = [
+            WatchingHistory.objects.create(user=self.user, series=self.series, episode=episode, duration_watched=30)
+            for episode in episodes
+        ]
+        rollup = DailyWatchStats.objects.filter(user=self.user)
+        self.assertEqual(list(rollup.values_list('date', 'episodes', 'minutes')), [(timezone.localdate(), 3, 90)])
+
+        records[0].delete()
+        self.assertEqual(list(rollup.values_list('episodes', 'minutes')), [(2, 60)])
+
+        rollup.update(minutes=0)
+        call_command('backfill_daily_stats', self.user.pk, stdout=io.StringIO())
+        self.assertEqual(list(rollup.values_list('episodes', 'minutes')), [(2, 60)])
+
+        WatchingHistory.objects.filter(user=self.user).delete()
+        self.assertFalse(rollup.exists())
+
+
+class GenreTests(TestCase):
+    def test_tags_follow_genre_string_and_facets_are_per_user(self):
+        user, other = User.objects.create(username='viewer'), User.objects.create(username='other')
+        drama = Series.objects.create(title='Драма', genres='Драма, Криминал')
+        comedy = Series.objects.create(title='Комедия', genres='Комедия')
+        self.assertEqual(sorted(drama.genre_tags.values_list('name', flat=True)), ['Драма', 'Криминал'])
+
+        comedy.genres = 'Комедия, Драма'
+        comedy.save()
+        self.assertEqual(sorted(comedy.genre_tags.values_list('name', flat=True)), ['Драма', 'Комедия'])
+
+        UserViewingPlan.objects.create(user=user, series=comedy)
+        UserViewingPlan.objects.create(user=other, series=drama)
+        facets = genre_facets()
+        self.assertEqual([(genre.name, genre.catalog_count) for genre in facets][0], ('Драма', 2))
+        with self.assertNumQueries(1):
+            facets = genre_facets(user)
+        self.assertEqual(
+            {genre.name: genre.user_count for genre in facets}, {'Драма': 1, 'Комедия': 1, 'Криминал': 0},
+        )
+
+
+class AutocompleteTests(TestCase):
+    def test_long_prefix_top_is_exact_and_limit_is_clamped(self):
+        rows = [(n, f'Сериал {n}', n / 10) for n in range(8000)]
+        index = autocomplete.TitleIndex(rows)
+        self.assertEqual([item[1] for item in index.lookup('сериал', 3)], [7999, 7998, 7997])
+        self.assertEqual(len(index.lookup('сериал', 0)), 1)
+        self.assertEqual(len(index.lookup('сериал', -5)), 1)
+        self.assertEqual(len(index.lookup('сериал', 1000)), autocomplete.MAX_LIMIT)
+
+    def test_catalog_version_survives_local_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Series.objects.create(title='Первый')
+        version = autocomplete.get_catalog_version()
+        # Другой процесс с локальным кэшем читает версию из БД
+        cache.clear()
+        self.assertEqual(autocomplete.get_catalog_version(), version)
+
+        # Внутри транзакции версия не меняется до коммита
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Series.objects.create(title='Второй')
+            self.assertEqual(autocomplete.get_catalog_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(autocomplete.get_catalog_version(), version + 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def test_pages_cover_catalog_once(self):
+        Series.objects.bulk_create([
+            Series(title=f'Сериал {n}', rating=None if n % 4 == 0 else n % 3) for n in range(57)
+        ])
+        expected = list(
+            Series.objects.with_catalog_rating().order_by(*Series.CATALOG_ORDERING)
+            .values_list('id', flat=True)
+        )
+        seen, cursor = [], None
+        while True:
+            page = keyset_paginate(
+                Series.objects.with_catalog_rating(), Series.CATALOG_ORDERING, cursor, per_page=10
+            )
+            seen += [series.id for series in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+        # Испорченный курсор означает первую страницу, а не 500
+        first = keyset_paginate(Series.objects.with_catalog_rating(), Series.CATALOG_ORDERING, None, per_page=10)
+        for values in ([None, None, None], [1.0, {'x': 1}, 1], [1.0, 'вчера', 1], [True, 1, 1], 'x', [1]):
+            page = keyset_paginate(
+                Series.objects.with_catalog_rating(), Series.CATALOG_ORDERING, encode_cursor(values), per_page=10,
+            )
+            self.assertEqual([series.id for series in page], [series.id for series in first])
+        self.assertEqual(self.client.get(reverse('home'), {'cursor': encode_cursor([None, None, None])}).status_code, 200)
+
+
+class TMDBClientTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_ = TMDBClient(api_key='key', base_url='http://tmdb.test/3')
+
+    def response(self, status=200, data=None, etag='"v1"'):
+        return mock.Mock(status_code=status, headers={'ETag': etag}, json=mock.Mock(return_value=data))
+
+    def test_repeated_calls_are_served_from_cache(self):
+        with mock.patch.object(self.client_.session, 'get', return_value=self.response(data={'id': 1})) as get:
+            self.assertEqual(self.client_.get_series_details(1), {'id': 1})
+            self.assertEqual(self.client_.get_series_details(1), {'id': 1})
+            self.client_.clear_local_cache()
+            self.assertEqual(self.client_.get_series_details(1), {'id': 1})
+        self.assertEqual(get.call_count, 1)
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        self.client_.ttl = -1
+        with mock.patch.object(self.client_.session, 'get', return_value=self.response(data={'id': 1})):
+            self.client_.get_series_details(1)
+        with mock.patch.object(self.client_.session, 'get', return_value=self.response(status=304)) as get:
+            self.assertEqual(self.client_.get_series_details(1), {'id': 1})
+        self.assertEqual(get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+    def test_warm_django_cache_keeps_lru_bounded(self):
+        self.client_.lru_size = 2
+        with mock.patch.object(self.client_.session, 'get', return_value=self.response(data={'id': 1})):
+            for tmdb_id in range(5):
+                self.client_.get_series_details(tmdb_id)
+        self.client_.clear_local_cache()
+        with mock.patch.object(self.client_.session, 'get') as get:
+            for tmdb_id in range(5):
+                self.client_.get_series_details(tmdb_id)
+        get.assert_not_called()
+        self.assertEqual(len(self.client_._lru), 2)
+
+    def test_every_retry_passes_the_rate_limiter(self):
+        limiter = mock.Mock()
+        client = TMDBClient(api_key='key', base_url='http://tmdb.test/3', retries=2, backoff=0, rate_limiter=limiter)
+        responses = [self.response(status=503), self.response(status=429), self.response(data={'id': 1})]
+        with mock.patch.object(client.session, 'get', side_effect=responses) as get:
+            self.assertEqual(client.get_series_details(1), {'id': 1})
+        self.assertEqual((get.call_count, limiter.acquire.call_count), (3, 3))
+
+    def test_retry_after_is_capped(self):
+        client = TMDBClient(api_key='key', base_url='http://tmdb.test/3', retries=2, backoff=1)
+        hostile, dated = self.response(status=429), self.response(status=503)
+        hostile.headers['Retry-After'] = '86400'
+        dated.headers['Retry-After'] = 'Wed, 21 Oct 2026 07:28:00 GMT'
+        responses = [hostile, dated, self.response(data={'id': 1})]
+        with mock.patch.object(client.session, 'get', side_effect=responses), \
+                mock.patch('planner.tmdb_service.time.sleep') as sleep:
+            self.assertEqual(client.get_series_details(1), {'id': 1})
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [tmdb_service.MAX_BACKOFF, 2])
+
+
+class ImportTMDBTests(TestCase):
+    def test_import_is_batched_and_idempotent(self):
+        with StubTMDBServer(fail_ids={3}) as server:
+            options = {'base_url': server.url, 'api_key': 'stub', 'batch_size': 4, 'retries': 0}
+            call_command('import_tmdb', 1, 2, 3, discover=True, pages=1, stdout=io.StringIO(), **options)
+            out = io.StringIO()
+            call_command('import_tmdb', 1, 2, stdout=out, **options)
+
+        self.assertEqual(Series.objects.count(), 19)
+        self.assertIn('эпизодов записано: 0', out.getvalue())
+
+        series = Series.objects.get(tmdb_id=1)
+        expected = server.show(1)
+        self.assertEqual(series.title, expected['name'])
+        self.assertEqual(
+            sorted(series.genre_tags.values_list('tmdb_id', flat=True)),
+            sorted(genre['id'] for genre in expected['genres']),
+        )
+        self.assertEqual(series.episodes.count(), expected['number_of_episodes'])
+        self.assertEqual(series.get_season_index().total_episodes, expected['number_of_episodes'])
+        self.assertEqual(
+            series.get_season_index().total_minutes,
+            sum(episode.duration for episode in series.episodes.all()),
+        )
+
+    def test_metadata_upsert_keeps_duration_from_episodes(self):
+        details = {'id': 901, 'name': 'Короткие серии', 'episode_run_time': [], 'vote_average': 7.0}
+        series_id = tmdb_service.upsert_series([details])[901]
+        sync_season_episodes(series_id, 1, [{'episode_number': n, 'runtime': 25} for n in (1, 2)])
+        tmdb_service.finish_episode_import(series_id)
+        self.assertEqual(Series.objects.get(pk=series_id).average_episode_duration, 25)
+
+        tmdb_service.upsert_series([{**details, 'vote_average': 8.0}])
+        series = Series.objects.get(pk=series_id)
+        self.assertEqual((series.rating, series.average_episode_duration), (8.0, 25))
+
+
+    def test_episode_upsert_kwargs_follow_vendor(self):
+        series = Series.objects.create(title='Сериал')
+        episodes = [{'episode_number': 1, 'name': 'Пилот', 'runtime': 40}]
+        unique = ['series', 'season_number', 'episode_number']
+        for vendor, expected in (('mysql', None), ('sqlite', unique), ('postgresql', unique)):
+            with mock.patch.object(connection, 'vendor', vendor), \
+                    mock.patch.object(Episode.objects, 'bulk_create') as bulk_create:
+                sync_season_episodes(series.pk, 1, episodes, 45)
+            options = bulk_create.call_args.kwargs
+            self.assertEqual(options.get('unique_fields'), expected, vendor)
+            self.assertEqual((options['update_conflicts'], options['update_fields']), (True, EPISODE_FIELDS))
+
+
+class AsyncTMDBClientTests(SimpleTestCase):
+    def test_seasons_are_fetched_concurrently(self):
+        cache.clear()
+
+        async def fetch(url):
+            async with AsyncTMDBClient(api_key='stub', base_url=url, rate_limiter=None) as client:
+                return await client.fetch_series(tmdb_id)
+
+        with StubTMDBServer(latency=0.2) as server:
+            tmdb_id = next(i for i in range(1, 100) if server.show(i)['number_of_seasons'] >= 4)
+            started = time.perf_counter()
+            details, seasons = asyncio.run(fetch(server.url))
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(sorted(seasons), list(range(1, details['number_of_seasons'] + 1)))
+        self.assertEqual(server.request_count, 1 + len(seasons))
+        # Последовательно вышло бы не меньше (1 + сезонов) * 0.2 с
+        self.assertLess(elapsed, 0.2 * (1 + len(seasons)) - 0.2)
+
+
+class SyncTMDBTests(TestCase):
+    def sync(self, server):
+        with self.assertLogs('planner.tmdb_sync', 'INFO'):
+            call_command('sync_tmdb', base_url=server.url, api_key='stub', retries=0, stdout=io.StringIO())
+        return SyncState.objects.get(name='tmdb').metrics
+
+    def test_only_changed_series_and_seasons_are_refetched(self):
+        with StubTMDBServer() as server:
+            call_command('import_tmdb', 1, 2, 3, base_url=server.url, api_key='stub', stdout=io.StringIO())
+
+            metrics = self.sync(server)
+            self.assertEqual(metrics['mode'], 'hash')
+            self.assertEqual(metrics['series_unchanged'], 3)
+
+            server.touch(2)
+            metrics = self.sync(server)
+            self.assertEqual(metrics['mode'], 'changes')
+            self.assertEqual(metrics['series_checked'], 1)
+            self.assertEqual(metrics['seasons_fetched'], 1)
+            self.assertEqual(metrics['episodes_written'], 1)
+
+        series = Series.objects.get(tmdb_id=2)
+        self.assertEqual(series.episodes.count(), server.show(2)['number_of_episodes'])
+        self.assertEqual(series.get_season_index().total_episodes, series.episodes.count())
+
+    def test_interrupted_run_is_resumed(self):
+        with StubTMDBServer() as server:
+            call_command('import_tmdb', 1, 2, base_url=server.url, api_key='stub', stdout=io.StringIO())
+            SyncState.objects.create(name='tmdb', run_started_at=timezone.now(), pending=[2])
+            metrics = self.sync(server)
+
+        self.assertEqual(metrics['mode'], 'resume')
+        self.assertEqual(metrics['series_checked'], 1)
+        state = SyncState.objects.get(name='tmdb')
+        self.assertEqual(state.pending, [])
+        self.assertIsNotNone(state.watermark)
+
+
+class PosterTests(TempMediaMixin, TestCase):
+    def test_poster_is_cached_once_and_rendered_with_srcset(self):
+        series = Series.objects.create(title='Постер', poster_url='https://image.test/p.jpg')
+        series.save()
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('cache_poster', {'series_id': series.id}))
+
+        download = mock.Mock(content=poster_bytes(), raise_for_status=mock.Mock())
+        with mock.patch('planner.posters._session.get', return_value=download) as get:
+            call_command('run_worker', once=True, stdout=io.StringIO())
+            cache_poster(series.id)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(Job.objects.get().status, 'done')
+
+        series.refresh_from_db()
+        self.assertEqual(series.poster_thumbs['source'], series.poster_url)
+        self.assertEqual(sorted(series.poster_thumbs['files']['jpg'], key=int), ['200', '320', '500'])
+
+        html = poster(series, 'card-img-top', 300)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-320.webp 320w', html)
+        self.assertNotIn(series.poster_url, html)
+
+
+class JobQueueTests(TestCase):
+    def test_jobs_are_deduplicated_retried_and_recovered(self):
+        calls = []
+
+        def flaky(value):
+            calls.append(value)
+            if len(calls) < 3:
+                raise RuntimeError('сбой')
+
+        def broken(value):
+            raise RuntimeError('сбой')
+
+        tasks = {'flaky': (flaky, 3), 'broken': (broken, 3)}
+        with mock.patch.dict(jobs.TASKS, tasks), self.assertLogs('planner.jobs', 'WARNING'):
+            jobs.enqueue('flaky', {'value': 1}, dedupe_key='flaky:1')
+            jobs.enqueue('flaky', {'value': 1}, dedupe_key='flaky:1')
+            self.assertEqual(Job.objects.count(), 1)
+
+            [job] = jobs.claim('test')
+            self.assertEqual(job.dedupe_key, 'flaky:1')
+            self.assertIsNone(Job.objects.get(pk=job.pk).dedupe_key)
+            # Пока задача выполняется, такое же изменение снова попадает в очередь
+            jobs.enqueue('flaky', {'value': 1}, dedupe_key='flaky:1')
+            self.assertEqual(Job.objects.filter(status='queued').count(), 1)
+            Job.objects.filter(status='queued').delete()
+
+            self.assertFalse(jobs.run_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.dedupe_key), ('queued', 1, 'flaky:1'))
+            # Пока повтор ждет, дубликат не ставится
+            jobs.enqueue('flaky', {'value': 1}, dedupe_key='flaky:1')
+            self.assertEqual(Job.objects.count(), 1)
+            self.assertIn('RuntimeError', job.last_error)
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertEqual(jobs.claim('test'), [])
+
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertFalse(jobs.run_job(jobs.claim('test')[0]))
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            # Воркер захватил задачу и умер: по таймауту она возвращается в очередь
+            jobs.claim('dead')
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            self.assertEqual(jobs.requeue_stale(timeout=60), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 3))
+
+            # Если за время выполнения поставили такую же задачу, повтор отдается ей
+            jobs.enqueue('broken', {'value': 2}, dedupe_key='broken:2')
+            [job] = jobs.claim('test')
+            jobs.enqueue('broken', {'value': 2}, dedupe_key='broken:2')
+            self.assertFalse(jobs.run_job(job))
+            self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+            self.assertEqual(Job.objects.get(dedupe_key='broken:2').status, 'queued')
+
+        with self.assertRaises(ValueError):
+            jobs.enqueue('missing')
+
+    def test_plan_changes_rebuild_schedule_in_background(self):
+        user = User.objects.create_user('worker', password='pass')
+        series = Series.objects.create(title='Фон', total_seasons=1, total_episodes=10)
+        plan = UserViewingPlan.objects.create(user=user, series=series, status='watching')
+        plan.last_episode_watched = 2
+        plan.save()
+        self.assertEqual(Job.objects.filter(name='rebuild_schedule', status='queued').count(), 1)
+
+        out = io.StringIO()
+        call_command('run_worker', once=True, stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        with self.assertNumQueries(2):
+            days = get_schedule(user)
+        self.assertEqual(days[0]['episodes'][0]['episode'], 3)
+
+
+class CardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_shared_and_invalidated_on_change(self):
+        series = Series.objects.create(title='Старое название', total_episodes=10)
+        render_cards([series])
+        self.assertIsNotNone(cache.get(card_key(series.id)))
+
+        series.title = 'Новое название'
+        series.save()
+        self.assertIsNone(cache.get(card_key(series.id)))
+        self.assertIn('Новое название', render_cards([series])[0].html)
+
+        # Изменение в обход сигналов отсекается по updated_at
+        Series.objects.filter(pk=series.pk).update(total_episodes=99, updated_at=timezone.now())
+        series.refresh_from_db()
+        self.assertIn('99 эпизодов', render_cards([series])[0].html)
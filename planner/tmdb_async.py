@@ -0,0 +1,175 @@
+"""Асинхронный клиент TMDB для представлений под ASGI.
+
+Запросы идут через httpx.AsyncClient и не занимают поток, пока TMDB
+отвечает, поэтому медленный API не выедает пул воркеров. Кэш ответов
+общий с синхронным TMDBClient (тот же ключ в кэше Django), повторы на
+429/5xx и общий token bucket - те же, только ожидание через asyncio.sleep.
+
+Клиент создается на запрос (async with AsyncTMDBClient() as client): под
+WSGI каждое асинхронное представление выполняется в собственном цикле
+событий, и пул соединений нельзя переиспользовать между запросами.
+"""
+import asyncio
+import logging
+import ssl
+import threading
+import time
+
+from django.core.cache import cache
+
+from . import tmdb_service
+from .ratelimit import shared_bucket
+from .tmdb_service import (
+    CACHE_TTL, LANGUAGE, RETRY_STATUSES, STALE_TTL, TMDBError, cache_key, retry_delay, season_numbers,
+)
+
+try:
+    import certifi
+    import httpx
+except ImportError:  # pragma: no cover - httpx указан в requirements.txt
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+_ssl_context = None
+_ssl_lock = threading.Lock()
+
+
+def ssl_context():
+    """Общий SSL-контекст: загрузка сертификатов стоит десятки миллисекунд,
+    а клиент создается на каждый запрос."""
+    global _ssl_context
+    if _ssl_context is None:
+        with _ssl_lock:
+            if _ssl_context is None:
+                _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
+
+class AsyncTMDBClient:
+    def __init__(self, api_key=None, base_url=None, timeout=5, retries=3, backoff=0.5,
+                 pool_size=20, ttl=CACHE_TTL, rate_limiter=None):
+        if httpx is None:
+            raise TMDBError('Для асинхронного клиента TMDB нужен пакет httpx')
+        self.api_key = tmdb_service.TMDB_API_KEY if api_key is None else api_key
+        self.base_url = (base_url or tmdb_service.BASE_URL).rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self.ttl = ttl
+        if rate_limiter is None:
+            rate_limiter = shared_bucket('tmdb', tmdb_service.RATE_LIMIT)
+        self.rate_limiter = rate_limiter
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            verify=ssl_context(),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.api_key)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _request(self, path, params, headers):
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire()
+            try:
+                response = await self.http.get(
+                    f'{self.base_url}{path}', params={**params, 'api_key': self.api_key}, headers=headers,
+                )
+            except httpx.HTTPError as e:
+                if attempt == self.retries:
+                    raise TMDBError(str(e)) from e
+                retry_after = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                retry_after = response.headers.get('Retry-After')
+            await asyncio.sleep(retry_delay(retry_after, attempt, self.backoff))
+
+    async def get(self, path, ttl=None, **params):
+        """Асинхронный GET с тем же кэшем и ревалидацией по ETag, что у TMDBClient.get."""
+        ttl = self.ttl if ttl is None else ttl
+        params.setdefault('language', LANGUAGE)
+        key = cache_key(self.base_url, path, params)
+        started = time.perf_counter()
+
+        entry = await cache.aget(key)
+        if entry is not None and ttl and entry['expires'] > time.time():
+            self._log(path, 'hit_django', 200, started)
+            return entry['data']
+
+        headers = {}
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        try:
+            response = await self._request(path, params, headers)
+        except TMDBError as e:
+            self._log(path, 'error', None, started, level=logging.WARNING, error=str(e))
+            raise
+
+        if response.status_code == 304 and entry is not None:
+            entry = {**entry, 'expires': time.time() + ttl}
+            await cache.aset(key, entry, STALE_TTL)
+            self._log(path, 'revalidated', 304, started)
+            return entry['data']
+
+        if response.status_code >= 400:
+            self._log(path, 'error', response.status_code, started, level=logging.WARNING)
+            raise TMDBError(f'TMDB {path}: HTTP {response.status_code}')
+
+        data = response.json()
+        await cache.aset(key, {
+            'data': data,
+            'etag': response.headers.get('ETag'),
+            'expires': time.time() + ttl,
+        }, STALE_TTL)
+        self._log(path, 'miss', response.status_code, started)
+        return data
+
+    def _log(self, path, outcome, status, started, level=logging.INFO, **extra):
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.log(
+            level, 'tmdb async %s %s status=%s latency_ms=%s', path, outcome, status, latency_ms,
+            extra={'tmdb_path': path, 'tmdb_cache': outcome, 'tmdb_status': status,
+                   'latency_ms': latency_ms, **extra},
+        )
+
+    async def search_series(self, query):
+        return (await self.get('/search/tv', query=query)).get('results', [])
+
+    async def get_series_details(self, tmdb_id, ttl=None):
+        return await self.get(f'/tv/{tmdb_id}', ttl=ttl)
+
+    async def get_season(self, tmdb_id, season_number, ttl=None):
+        return await self.get(f'/tv/{tmdb_id}/season/{season_number}', ttl=ttl)
+
+    async def fetch_series(self, tmdb_id):
+        """Детали сериала и все его сезоны; сезоны запрашиваются одновременно.
+
+        Возвращает (details, {номер сезона: ответ или None при ошибке}).
+        """
+        details = await self.get_series_details(tmdb_id)
+        numbers = season_numbers(details)
+        results = await asyncio.gather(
+            *(self.get_season(tmdb_id, number) for number in numbers), return_exceptions=True,
+        )
+        seasons = {}
+        for number, result in zip(numbers, results):
+            if isinstance(result, TMDBError):
+                logger.warning('TMDB season %s of %s failed: %s', number, tmdb_id, result)
+                result = None
+            elif isinstance(result, BaseException):
+                raise result
+            seasons[number] = result
+        return details, seasons
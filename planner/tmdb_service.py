@@ -1,87 +1,538 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
 import requests
 from decouple import config
-from .models import Series
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .autocomplete import bump_catalog_version
+from .cards import invalidate_card
+from .models import Episode, Genre, Series
+from .genres import get_or_create_genre, set_series_genres
+from .posters import schedule_poster
+from .ratelimit import shared_bucket
+from .season_index import build_season_index
+from .stats import schedule_series_stats
+from .upsert import upsert_options
+
+logger = logging.getLogger(__name__)
 
 TMDB_API_KEY = config('TMDB_API_KEY', default='')
-BASE_URL = 'https://api.themoviedb.org/3'
+BASE_URL = config('TMDB_BASE_URL', default='https://api.themoviedb.org/3')
+LANGUAGE = 'ru-RU'
+
+CACHE_TTL = config('TMDB_CACHE_TTL', default=6 * 60 * 60, cast=int)
+# Протухшие ответы храним дольше TTL, чтобы перепроверять их через ETag
+STALE_TTL = 7 * 24 * 60 * 60
+LRU_SIZE = 512
+# Общий для всех процессов лимит исходящих запросов (запросов в секунду)
+RATE_LIMIT = config('TMDB_RATE_LIMIT', default=40, cast=float)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Потолок паузы перед повтором, в том числе по заголовку Retry-After (секунд)
+MAX_BACKOFF = 30
+
+
+class TMDBError(Exception):
+    pass
+
+
+def retry_delay(retry_after, attempt, backoff):
+    """Пауза перед повтором: Retry-After в секундах или экспоненциальный backoff.
+
+    Нецелый заголовок (в том числе HTTP-дата) игнорируется, пауза не
+    превышает MAX_BACKOFF.
+    """
+    delay = int(retry_after) if retry_after and retry_after.isdigit() else backoff * 2 ** attempt
+    return min(delay, MAX_BACKOFF)
+
+
+def cache_key(base_url, path, params):
+    """Ключ кэша ответа; общий для синхронного и асинхронного клиентов."""
+    raw = base_url + path + '?' + '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return 'tmdb:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TMDBClient:
+    """
+    Клиент TMDB API: пул соединений с keep-alive, повторы с backoff на 429/5xx
+    и кэш ответов (LRU в процессе поверх кэша Django) с TTL и ревалидацией по ETag.
+
+    Повторы выполняются здесь, а не в urllib3: каждая попытка проходит через
+    общий rate limiter.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=5, retries=3,
+                 backoff=0.5, pool_size=10, ttl=CACHE_TTL, lru_size=LRU_SIZE,
+                 rate_limiter=None):
+        self.api_key = TMDB_API_KEY if api_key is None else api_key
+        self.base_url = (base_url or BASE_URL).rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.rate_limiter = rate_limiter
+
+        adapter = HTTPAdapter(max_retries=Retry(total=0, raise_on_status=False),
+                              pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def enabled(self):
+        return bool(self.api_key)
+
+    def cache_key(self, path, params):
+        return cache_key(self.base_url, path, params)
+
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+            return entry
+
+    def _lru_put(self, key, entry):
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _store(self, key, entry):
+        self._lru_put(key, entry)
+        cache.set(key, entry, STALE_TTL)
+
+    def clear_local_cache(self):
+        with self._lock:
+            self._lru.clear()
+
+    def _request(self, path, params, headers):
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(
+                    f'{self.base_url}{path}',
+                    params={**params, 'api_key': self.api_key},
+                    headers=headers,
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise TMDBError(str(e)) from e
+                retry_after = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                retry_after = response.headers.get('Retry-After')
+            time.sleep(retry_delay(retry_after, attempt, self.backoff))
+
+    def get(self, path, ttl=None, **params):
+        """GET к TMDB с кэшированием. Возвращает JSON или бросает TMDBError.
+
+        ttl переопределяет время жизни ответа; при ttl=0 кэшированный ответ
+        всегда перепроверяется через If-None-Match.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        params.setdefault('language', LANGUAGE)
+        key = self.cache_key(path, params)
+        started = time.perf_counter()
+
+        entry = self._lru_get(key)
+        layer = 'lru'
+        if entry is None:
+            entry = cache.get(key)
+            layer = 'django'
+            if entry is not None:
+                self._lru_put(key, entry)
+
+        if entry is not None and ttl and entry['expires'] > time.time():
+            self._log(path, f'hit_{layer}', 200, started)
+            return entry['data']
+
+        headers = {}
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        try:
+            response = self._request(path, params, headers)
+        except TMDBError as e:
+            self._log(path, 'error', None, started, level=logging.WARNING, error=str(e))
+            raise
+
+        if response.status_code == 304 and entry is not None:
+            entry = {**entry, 'expires': time.time() + ttl}
+            self._store(key, entry)
+            self._log(path, 'revalidated', 304, started)
+            return entry['data']
+
+        if response.status_code >= 400:
+            self._log(path, 'error', response.status_code, started, level=logging.WARNING)
+            raise TMDBError(f'TMDB {path}: HTTP {response.status_code}')
+
+        data = response.json()
+        self._store(key, {
+            'data': data,
+            'etag': response.headers.get('ETag'),
+            'expires': time.time() + ttl,
+        })
+        self._log(path, 'miss', response.status_code, started)
+        return data
+
+    def _log(self, path, outcome, status, started, level=logging.INFO, **extra):
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.log(
+            level, 'tmdb %s %s status=%s latency_ms=%s', path, outcome, status, latency_ms,
+            extra={'tmdb_path': path, 'tmdb_cache': outcome, 'tmdb_status': status,
+                   'latency_ms': latency_ms, **extra},
+        )
+
+    def search_series(self, query):
+        return self.get('/search/tv', query=query).get('results', [])
+
+    def get_series_details(self, tmdb_id, ttl=None):
+        return self.get(f'/tv/{tmdb_id}', ttl=ttl)
+
+    def get_season(self, tmdb_id, season_number, ttl=None):
+        return self.get(f'/tv/{tmdb_id}/season/{season_number}', ttl=ttl)
+
+    def changes_page(self, start_date, end_date, page=1):
+        return self.get('/tv/changes', ttl=0, start_date=start_date, end_date=end_date, page=page)
+
+    def search_page(self, query, page=1):
+        return self.get('/search/tv', query=query, page=page)
+
+    def discover_page(self, page=1, **filters):
+        return self.get('/discover/tv', page=page, **filters)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDBClient(rate_limiter=shared_bucket('tmdb', RATE_LIMIT))
+    return _client
 
 
 def search_series(query):
-    if not TMDB_API_KEY:
+    client = get_client()
+    if not client.enabled:
         return []
-    
-    url = f'{BASE_URL}/search/tv'
-    params = {
-        'api_key': TMDB_API_KEY,
-        'query': query,
-        'language': 'ru-RU'
-    }
-    
+
     try:
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        return response.json().get('results', [])
-    except Exception as e:
-        print(f"TMDB API Error: {e}")
+        return client.search_series(query)
+    except TMDBError as e:
+        logger.error('TMDB search failed: %s', e)
         return []
 
 
 def get_series_details(tmdb_id):
-    if not TMDB_API_KEY:
+    client = get_client()
+    if not client.enabled:
         return None
-    
-    url = f'{BASE_URL}/tv/{tmdb_id}'
-    params = {
-        'api_key': TMDB_API_KEY,
-        'language': 'ru-RU'
-    }
-    
+
     try:
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"TMDB API Error: {e}")
+        return client.get_series_details(tmdb_id)
+    except TMDBError as e:
+        logger.error('TMDB details failed for %s: %s', tmdb_id, e)
         return None
 
 
+# Поля, которые меняются постоянно и не влияют на данные каталога
+VOLATILE_FIELDS = {'popularity', 'vote_count'}
+
+
+def content_hash(data):
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def details_hash(details):
+    return content_hash({k: v for k, v in details.items() if k not in VOLATILE_FIELDS})
+
+
+def season_hashes(details):
+    """Хэши сводок сезонов из /tv/{id}: меняются, когда в сезоне меняются эпизоды или даты."""
+    return {
+        str(season['season_number']): content_hash(season)
+        for season in details.get('seasons', [])
+        if season.get('season_number', 0) >= 1
+    }
+
+
+def series_fields_from_tmdb(data):
+    """Поля Series из ответа TMDB /tv/{id}."""
+    episode_run_time = data.get('episode_run_time', [])
+    first_air_date = data.get('first_air_date', '')
+    poster_path = data.get('poster_path')
+
+    return {
+        'title': data.get('name', 'Unknown'),
+        'description': data.get('overview', ''),
+        'total_seasons': data.get('number_of_seasons', 1) or 1,
+        'total_episodes': data.get('number_of_episodes', 0) or 0,
+        'average_episode_duration': episode_run_time[0] if episode_run_time else 45,
+        'genres': ', '.join([g['name'] for g in data.get('genres', [])]),
+        'release_year': int(first_air_date[:4]) if first_air_date else None,
+        'poster_url': f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None,
+        'rating': data.get('vote_average'),
+    }
+
+
 def import_from_tmdb(tmdb_id):
     data = get_series_details(tmdb_id)
     
     if not data:
         return None
     
-    title = data.get('name', 'Unknown')
-    description = data.get('overview', '')
-    seasons = data.get('number_of_seasons', 1)
-    total_episodes = data.get('number_of_episodes', 0)
-    
-    episode_run_time = data.get('episode_run_time', [])
-    avg_duration = episode_run_time[0] if episode_run_time else 45
-    
-    genres = ', '.join([g['name'] for g in data.get('genres', [])])
-    
-    first_air_date = data.get('first_air_date', '')
-    release_year = int(first_air_date[:4]) if first_air_date else None
-    
-    poster_path = data.get('poster_path')
-    poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
-    
-    rating = data.get('vote_average')
-    
+    fields = series_fields_from_tmdb(data)
+    fields['average_episode_duration'] = stored_durations([tmdb_id]).get(
+        tmdb_id, fields['average_episode_duration']
+    )
     series, created = Series.objects.update_or_create(
         tmdb_id=tmdb_id,
-        defaults={
-            'title': title,
-            'description': description,
-            'total_seasons': seasons,
-            'total_episodes': total_episodes,
-            'average_episode_duration': avg_duration,
-            'genres': genres,
-            'release_year': release_year,
-            'poster_url': poster_url,
-            'rating': rating,
-        }
+        defaults={**fields, 'tmdb_hash': details_hash(data)},
     )
     
+    set_series_genres(series, data.get('genres', []))
+    if import_episodes(series, data):
+        series.refresh_from_db()
+    
     return series
+
+
+def index_duration(index):
+    """Средняя длительность эпизода по индексу сезонов (None, если он пуст)."""
+    if not index or len(index['minutes']) < 2:
+        return None
+    return max(1, round(index['minutes'][-1] / (len(index['minutes']) - 1)))
+
+
+def stored_durations(tmdb_ids):
+    """Средняя длительность уже загруженных эпизодов: {tmdb_id: минут}.
+
+    episode_run_time из /tv/{id} - лишь оценка; у сериала с эпизодами
+    обновление метаданных не должно затирать длительность по ним.
+    """
+    rows = Series.objects.filter(tmdb_id__in=list(tmdb_ids)).values_list('tmdb_id', 'season_index')
+    durations = {tmdb_id: index_duration(index) for tmdb_id, index in rows}
+    return {tmdb_id: duration for tmdb_id, duration in durations.items() if duration}
+
+
+UPSERT_FIELDS = [
+    'title', 'description', 'total_seasons', 'total_episodes', 'average_episode_duration',
+    'genres', 'release_year', 'poster_url', 'rating', 'tmdb_hash', 'updated_at',
+]
+
+
+def upsert_series(details, batch_size=500):
+    """Пакетно создает или обновляет сериалы по списку ответов TMDB /tv/{id}.
+
+    Один INSERT ... ON CONFLICT (tmdb_id) DO UPDATE (на MySQL - ON DUPLICATE
+    KEY UPDATE) на пакет и пакетная
+    перепривязка жанров вместо update_or_create и set() на каждую строку.
+    Средняя длительность сериала с эпизодами берется из его индекса сезонов.
+    Возвращает словарь tmdb_id -> id сериала.
+    """
+    if not details:
+        return {}
+
+    # Последний ответ по одному tmdb_id побеждает, как при update_or_create
+    details = {data['id']: data for data in details}
+
+    genres = {}
+    for data in details.values():
+        for genre in data.get('genres', []):
+            genres.setdefault(genre['id'], genre['name'])
+    known = {genre.tmdb_id: genre for genre in Genre.objects.filter(tmdb_id__in=genres)}
+    for tmdb_genre_id, name in genres.items():
+        if tmdb_genre_id not in known:
+            known[tmdb_genre_id] = get_or_create_genre(name, tmdb_genre_id)
+
+    durations = stored_durations(details)
+    objects = []
+    for tmdb_id, data in details.items():
+        fields = series_fields_from_tmdb(data)
+        fields['average_episode_duration'] = durations.get(tmdb_id, fields['average_episode_duration'])
+        fields['genres'] = ', '.join(known[genre['id']].name for genre in data.get('genres', []))
+        objects.append(Series(tmdb_id=tmdb_id, tmdb_hash=details_hash(data), **fields))
+
+    with transaction.atomic():
+        Series.objects.bulk_create(
+            objects,
+            batch_size=batch_size,
+            **upsert_options(['tmdb_id'], UPSERT_FIELDS),
+        )
+        series_by_tmdb = dict(
+            Series.objects.filter(tmdb_id__in=details).values_list('tmdb_id', 'id')
+        )
+        # Жанры и число эпизодов могли измениться у сериалов, которые уже смотрят
+        schedule_series_stats(series_by_tmdb.values())
+
+        through = Series.genre_tags.through
+        through.objects.filter(series_id__in=series_by_tmdb.values()).delete()
+        through.objects.bulk_create(
+            [
+                through(series_id=series_by_tmdb[tmdb_id], genre_id=known[genre['id']].id)
+                for tmdb_id, data in details.items()
+                for genre in {g['id']: g for g in data.get('genres', [])}.values()
+            ],
+            batch_size=batch_size,
+        )
+
+    # bulk_create не шлет post_save: сбрасываем индекс автодополнения явно
+    bump_catalog_version()
+    return series_by_tmdb
+
+
+EPISODE_FIELDS = ['title', 'duration', 'air_date', 'description']
+
+
+def season_numbers(details):
+    """Номера сезонов с эпизодами; сезон 0 (спецвыпуски) пропускаем."""
+    return [
+        season['season_number'] for season in details.get('seasons', [])
+        if season.get('season_number', 0) >= 1 and season.get('episode_count')
+    ]
+
+
+def episode_fields_from_tmdb(data, default_duration):
+    air_date = data.get('air_date')
+    return {
+        'title': (data.get('name') or '')[:255],
+        'duration': data.get('runtime') or default_duration,
+        'air_date': date.fromisoformat(air_date) if air_date else None,
+        'description': data.get('overview') or '',
+    }
+
+
+def sync_season_episodes(series_id, season_number, episodes, default_duration=45):
+    """Синхронизирует эпизоды одного сезона с ответом TMDB /tv/{id}/season/{n}.
+
+    Пишутся только новые и изменившиеся строки, одним INSERT ... ON CONFLICT
+    по (series, season_number, episode_number). Пропавшие на TMDB эпизоды
+    не удаляются: на них может ссылаться история просмотров.
+    Возвращает число записанных эпизодов.
+    """
+    existing = {
+        row[0]: row[1:]
+        for row in Episode.objects.filter(
+            series_id=series_id, season_number=season_number
+        ).values_list('episode_number', *EPISODE_FIELDS)
+    }
+
+    changed = []
+    for data in episodes:
+        number = data.get('episode_number')
+        if not number or number < 1:
+            continue
+        fields = episode_fields_from_tmdb(data, default_duration)
+        if existing.get(number) != tuple(fields[name] for name in EPISODE_FIELDS):
+            changed.append(Episode(
+                series_id=series_id, season_number=season_number, episode_number=number, **fields
+            ))
+
+    if changed:
+        Episode.objects.bulk_create(
+            changed,
+            **upsert_options(['series', 'season_number', 'episode_number'], EPISODE_FIELDS),
+        )
+    return len(changed)
+
+
+def finish_episode_import(series_id, rebuild_index=True, season_hashes=None):
+    """Завершает пакетную запись эпизодов сериала.
+
+    bulk_create не шлет post_save, поэтому индекс сезонов и средняя
+    длительность пересобираются здесь, один раз на сериал. season_hashes -
+    хэши успешно загруженных сезонов, по ним sync_tmdb пропускает
+    неизменившиеся сезоны. Прогресс и статистика зрителей пересчитываются
+    по новому индексу.
+    """
+    fields = {}
+    if rebuild_index:
+        index = build_season_index(series_id)
+        fields['season_index'] = index
+        if index:
+            fields['average_episode_duration'] = index_duration(index)
+    if season_hashes is not None:
+        fields['tmdb_season_hashes'] = season_hashes
+    if fields:
+        fields['updated_at'] = timezone.now()
+        Series.objects.filter(pk=series_id).update(**fields)
+    if rebuild_index:
+        schedule_series_stats([series_id])
+
+
+def save_import(details, seasons):
+    """Записывает сериал и уже загруженные сезоны, возвращает id сериала.
+
+    seasons - {номер сезона: ответ /tv/{id}/season/{n} или None, если
+    загрузить сезон не удалось}.
+    """
+    hashes = season_hashes(details)
+    default_duration = series_fields_from_tmdb(details)['average_episode_duration']
+    written = 0
+    with transaction.atomic():
+        series_id = upsert_series([details])[details['id']]
+        for number, season in seasons.items():
+            if season is None:
+                hashes.pop(str(number), None)
+                continue
+            written += sync_season_episodes(series_id, number, season.get('episodes', []), default_duration)
+        finish_episode_import(series_id, rebuild_index=bool(written), season_hashes=hashes)
+        if details.get('poster_path'):
+            schedule_poster(series_id)
+    invalidate_card(series_id)
+    return series_id
+
+
+def import_episodes(series, details, client=None, max_workers=4, numbers=None):
+    """Загружает сезоны сериала параллельно и синхронизирует Episode.
+
+    numbers - какие сезоны загружать (по умолчанию все).
+    Возвращает число записанных эпизодов.
+    """
+    client = client or get_client()
+    if numbers is None:
+        numbers = season_numbers(details)
+    hashes = dict(series.tmdb_season_hashes or {})
+    new_hashes = season_hashes(details)
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(client.get_season, details['id'], number): number for number in numbers}
+        for future in as_completed(futures):
+            number = futures[future]
+            try:
+                season = future.result()
+            except TMDBError as e:
+                logger.warning('TMDB season %s of %s failed: %s', number, details['id'], e)
+                hashes.pop(str(number), None)
+                continue
+            written += sync_season_episodes(
+                series.id, number, season.get('episodes', []), series.average_episode_duration
+            )
+            hashes[str(number)] = new_hashes.get(str(number))
+
+    finish_episode_import(series.id, rebuild_index=bool(written), season_hashes=hashes)
+    return written
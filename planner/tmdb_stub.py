@@ -0,0 +1,199 @@
+"""Локальная заглушка TMDB API для тестов и нагрузочных прогонов импорта.
+
+Отдает детерминированные данные по tmdb_id (одинаковый id - одинаковый
+сериал), поддерживает ETag/If-None-Match, искусственную задержку, ошибки
+для выбранных id и "ревизии" сериалов, чтобы имитировать изменения на TMDB.
+
+    with StubTMDBServer(latency=0.05) as server:
+        client = TMDBClient(api_key='stub', base_url=server.url)
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = [
+    (18, 'Драма'), (35, 'Комедия'), (80, 'Криминал'), (10765, 'Фантастика'),
+    (9648, 'Детектив'), (10759, 'Боевик'), (16, 'Мультфильм'), (99, 'Документальный'),
+]
+WORDS = ['Тайны', 'Город', 'Ночь', 'Империя', 'Дорога', 'Остров', 'Корона', 'Игра', 'Код', 'Север']
+PAGE_SIZE = 20
+
+
+class StubTMDBServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_ids=(), catalog_size=10000):
+        self.latency = latency
+        self.fail_ids = set(fail_ids)
+        self.catalog_size = catalog_size
+        # tmdb_id -> (номер ревизии, дата изменения)
+        self.revisions = {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/3'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def touch(self, tmdb_id, changed_on=None):
+        """Имитирует изменение сериала: в последнем сезоне появляется новый эпизод."""
+        revision = self.revisions.get(tmdb_id, (0, None))[0] + 1
+        self.revisions[tmdb_id] = (revision, changed_on or date.today())
+
+    # Данные
+
+    def show(self, tmdb_id):
+        rnd = random.Random(tmdb_id)
+        revision = self.revisions.get(tmdb_id, (0, None))[0]
+        seasons = []
+        first_air = date(1995, 1, 1) + timedelta(days=rnd.randint(0, 10000))
+        runtime = rnd.choice([22, 25, 30, 45, 50, 60])
+        for number in range(1, rnd.randint(1, 6) + 1):
+            seasons.append({
+                'season_number': number,
+                'episode_count': rnd.randint(6, 12),
+                'air_date': (first_air + timedelta(days=365 * (number - 1))).isoformat(),
+            })
+        seasons[-1]['episode_count'] += revision
+        genres = rnd.sample(GENRES, rnd.randint(1, 3))
+        return {
+            'id': tmdb_id,
+            'name': f'{rnd.choice(WORDS)} {rnd.choice(WORDS).lower()} {tmdb_id}',
+            'overview': f'Описание сериала {tmdb_id}, ревизия {revision}',
+            'number_of_seasons': len(seasons),
+            'number_of_episodes': sum(season['episode_count'] for season in seasons),
+            'episode_run_time': [runtime],
+            'genres': [{'id': genre_id, 'name': name} for genre_id, name in genres],
+            'first_air_date': first_air.isoformat(),
+            'poster_path': f'/poster{tmdb_id}.jpg',
+            'vote_average': round(rnd.uniform(5, 9.5), 1),
+            'seasons': seasons,
+        }
+
+    def season(self, tmdb_id, season_number):
+        show = self.show(tmdb_id)
+        season = next((s for s in show['seasons'] if s['season_number'] == season_number), None)
+        if season is None:
+            return None
+        rnd = random.Random(tmdb_id * 1000 + season_number)
+        aired = date.fromisoformat(season['air_date'])
+        runtime = show['episode_run_time'][0]
+        return {
+            'season_number': season_number,
+            'episodes': [
+                {
+                    'season_number': season_number,
+                    'episode_number': number,
+                    'name': f'Эпизод {number}',
+                    'overview': '',
+                    'runtime': max(1, runtime + rnd.randint(-5, 5)),
+                    'air_date': (aired + timedelta(weeks=number - 1)).isoformat(),
+                }
+                for number in range(1, season['episode_count'] + 1)
+            ],
+        }
+
+    def results_page(self, ids, page):
+        total_pages = max(1, -(-len(ids) // PAGE_SIZE))
+        chunk = ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        return {
+            'page': page,
+            'total_pages': total_pages,
+            'total_results': len(ids),
+            'results': [{'id': tmdb_id, 'name': self.show(tmdb_id)['name']} for tmdb_id in chunk],
+        }
+
+    def route(self, path, params):
+        parts = [part for part in path.split('/') if part]
+        if parts[:1] == ['3']:
+            parts = parts[1:]
+        page = int(params.get('page', 1))
+
+        if parts == ['search', 'tv']:
+            query = params.get('query', '').casefold()
+            ids = [i for i in range(1, min(self.catalog_size, 2000) + 1)
+                   if query in self.show(i)['name'].casefold()]
+            return self.results_page(ids, page)
+        if parts == ['discover', 'tv']:
+            return self.results_page(list(range(1, self.catalog_size + 1)), page)
+        if parts == ['tv', 'changes']:
+            start = date.fromisoformat(params['start_date']) if 'start_date' in params else date.min
+            ids = sorted(i for i, (_, changed) in self.revisions.items() if changed >= start)
+            return self.results_page(ids, page)
+        if len(parts) >= 2 and parts[0] == 'tv' and parts[1].isdigit():
+            tmdb_id = int(parts[1])
+            if tmdb_id in self.fail_ids:
+                return 500
+            if not 1 <= tmdb_id <= self.catalog_size:
+                return 404
+            if len(parts) == 2:
+                return self.show(tmdb_id)
+            if len(parts) == 4 and parts[2] == 'season' and parts[3].isdigit():
+                return self.season(tmdb_id, int(parts[3])) or 404
+        return 404
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                result = server.route(url.path, params)
+                if isinstance(result, int):
+                    self.send_json(result, {'status_code': result, 'success': False})
+                    return
+
+                body = json.dumps(result, ensure_ascii=False).encode()
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_json(200, body=body, etag=etag)
+
+            def send_json(self, status, data=None, body=None, etag=None):
+                body = body if body is not None else json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,169 @@
+"""Инкрементальная синхронизация каталога с TMDB.
+
+Кандидаты на обновление берутся из /tv/changes с момента последней
+синхронизации (watermark). Если watermark нет или он старше окна, которое
+хранит TMDB, проверяются все сериалы каталога. В обоих случаях сериал
+перезаписывается, только если изменился хэш его данных, а сезоны
+загружаются, только если изменился хэш их сводки.
+
+Очередь текущего прогона хранится в SyncState.pending и сохраняется после
+каждого пакета, поэтому прерванная синхронизация продолжается с места остановки.
+"""
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Series, SyncState
+from .tmdb_service import (
+    TMDBError, details_hash, finish_episode_import, season_hashes, season_numbers,
+    series_fields_from_tmdb, sync_season_episodes, upsert_series,
+)
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'tmdb'
+# TMDB отдает изменения не более чем за 14 дней
+CHANGES_WINDOW = timedelta(days=14)
+
+
+def changed_tmdb_ids(client, since, until):
+    ids = set()
+    page, total_pages = 1, 1
+    while page <= total_pages:
+        data = client.changes_page(since.date().isoformat(), until.date().isoformat(), page)
+        ids.update(result['id'] for result in data.get('results', []))
+        total_pages = data.get('total_pages', 1)
+        page += 1
+    return ids
+
+
+def plan_run(client, state, full, metrics, now):
+    """Список tmdb_id для нового прогона."""
+    local = set(Series.objects.filter(tmdb_id__isnull=False).values_list('tmdb_id', flat=True))
+    retry = set(state.metrics.get('failed_ids', [])) & local
+
+    if full or state.watermark is None or now - state.watermark > CHANGES_WINDOW:
+        metrics['mode'] = 'hash'
+        return sorted(local)
+
+    metrics['mode'] = 'changes'
+    changed = changed_tmdb_ids(client, state.watermark, now)
+    metrics['changes_reported'] = len(changed)
+    return sorted((changed & local) | retry)
+
+
+def sync_batch(client, pool, tmdb_ids, metrics, failed):
+    stored = {
+        tmdb_id: (series_id, tmdb_hash, hashes or {})
+        for tmdb_id, series_id, tmdb_hash, hashes in Series.objects.filter(
+            tmdb_id__in=tmdb_ids
+        ).values_list('tmdb_id', 'id', 'tmdb_hash', 'tmdb_season_hashes')
+    }
+
+    changed_details = []
+    stale_seasons = {}
+    futures = {pool.submit(client.get_series_details, tmdb_id, ttl=0): tmdb_id for tmdb_id in stored}
+    for future in as_completed(futures):
+        tmdb_id = futures[future]
+        try:
+            details = future.result()
+        except TMDBError as e:
+            logger.warning('TMDB sync of %s failed: %s', tmdb_id, e)
+            failed.add(tmdb_id)
+            continue
+
+        metrics['series_fetched'] += 1
+        _, old_hash, old_seasons = stored[tmdb_id]
+        new_seasons = season_hashes(details)
+        numbers = [n for n in season_numbers(details) if old_seasons.get(str(n)) != new_seasons[str(n)]]
+
+        if details_hash(details) == old_hash and not numbers:
+            metrics['series_unchanged'] += 1
+            continue
+        if details_hash(details) != old_hash:
+            changed_details.append(details)
+        if numbers:
+            stale_seasons[tmdb_id] = (details, numbers)
+
+    if changed_details:
+        metrics['series_updated'] += len(upsert_series(changed_details))
+
+    season_futures = {}
+    hashes = {}
+    written = Counter()
+    remaining = Counter()
+    for tmdb_id, (details, numbers) in stale_seasons.items():
+        series_id, _, old_seasons = stored[tmdb_id]
+        new_seasons = season_hashes(details)
+        hashes[series_id] = {n: h for n, h in old_seasons.items() if n in new_seasons}
+        remaining[series_id] = len(numbers)
+        default_duration = series_fields_from_tmdb(details)['average_episode_duration']
+        for number in numbers:
+            future = pool.submit(client.get_season, tmdb_id, number, ttl=0)
+            season_futures[future] = (tmdb_id, series_id, number, new_seasons[str(number)], default_duration)
+
+    for future in as_completed(season_futures):
+        tmdb_id, series_id, number, new_hash, default_duration = season_futures[future]
+        try:
+            season = future.result()
+        except TMDBError as e:
+            logger.warning('TMDB sync of %s season %s failed: %s', tmdb_id, number, e)
+            failed.add(tmdb_id)
+            hashes[series_id].pop(str(number), None)
+        else:
+            metrics['seasons_fetched'] += 1
+            count = sync_season_episodes(series_id, number, season.get('episodes', []), default_duration)
+            written[series_id] += count
+            metrics['episodes_written'] += count
+            hashes[series_id][str(number)] = new_hash
+
+        remaining[series_id] -= 1
+        if not remaining[series_id]:
+            finish_episode_import(
+                series_id, rebuild_index=bool(written[series_id]), season_hashes=hashes[series_id]
+            )
+
+
+def sync_catalog(client, full=False, batch_size=50, workers=8, progress=None):
+    """Синхронизирует каталог с TMDB и возвращает метрики прогона."""
+    started = time.perf_counter()
+    state, _ = SyncState.objects.get_or_create(name=STATE_NAME)
+    metrics = Counter()
+
+    if state.in_progress:
+        metrics['mode'] = 'resume'
+        pending = list(state.pending)
+    else:
+        run_started_at = timezone.now()
+        pending = plan_run(client, state, full, metrics, run_started_at)
+        state.run_started_at = run_started_at
+        state.pending = pending
+        state.save(update_fields=['run_started_at', 'pending', 'updated_at'])
+
+    metrics['series_checked'] = len(pending)
+    failed = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending:
+            batch, rest = pending[:batch_size], pending[batch_size:]
+            sync_batch(client, pool, batch, metrics, failed)
+            pending = rest
+            state.pending = pending
+            state.save(update_fields=['pending', 'updated_at'])
+            if progress:
+                progress(metrics, len(pending))
+
+    metrics['series_failed'] = len(failed)
+    metrics['seconds'] = round(time.perf_counter() - started, 2)
+    result = dict(metrics)
+
+    state.watermark = state.run_started_at
+    state.run_started_at = None
+    state.metrics = {**result, 'failed_ids': sorted(failed)}
+    state.save()
+
+    logger.info('tmdb sync finished: %s', result, extra={'tmdb_sync': result})
+    return result
@@ -0,0 +1,15 @@
+"""Аргументы bulk_create(update_conflicts=True) с учетом СУБД.
+
+MySQL выполняет upsert через ON DUPLICATE KEY UPDATE, срабатывающий на
+любой уникальный ключ, и Django не принимает для него unique_fields
+(supports_update_conflicts_with_target = False). PostgreSQL и SQLite,
+наоборот, требуют явно указать ключ конфликта.
+"""
+from django.db import connections
+
+
+def upsert_options(unique_fields, update_fields, using='default'):
+    options = {'update_conflicts': True, 'update_fields': update_fields}
+    if connections[using].vendor != 'mysql':
+        options['unique_fields'] = unique_fields
+    return options
@@ -10,8 +10,16 @@ urlpatterns = [
     path('update/<int:plan_id>/', views.update_progress, name='update_progress'),
     path('quick-update/<int:plan_id>/', views.quick_update, name='quick_update'),
     path('watch/<int:plan_id>/<int:season>/<int:episode>/', views.mark_episode_watched, name='mark_episode_watched'),
+    path('watch-range/<int:plan_id>/', views.mark_range_watched, name='mark_range_watched'),
     path('rate/<int:series_id>/', views.rate_series, name='rate_series'),
     path('statistics/', views.statistics, name='statistics'),
+    path('schedule/', views.schedule, name='schedule'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('analytics/chart.png', views.analytics_chart, name='analytics_chart'),
     path('search/', views.search_series, name='search'),
+    path('search/autocomplete/', views.autocomplete_titles, name='autocomplete'),
+    path('search/tmdb/', views.tmdb_search, name='tmdb_search'),
+    path('search/tmdb/import/<int:tmdb_id>/', views.tmdb_import, name='tmdb_import'),
+    path('posters/<path:path>', views.poster, name='poster'),
 ]
 
@@ -1,39 +1,85 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, OuterRef, Subquery
 from django.utils import timezone
 from datetime import timedelta
 from .models import Series, UserViewingPlan, WatchingHistory, Episode, UserSeriesRating
+from . import autocomplete, posters, search
+from .analytics import chart_png, history_summary, latest_history_id
+from .cards import render_cards
+from .decorators import conditional_page
+from .genres import filter_by_genre, genre_facets
+from .history import mark_watched, parse_ranges
+from .jobs import enqueue
+from .pagination import keyset_paginate
+from .scheduling import get_schedule
+from .stats import daily_totals, get_user_stats
+from .tmdb_async import AsyncTMDBClient
+from .tmdb_service import TMDBError, save_import
 
 
 def home(request):
-    series_list = Series.objects.all().order_by('-rating', '-created_at')
+    genre = request.GET.get('genre', '')
+    series_list = keyset_paginate(
+        filter_by_genre(Series.objects.for_cards().with_catalog_rating(), genre),
+        Series.CATALOG_ORDERING,
+        request.GET.get('cursor'),
+    )
+    
+    cards = render_cards(series_list)
     
-    user_series_ids = []
-    if request.user.is_authenticated:
-        user_series_ids = UserViewingPlan.objects.filter(
-            user=request.user
-        ).values_list('series_id', flat=True)
+    user_series_ids = set()
+    if request.user.is_authenticated and cards:
+        user_series_ids = set(UserViewingPlan.objects.filter(
+            user=request.user, series_id__in=[card.id for card in cards]
+        ).order_by().values_list('series_id', flat=True))
     
     context = {
         'series_list': series_list,
+        'cards': cards,
         'user_series_ids': user_series_ids,
+        'genres': genre_facets(),
+        'genre_filter': genre,
     }
     return render(request, 'planner/home.html', context)
 
 
+def series_list_state(request):
+    state = UserViewingPlan.objects.filter(user=request.user).order_by().aggregate(
+        plans=Count('id'),
+        plans_updated=Max('updated_at'),
+        series_updated=Max('series__updated_at'),
+        forecasts_updated=Max('forecast_updated_at'),
+    )
+    # Только ETag: удаление не двигает максимум времени, а дата завершения зависит от сегодняшнего дня
+    return None, (timezone.localdate(), *state.values())
+
+
 @login_required
+@conditional_page(series_list_state)
 def series_list(request):
     status_filter = request.GET.get('status', 'all')
     
     viewing_plans = UserViewingPlan.objects.filter(
         user=request.user
-    ).select_related('series')
+    ).select_related('series').only(
+        'id', 'user_id', 'status', 'episodes_per_day', 'last_season_watched',
+        'last_episode_watched', 'updated_at',
+        'series__id', 'series__title', 'series__poster_url', 'series__poster_thumbs',
+        'series__total_episodes', 'forecast_date', 'forecast_earliest', 'forecast_latest',
+    ).with_progress()
     
     if status_filter != 'all':
         viewing_plans = viewing_plans.filter(status=status_filter)
     
+    viewing_plans = keyset_paginate(viewing_plans, ['-updated_at', '-id'], request.GET.get('cursor'))
+    
     context = {
         'viewing_plans': viewing_plans,
         'status_filter': status_filter,
@@ -41,14 +87,33 @@ def series_list(request):
     return render(request, 'planner/series_list.html', context)
 
 
+def series_detail_state(request, series_id):
+    def latest(model, field):
+        return Subquery(
+            model.objects.filter(user=request.user, series=OuterRef('pk')).order_by(f'-{field}').values(field)[:1]
+        )
+
+    row = Series.objects.filter(pk=series_id).annotate(
+        plan_updated=latest(UserViewingPlan, 'updated_at'),
+        forecast_updated=latest(UserViewingPlan, 'forecast_updated_at'),
+        rating_updated=latest(UserSeriesRating, 'updated_at'),
+        history_updated=latest(WatchingHistory, 'watched_at'),
+    ).values_list(
+        'updated_at', 'plan_updated', 'forecast_updated', 'rating_updated', 'history_updated',
+    ).first()
+    if row is None:
+        return None
+    return None, (timezone.localdate(), *row)
+
+
 @login_required
+@conditional_page(series_detail_state)
 def series_detail(request, series_id):
     series = get_object_or_404(Series, id=series_id)
     
-    try:
-        user_plan = UserViewingPlan.objects.get(user=request.user, series=series)
-    except UserViewingPlan.DoesNotExist:
-        user_plan = None
+    user_plan = UserViewingPlan.objects.filter(
+        user=request.user, series=series
+    ).select_related('series').with_progress().first()
     
     try:
         user_rating = UserSeriesRating.objects.get(user=request.user, series=series)
@@ -120,36 +185,40 @@ def update_progress(request, plan_id):
 
 @login_required
 def mark_episode_watched(request, plan_id, season, episode):
-    user_plan = get_object_or_404(UserViewingPlan, id=plan_id, user=request.user)
-    
-    user_plan.last_season_watched = season
-    user_plan.last_episode_watched = episode
-    
-    if user_plan.status == 'planning':
-        user_plan.status = 'watching'
-    
-    user_plan.save()
+    user_plan = get_object_or_404(
+        UserViewingPlan.objects.select_related('series'), id=plan_id, user=request.user
+    )
     
     try:
-        episode_obj = Episode.objects.get(
-            series=user_plan.series,
-            season_number=season,
-            episode_number=episode
-        )
-        WatchingHistory.objects.create(
-            user=request.user,
-            series=user_plan.series,
-            episode=episode_obj,
-            duration_watched=episode_obj.duration
-        )
-    except Episode.DoesNotExist:
-        WatchingHistory.objects.create(
-            user=request.user,
-            series=user_plan.series,
-            duration_watched=user_plan.series.average_episode_duration
-        )
+        mark_watched(user_plan, [((season, episode), (season, episode))])
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+    else:
+        messages.success(request, f'Эпизод S{season:02d}E{episode:02d} отмечен как просмотренный!')
+    return redirect('series_detail', series_id=user_plan.series.id)
+
+
+@login_required
+def mark_range_watched(request, plan_id):
+    user_plan = get_object_or_404(
+        UserViewingPlan.objects.select_related('series'), id=plan_id, user=request.user
+    )
+    
+    if request.method == 'POST':
+        try:
+            ranges = parse_ranges(request.POST.get('episodes', ''))
+            count = mark_watched(user_plan, ranges)
+        except ValueError as e:
+            messages.error(request, str(e))
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(
+                request,
+                f'Отмечено эпизодов: {count}. Теперь: '
+                f'S{user_plan.last_season_watched:02d}E{user_plan.last_episode_watched:02d}'
+            )
     
-    messages.success(request, f'Эпизод S{season:02d}E{episode:02d} отмечен как просмотренный!')
     return redirect('series_detail', series_id=user_plan.series.id)
 
 
@@ -177,32 +246,7 @@ def rate_series(request, series_id):
 
 @login_required
 def statistics(request):
-    viewing_plans = UserViewingPlan.objects.filter(user=request.user).select_related('series')
-    
-    total_series = viewing_plans.count()
-    watching = viewing_plans.filter(status='watching').count()
-    completed = viewing_plans.filter(status='completed').count()
-    paused = viewing_plans.filter(status='paused').count()
-    planning = viewing_plans.filter(status='planning').count()
-    dropped = viewing_plans.filter(status='dropped').count()
-    
-    total_hours = 0
-    total_episodes = 0
-    
-    for plan in viewing_plans:
-        episodes_watched = plan.get_episodes_watched()
-        total_episodes += episodes_watched
-        total_hours += (episodes_watched * plan.series.average_episode_duration) / 60
-    
-    genre_stats = {}
-    for plan in viewing_plans:
-        if plan.series.genres:
-            genres = [g.strip() for g in plan.series.genres.split(',')]
-            for genre in genres:
-                if genre:
-                    genre_stats[genre] = genre_stats.get(genre, 0) + 1
-    
-    sorted_genres = sorted(genre_stats.items(), key=lambda x: x[1], reverse=True)[:5]
+    stats = get_user_stats(request.user)
     
     thirty_days_ago = timezone.now() - timedelta(days=30)
     recent_history = WatchingHistory.objects.filter(
@@ -210,73 +254,196 @@ def statistics(request):
         watched_at__gte=thirty_days_ago
     ).select_related('series', 'episode').order_by('-watched_at')[:20]
     
+    last_30_days = daily_totals(request.user, timezone.localdate() - timedelta(days=29))
+    
     context = {
-        'stats': {
-            'total_series': total_series,
-            'watching': watching,
-            'completed': completed,
-            'paused': paused,
-            'planning': planning,
-            'dropped': dropped,
-            'total_hours': round(total_hours, 1),
-            'total_episodes': total_episodes,
-        },
-        'favorite_genres': sorted_genres,
+        'stats': stats,
+        'favorite_genres': stats.get_favorite_genres(),
         'recent_history': recent_history,
+        'last_30_days_hours': round(last_30_days['minutes'] / 60, 1),
+        'last_30_days_episodes': last_30_days['episodes'],
     }
     
     return render(request, 'planner/statistics.html', context)
 
 
+@login_required
+def schedule(request):
+    days = get_schedule(request.user)
+    context = {
+        'days': days,
+        'total_minutes': sum(day['minutes'] for day in days),
+        'total_episodes': sum(len(day['episodes']) for day in days),
+    }
+    return render(request, 'planner/schedule.html', context)
+
+
+@login_required
+def analytics(request):
+    summary = history_summary(request.user)
+    
+    chart_url = None
+    if summary['latest_id'] is not None:
+        chart_url = f"{reverse('analytics_chart')}?v={summary['latest_id']}"
+    
+    context = {
+        'total_hours': summary['total_hours'],
+        'total_entries': summary['total_entries'],
+        'per_series': summary['per_series'],
+        'chart_url': chart_url,
+    }
+    return render(request, 'planner/analytics.html', context)
+
+
+@login_required
+def analytics_chart(request):
+    latest_id = latest_history_id(request.user)
+    if latest_id is None:
+        raise Http404
+    
+    response = HttpResponse(chart_png(request.user, latest_id), content_type='image/png')
+    # URL страницы содержит id последней записи, так что картинку можно кэшировать
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
 @login_required
 def search_series(request):
     query = request.GET.get('q', '')
+    genre = request.GET.get('genre', '')
     results = []
     
+    cursor = request.GET.get('cursor')
+    cards = filter_by_genre(Series.objects.for_cards(), genre)
+    
     if query:
-        results = Series.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(genres__icontains=query)
-        ).order_by('-rating', '-created_at')
+        results = search.search_page(query, cards, cursor)
+    elif genre:
+        results = keyset_paginate(cards.with_catalog_rating(), Series.CATALOG_ORDERING, cursor)
     
     context = {
         'query': query,
         'results': results,
+        'genres': genre_facets(request.user),
+        'genre_filter': genre,
     }
     return render(request, 'planner/search.html', context)
 
+@login_required
+async def tmdb_search(request):
+    """Поиск на TMDB; асинхронное представление, не держит поток во время запроса к API."""
+    query = request.GET.get('q', '').strip()
+    results = []
+    error = None
+
+    if query:
+        try:
+            async with AsyncTMDBClient() as client:
+                if client.enabled:
+                    results = await client.search_series(query)
+                else:
+                    error = 'Ключ TMDB API не настроен'
+        except TMDBError:
+            error = 'TMDB сейчас недоступен, попробуйте позже'
+
+    if results:
+        known = {
+            tmdb_id: series_id
+            async for tmdb_id, series_id in Series.objects.filter(
+                tmdb_id__in=[item['id'] for item in results],
+            ).order_by().values_list('tmdb_id', 'id')
+        }
+        for item in results:
+            item['series_id'] = known.get(item['id'])
+            item['year'] = (item.get('first_air_date') or '')[:4]
+
+    context = {
+        'query': query,
+        'results': results,
+        'error': error,
+    }
+    # Контекст-процессоры читают request.user синхронно; пользователь уже
+    # загружен в login_required через auser(), второй запрос не нужен
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, 'planner/tmdb_search.html', context)
+
+
+@login_required
+async def tmdb_import(request, tmdb_id):
+    """Импорт сериала с TMDB: детали и все сезоны загружаются одновременно."""
+    if request.method != 'POST':
+        return redirect('tmdb_search')
+
+    try:
+        async with AsyncTMDBClient() as client:
+            if not client.enabled:
+                messages.error(request, 'Ключ TMDB API не настроен')
+                return redirect('tmdb_search')
+            details, seasons = await client.fetch_series(tmdb_id)
+    except TMDBError:
+        # TMDB недоступен: импорт повторит фоновый воркер с задержкой
+        await sync_to_async(enqueue)(
+            'import_tmdb_series', {'tmdb_id': tmdb_id}, dedupe_key=f'tmdb_import:{tmdb_id}', delay=60,
+        )
+        messages.warning(request, 'TMDB сейчас не отвечает: сериал будет добавлен в каталог в фоне')
+        return redirect('tmdb_search')
+
+    series_id = await sync_to_async(save_import)(details, seasons)
+    if None in seasons.values():
+        messages.warning(request, 'Часть сезонов не загрузилась, они обновятся при следующей синхронизации')
+    else:
+        messages.success(request, f'Сериал "{details.get("name", "")}" добавлен в каталог')
+    return redirect('series_detail', series_id=series_id)
+
+
+def autocomplete_titles(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    
+    return JsonResponse({'results': autocomplete.suggest(query, limit)})
+
+
 @login_required
 def quick_update(request, plan_id):
-    plan = get_object_or_404(UserViewingPlan, id=plan_id, user=request.user)
+    plan = get_object_or_404(
+        UserViewingPlan.objects.select_related('series'), id=plan_id, user=request.user
+    )
     
     if request.method == 'POST':
         episodes_watched = int(request.POST.get('episodes_watched', 1))
         
-        current_watched = plan.get_episodes_watched()
-        new_total = current_watched + episodes_watched
+        index = plan.series.get_season_index()
+        watched = plan.get_episodes_watched()
+        new_total = min(watched + episodes_watched, index.total_episodes)
         
-        if plan.series.total_seasons > 0:
-            episodes_per_season = plan.series.total_episodes / plan.series.total_seasons
-            
-            new_season = int(new_total / episodes_per_season) + 1
-            new_episode = int(new_total % episodes_per_season)
-            
-            if new_season > plan.series.total_seasons:
-                new_season = plan.series.total_seasons
-                new_episode = int(episodes_per_season)
-                plan.status = 'completed'
-            
-            plan.last_season_watched = new_season
-            plan.last_episode_watched = new_episode
-        else:
-            plan.last_episode_watched = min(new_total, plan.series.total_episodes)
-            
-            if plan.last_episode_watched >= plan.series.total_episodes:
-                plan.status = 'completed'
-        
-        plan.save()
+        if new_total <= watched:
+            messages.info(
+                request,
+                f'Прогресс не изменился: уже просмотрено до S{plan.last_season_watched}E{plan.last_episode_watched}',
+            )
+            return redirect('series_list')
         
-        messages.success(request, f'Добавлено {episodes_watched} эпизодов! Теперь: S{plan.last_season_watched}E{plan.last_episode_watched}')
+        start = index.from_ordinal(watched + 1)
+        try:
+            mark_watched(plan, [(start, index.from_ordinal(new_total))])
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(request, f'Добавлено {new_total - watched} эпизодов! Теперь: S{plan.last_season_watched}E{plan.last_episode_watched}')
     
     return redirect('series_list')
+
+
+def poster(request, path):
+    # Имя файла - хэш содержимого, поэтому ответ можно кэшировать навсегда
+    if not posters.POSTER_FILE_RE.match(path):
+        raise Http404
+    name = f'{posters.POSTER_DIR}/{path}'
+    if not default_storage.exists(name):
+        raise Http404
+    response = FileResponse(default_storage.open(name, 'rb'))
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response